@@ -60,6 +60,9 @@ batocera-mouse show
 #rm -rf /userdata/system/switch/squashfs-root
 #unclutter-remote -h
 
+#game list cache of the emulator ui from the rom index, only changed roms are written
+(cd /userdata/system/switch/configgen && python -m generators.gameListCache >/dev/null 2>&1)
+
 cd /userdata/system/switch/appimages/
 chmod +x /userdata/system/switch/appimages/*.AppImage 2>/dev/null
 ./eden-emu.AppImage
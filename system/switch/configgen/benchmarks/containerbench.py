@@ -0,0 +1,236 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""I/O cost of reading container metadata (generators/switchContainers.py).
+
+Builds a synthetic library of sparse nsp/nsz/xci/xcz/nro files (real
+headers, cnmt/nacp xml, tickets, NCZ section and block tables, multi-GB
+apparent size with holes for the contents), checks that read_container()
+returns the expected title id / version / type / name for every file, and
+reports per title: wall time, page faults and bytes actually read from
+storage (/proc/self/io read_bytes, each file is evicted from the page cache
+before it is parsed).
+
+Usage (from /userdata/system/switch/configgen):
+    python benchmarks/containerbench.py --titles 1000 --size 8192
+    python benchmarks/containerbench.py --titles 200 --json
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import struct
+import sys
+import tempfile
+import time
+
+from pathlib import Path
+
+CONFIGGEN_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(CONFIGGEN_DIR))
+
+from generators.nszDecompress import _fs_header                                    # noqa: E402
+from generators.switchContainers import NACP_VERSION_OFFSET, read_container   # noqa: E402
+
+MIB = 1 << 20
+KINDS = ["nsp", "nsz", "xci", "xcz", "nro"]
+
+
+###SYNTHETIC LIBRARY#####################################################################################################
+class SparseFile:
+    """Writes the given chunks at their offsets, everything else is a hole."""
+
+    def __init__(self, path: Path, size: int):
+        self.path = path
+        self.size = size
+        self.chunks: list[tuple[int, bytes]] = []
+
+    def put(self, offset: int, data: bytes) -> None:
+        self.chunks.append((offset, data))
+
+    def write(self) -> None:
+        with open(self.path, "wb") as f:
+            for offset, data in self.chunks:
+                f.seek(offset)
+                f.write(data)
+            f.truncate(max(self.size, f.tell()))
+            f.flush()
+            os.fsync(f.fileno())
+
+
+def _ncz_tables(body: int, block_exponent: int = 20) -> bytes:
+    # NCZSECTN with one ctr section + NCZBLOCK, the block data itself stays a hole
+    sections = b"NCZSECTN" + struct.pack("<Q", 1) + struct.pack("<QQQQ", 0x4000, body, 3, 0) + bytes(32)
+    blocks = (body + (1 << block_exponent) - 1) >> block_exponent
+    return sections + b"NCZBLOCK" + bytes([2, 1, 0, block_exponent]) + struct.pack("<IQ", blocks, body) + struct.pack("<I", 1 << 19) * blocks
+
+
+def _title(index: int) -> tuple[str, int, str, str]:
+    # title id, version, type, name: bases, updates and dlc in turn
+    base = f"0100{index:08x}"
+    kind = index % 3
+    if kind == 0:
+        return base + "0000", 0, "base", f"Synthetic Game {index}"
+    if kind == 1:
+        return base + "0800", 65536 * (index % 7 + 1), "update", f"Synthetic Game {index}"
+    return base + "1001", 0, "dlc", f"Synthetic Game {index}"
+
+
+def _metadata_entries(title_id: str, version: int, ttype: str, name: str) -> list[tuple[str, bytes]]:
+    cnmt_type = {"base": "Application", "update": "Patch", "dlc": "AddOnContent"}[ttype]
+    cnmt = f"<?xml version='1.0'?><ContentMeta><Type>{cnmt_type}</Type><Id>0x{title_id}</Id><Version>{version}</Version></ContentMeta>"
+    nacp = f"<?xml version='1.0'?><Application><Title><Language>AmericanEnglish</Language><Name>{name}</Name></Title></Application>"
+    return [
+        (f"{title_id}{'0' * 16}.tik", bytes(0x2C0)),
+        (f"{'c' * 32}.cnmt.xml", cnmt.encode()),
+        (f"{'d' * 32}.nacp.xml", nacp.encode()),
+        (f"{'d' * 32}.nx.AmericanEnglish.jpg", b"\xff\xd8" + bytes(0x4000)),
+    ]
+
+
+def _place(entries: list[tuple[str, bytes | int]], magic: bytes, entry_size: int, align: int, base: int, out: SparseFile) -> int:
+    """Writes a PFS0/HFS0 at base; bytes entries are written, int entries are holes of that size. Returns its size."""
+    offsets, position = [], 0
+    for _, data in entries:
+        position += -position % align
+        offsets.append(position)
+        position += data if isinstance(data, int) else len(data)
+    header = _fs_header(magic, [(n, o, d if isinstance(d, int) else len(d), 0x200, bytes(32)) for (n, d), o in zip(entries, offsets)],
+                        entry_size, align)
+    out.put(base, header)
+    for (_, data), offset in zip(entries, offsets):
+        if not isinstance(data, int):
+            out.put(base + len(header) + offset, data)
+    return len(header) + position
+
+
+def build_title(directory: Path, index: int, size: int) -> tuple[Path, dict]:
+    title_id, version, ttype, name = _title(index)
+    kind = KINDS[index % len(KINDS)]
+    path = directory / f"title{index:05d}.{kind}"
+    out = SparseFile(path, size)
+
+    if kind == "nro":
+        nro_size = 0x1000
+        header = bytearray(0x80)
+        header[0x10:0x14] = b"NRO0"
+        struct.pack_into("<I", header, 0x18, nro_size)
+        nacp = bytearray(NACP_VERSION_OFFSET + 0x10)
+        nacp[0:len(name)] = name.encode()
+        nacp[NACP_VERSION_OFFSET:NACP_VERSION_OFFSET + 5] = b"1.0.0"
+        aset = b"ASET" + bytes(4) + struct.pack("<QQQQ", 0, 0, 0x38, len(nacp)) + bytes(16)
+        out.put(0, bytes(header))
+        out.put(nro_size, aset + bytes(nacp))
+        out.write()
+        return path, {"title_id": None, "version": None, "type": "homebrew", "name": f"{name} (1.0.0)"}
+
+    content = size - 8 * MIB
+    entries: list[tuple[str, bytes | int]] = list(_metadata_entries(title_id, version, ttype, name))
+    if kind in ("nsz", "xcz"):
+        # ncz: 0x4000 nca header + tables written, the compressed blocks are a hole
+        tables = _ncz_tables(content)
+        entries.insert(0, (f"{'a' * 32}.ncz", bytes(0x4000) + tables))
+        entries.insert(1, ("padding.bin", content // 2))
+    else:
+        entries.insert(0, (f"{'a' * 32}.nca", content))
+
+    if kind in ("nsp", "nsz"):
+        _place(entries, b"PFS0", 0x18, 0x10, 0, out)
+    else:
+        root_offset = 0xF000
+        header = bytearray(0x200)
+        header[0x100:0x104] = b"HEAD"
+        struct.pack_into("<Q", header, 0x130, root_offset)
+        out.put(0, bytes(header))
+        # the root HFS0 is placed first to know where the partitions land
+        root_probe = _fs_header(b"HFS0", [("normal", 0, 0, 0, bytes(32)), ("secure", 0, 0, 0, bytes(32))], 0x40, 0x200)
+        normal_at = root_offset + len(root_probe)
+        normal_size = _place([], b"HFS0", 0x40, 0x200, normal_at, out)
+        secure_rel = normal_size + (-normal_size % 0x200)
+        secure_size = _place(entries, b"HFS0", 0x40, 0x200, normal_at + secure_rel, out)
+        out.put(root_offset, _fs_header(b"HFS0", [("normal", 0, normal_size, normal_size, bytes(32)),
+                                                  ("secure", secure_rel, secure_size, 0x200, bytes(32))], 0x40, 0x200))
+    out.write()
+    return path, {"title_id": title_id, "version": version, "type": ttype, "name": name}
+
+
+###RUNNER################################################################################################################
+def _read_bytes() -> int | None:
+    try:
+        with open("/proc/self/io") as f:
+            for line in f:
+                if line.startswith("read_bytes:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def _evict(path: Path) -> None:
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def _percentile(values: list[float], p: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--titles", type=int, default=1000)
+    parser.add_argument("--size", type=int, default=4096, help="apparent size of every file in MiB (default 4096)")
+    parser.add_argument("--dir", default=None, help="where the synthetic library goes (default: a temp dir)")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    work = Path(tempfile.mkdtemp(prefix="containerbench-", dir=args.dir))
+    try:
+        corpus = [build_title(work, i, args.size * MIB) for i in range(args.titles)]
+        times, faults, reads, failures = [], [], [], []
+        for path, expected in corpus:
+            _evict(path)
+            before_io = _read_bytes()
+            before = resource.getrusage(resource.RUSAGE_SELF)
+            start = time.perf_counter()
+            info = read_container(str(path))
+            times.append((time.perf_counter() - start) * 1000)
+            after = resource.getrusage(resource.RUSAGE_SELF)
+            after_io = _read_bytes()
+            faults.append((after.ru_minflt + after.ru_majflt) - (before.ru_minflt + before.ru_majflt))
+            if before_io is not None and after_io is not None:
+                reads.append(after_io - before_io)
+            got = {"title_id": info.title_id, "version": info.version, "type": info.type, "name": info.name}
+            if got != expected:
+                failures.append({"path": path.name, "expected": expected, "got": got})
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    result = {
+        "titles": args.titles,
+        "apparent_library_gib": round(args.titles * args.size / 1024, 1),
+        "mismatches": len(failures),
+        "ms_per_title": {"p50": round(_percentile(times, 50), 3), "p99": round(_percentile(times, 99), 3)},
+        "faults_per_title": {"p50": _percentile(faults, 50), "max": max(faults)},
+        "read_kib_per_title": {"p50": round(_percentile(reads, 50) / 1024, 1), "max": round(max(reads) / 1024, 1)} if reads else None,
+    }
+    if args.json:
+        print(json.dumps(dict(result, failures=failures[:10]), indent=2))
+    else:
+        print(f"{result['titles']} titles, {result['apparent_library_gib']} GiB apparent, {result['mismatches']} mismatches")
+        print(f"  time per title   p50 {result['ms_per_title']['p50']:.3f} ms   p99 {result['ms_per_title']['p99']:.3f} ms")
+        print(f"  faults per title p50 {result['faults_per_title']['p50']}   max {result['faults_per_title']['max']}")
+        if reads:
+            print(f"  read per title   p50 {result['read_kib_per_title']['p50']} KiB   max {result['read_kib_per_title']['max']} KiB")
+        for failure in failures[:10]:
+            print(f"  MISMATCH {failure['path']}: expected {failure['expected']} got {failure['got']}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,141 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Ryujinx input_config entries (generators/ryujinxInput.py).
+
+Checks the whole matrix: 8 players x 4 pad types (+ unset and a legacy eden
+value), nintendo and other pads. Every player has to get its own pad type,
+its player index, a unique port per guid, and a button layout that matches its
+pad. Then times building the input_config of 8 players from the precomputed
+templates against deep copies of them (what rebuilding the dicts costs at
+least).
+
+Usage (from /userdata/system/switch/configgen):
+    python benchmarks/inputbench.py --runs 20000
+    python benchmarks/inputbench.py --json
+"""
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import sys
+import time
+import uuid
+
+from pathlib import Path
+
+CONFIGGEN_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(CONFIGGEN_DIR))
+
+from generators.ryujinxInput import INPUT_TEMPLATES, NINTENDO_GUIDS, PAD_TYPES, input_entry, player_pad_type  # noqa: E402
+
+PLAYERS = 8
+NINTENDO_GUID = sorted(NINTENDO_GUIDS)[0]
+OTHER_GUID = "030000005e040000ea02000001000000"
+# unset and an eden value (same es option name) are played as pro controllers
+SETTINGS = list(PAD_TYPES) + [None, "3"]
+
+
+class FakeSystem:
+    def __init__(self, config):
+        self.config = config
+
+    def isOptSet(self, key):
+        return key in self.config
+
+
+class FakeController:
+    def __init__(self, guid, player_number):
+        self.guid = guid
+        self.player_number = player_number
+
+
+def build(system, controllers, entry=input_entry) -> list[dict]:
+    # the loop of RyujinxGenerator.writeRyujinxConfig
+    input_config, port_of_guid = [], {}
+    for controller in controllers:
+        myid = uuid.UUID(controller.guid)
+        port_of_guid[myid] = port_of_guid[myid] + 1 if myid in port_of_guid else 0
+        input_config.append(entry(player_pad_type(system, controller.player_number), controller.guid,
+                                  port_of_guid[myid], controller.player_number))
+    return input_config
+
+
+def deepcopy_entry(pad_type, guid, port, player_number):
+    entry = copy.deepcopy(INPUT_TEMPLATES[(pad_type, guid in NINTENDO_GUIDS)])
+    entry["id"] = f"{port}-{uuid.UUID(bytes=uuid.UUID(guid).bytes_le)}"
+    entry["player_index"] = f"Player{player_number}"
+    return entry
+
+
+###MATRIX################################################################################################################
+def check(entry: dict, player: int, setting: str | None, nintendo: bool) -> list[str]:
+    errors = []
+    expected = setting if setting in PAD_TYPES else "ProController"
+    if entry["controller_type"] != expected:
+        errors.append(f"controller_type {entry['controller_type']}, {expected} expected")
+    if entry["player_index"] != f"Player{player}":
+        errors.append(f"player_index {entry['player_index']}")
+    left, right = entry["left_joycon_stick"]["joystick"], entry["right_joycon_stick"]["joystick"]
+    sticks = {"JoyconLeft": ("Left", "Unbound"), "JoyconRight": ("Unbound", "Left")}.get(expected, ("Left", "Right"))
+    if (left, right) != sticks:
+        errors.append(f"sticks {left}/{right}, {sticks[0]}/{sticks[1]} expected")
+    # the button at the "a" position of the pad is A for nintendo pads on pro / left layouts
+    if expected != "JoyconRight" and (entry["right_joycon"]["button_a"] == "A") != nintendo:
+        errors.append(f"face buttons not {'nintendo' if nintendo else 'xbox'} layout")
+    return errors
+
+
+def matrix() -> tuple[int, list[str]]:
+    cases, errors = 0, []
+    for player in range(1, PLAYERS + 1):
+        for setting in SETTINGS:
+            for nintendo in (False, True):
+                # the other players get other pad types, so a value taken from another player shows
+                config = {f"p{n}_pad": PAD_TYPES[(n + player) % len(PAD_TYPES)] for n in range(1, PLAYERS + 1) if n != player}
+                if setting is not None:
+                    config[f"p{player}_pad"] = setting
+                controllers = [FakeController(NINTENDO_GUID if nintendo and n == player else OTHER_GUID, n)
+                               for n in range(1, PLAYERS + 1)]
+                entries = build(FakeSystem(config), controllers)
+                ids = [entry["id"] for entry in entries]
+                if len(set(ids)) != len(ids):
+                    errors.append(f"player {player} {setting}: duplicate ids {ids}")
+                errors.extend(f"player {player} {setting} {'nintendo' if nintendo else 'other'}: {error}"
+                              for error in check(entries[player - 1], player, setting, nintendo))
+                json.dumps(entries)
+                cases += 1
+    return cases, errors
+
+
+###BENCH#################################################################################################################
+def bench(entry, runs: int) -> float:
+    system = FakeSystem({f"p{n}_pad": PAD_TYPES[n % len(PAD_TYPES)] for n in range(1, PLAYERS + 1)})
+    controllers = [FakeController(NINTENDO_GUID if n % 2 else OTHER_GUID, n) for n in range(1, PLAYERS + 1)]
+    start = time.perf_counter()
+    for _ in range(runs):
+        build(system, controllers, entry)
+    return (time.perf_counter() - start) / runs * 1e6
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5000, help="input_config builds per variant (default 5000)")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    cases, errors = matrix()
+    result = {"cases": cases, "errors": errors, "players": PLAYERS,
+              "templates_us": bench(input_entry, args.runs), "deepcopy_us": bench(deepcopy_entry, args.runs)}
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"matrix: {cases} case(s), {len(errors)} error(s)")
+        for error in errors:
+            print(f"  {error}")
+        print(f"{PLAYERS} players: templates {result['templates_us']:.1f} us, deep copies {result['deepcopy_us']:.1f} us")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
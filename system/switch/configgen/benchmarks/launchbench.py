@@ -0,0 +1,531 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Launch-latency benchmark for the Switch configgen.
+
+Runs switchlauncher.py -> _new_get_generator -> <Generator>.generate end to
+end against a throw-away /userdata tree, a fake sysfs (/sys/class/hidraw,
+/sys/class/drm) and stubbed batocera ``configgen`` / ``evdev`` / ``sdl2``
+modules, and reports per-phase wall time percentiles over N runs.
+
+Nothing outside the temporary directory is touched: every path under
+/userdata and /sys is redirected into the fake trees while a run is in
+progress, and the ryujinx log (/tmp/debugryujinx.txt) goes to the temporary
+directory. Helper processes (batocera-mouse, batocera-settings-get) are replaced
+by /bin/true so their fork+exec cost is still part of the measurement.
+
+Usage (from /userdata/system/switch/configgen):
+    python benchmarks/launchbench.py --emulator all --runs 50 --pads 4
+    python benchmarks/launchbench.py --emulator ryujinx-emu --cold --json
+"""
+from __future__ import annotations
+
+import argparse
+import builtins
+import configparser
+import contextlib
+import io
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import types
+
+from dataclasses import dataclass
+from pathlib import Path
+
+CONFIGGEN_DIR = Path(__file__).resolve().parent.parent
+EMULATORS = ["eden-emu", "eden-pgo", "citron-emu", "ryujinx-emu"]
+PHASES = ["imports", "layout", "config", "detect", "command", "total"]
+
+# vid, pid, bus, name, SDL mapping body (after guid,name,)
+PAD_MODELS = [
+    ("045e", "02ea", "0003", "Xbox Wireless Controller",
+     "a:b0,b:b1,x:b2,y:b3,back:b6,guide:b8,start:b7,leftstick:b9,rightstick:b10,leftshoulder:b4,rightshoulder:b5,"
+     "dpup:h0.1,dpdown:h0.4,dpleft:h0.8,dpright:h0.2,leftx:a0,lefty:a1,rightx:a3,righty:a4,lefttrigger:a2,righttrigger:a5,platform:Linux,"),
+    ("054c", "0ce6", "0003", "DualSense Wireless Controller",
+     "a:b0,b:b1,x:b3,y:b2,back:b4,guide:b5,start:b6,leftstick:b7,rightstick:b8,leftshoulder:b9,rightshoulder:b10,"
+     "dpup:b11,dpdown:b12,dpleft:b13,dpright:b14,leftx:a0,lefty:a1,rightx:a2,righty:a3,lefttrigger:a4,righttrigger:a5,platform:Linux,"),
+    ("057e", "2009", "0005", "Nintendo Switch Pro Controller",
+     "a:b0,b:b1,x:b3,y:b2,back:b4,guide:b5,start:b6,leftstick:b7,rightstick:b8,leftshoulder:b9,rightshoulder:b10,"
+     "dpup:b11,dpdown:b12,dpleft:b13,dpright:b14,leftx:a0,lefty:a1,rightx:a2,righty:a3,lefttrigger:a4,righttrigger:a5,platform:Linux,"),
+]
+
+
+###FAKE TREES############################################################################################################
+def _write(path: Path, content: str = "") -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(content)
+
+
+def _relsymlink(target: Path, link: Path) -> None:
+    link.parent.mkdir(parents=True, exist_ok=True)
+    os.symlink(os.path.relpath(target, link.parent), link)
+
+
+def build_userdata(root: Path) -> None:
+    switch = root / "system" / "switch"
+    for emulator in EMULATORS:
+        _write(switch / "appimages" / f"{emulator}.AppImage", "#!/bin/sh\n")
+    for name in ("qt-config.ini.template", "Config.json.template", "configgen-defaults.yml", "configgen-defaults-arch.yml"):
+        _write(switch / "configgen" / name, (CONFIGGEN_DIR / name).read_text())
+    _write(root / "system" / "batocera.conf", "global.videooutput=HDMI-A-1\n")
+    for folder in ("bios/switch/keys", "bios/switch/firmware", "roms/switch", "saves", "system/configs"):
+        (root / folder).mkdir(parents=True, exist_ok=True)
+    _write(root / "bios" / "switch" / "keys" / "prod.keys", f"header_key = {'00' * 32}\nmaster_key_00 = {'00' * 16}\n")
+
+
+def build_sysfs(root: Path, npads: int) -> None:
+    devices = root / "devices"
+    usb = devices / "pci0000:00" / "0000:00:14.0" / "usb1"
+    for n in range(npads):
+        vid, pid, bus, name, _ = PAD_MODELS[n % len(PAD_MODELS)]
+        hid_id = f"{bus}:{vid.upper()}:{pid.upper()}.{n + 1:04X}"
+        if bus == "0003":
+            parent = usb / f"1-{n + 1}"
+            _write(parent / "idVendor", vid + "\n")
+            _write(parent / "idProduct", pid + "\n")
+            hid_dev = parent / f"1-{n + 1}:1.0" / hid_id
+        else:
+            hid_dev = devices / "virtual" / "misc" / "uhid" / hid_id
+        _write(hid_dev / "uevent", f"DRIVER=hid-generic\nHID_NAME={name}\n")
+        event = hid_dev / "input" / f"input{n}" / f"event{n}"
+        event.mkdir(parents=True, exist_ok=True)
+        for name, value in (("bustype", bus), ("vendor", vid), ("product", pid), ("version", "0111")):
+            _write(event.parent / "id" / name, value + "\n")
+        _relsymlink(event.parent, event / "device")
+        _relsymlink(event, root / "class" / "input" / f"event{n}")
+        hidraw = hid_dev / "hidraw" / f"hidraw{n}"
+        hidraw.mkdir(parents=True, exist_ok=True)
+        _relsymlink(hid_dev, hidraw / "device")
+        _relsymlink(hidraw, root / "class" / "hidraw" / f"hidraw{n}")
+    # one keyboard so the hid walk also sees non-pad devices
+    kbd = usb / "1-9" / "1-9:1.0" / "0003:046D:C31C.00FF"
+    _write(usb / "1-9" / "idVendor", "046d\n")
+    _write(usb / "1-9" / "idProduct", "c31c\n")
+    _write(kbd / "uevent", "HID_NAME=Logitech USB Keyboard\n")
+    (kbd / "input" / "input99" / "event99").mkdir(parents=True, exist_ok=True)
+    (kbd / "hidraw" / "hidraw99").mkdir(parents=True, exist_ok=True)
+    _relsymlink(kbd, kbd / "hidraw" / "hidraw99" / "device")
+    _relsymlink(kbd / "hidraw" / "hidraw99", root / "class" / "hidraw" / "hidraw99")
+
+    gpu = devices / "pci0000:00" / "0000:00:02.0"
+    _write(gpu / "vendor", "0x8086\n")
+    _write(gpu / "device", "0x9a49\n")
+    card = gpu / "drm" / "card0"
+    _write(card / "card0-HDMI-A-1" / "status", "connected\n")
+    _write(card / "card0-DP-1" / "status", "disconnected\n")
+    _relsymlink(gpu, card / "device")
+    _relsymlink(card, root / "class" / "drm" / "card0")
+
+
+###PATH REDIRECTION######################################################################################################
+class Redirect:
+    """Patches the os/io primitives so /userdata and /sys resolve inside the fake trees."""
+
+    def __init__(self, mapping: dict[str, str]):
+        self.mapping = mapping
+        self.reverse = {v: k for k, v in mapping.items()}
+        self.saved: list[tuple[object, str, object]] = []
+
+    def tr(self, path):
+        if isinstance(path, os.PathLike):
+            path = os.fspath(path)
+        if isinstance(path, str):
+            for virtual, real in self.mapping.items():
+                if path == virtual or path.startswith(virtual + "/"):
+                    return real + path[len(virtual):]
+        return path
+
+    def untr(self, path):
+        if isinstance(path, str):
+            for real, virtual in self.reverse.items():
+                if path == real or path.startswith(real + "/"):
+                    return virtual + path[len(real):]
+        return path
+
+    def _patch(self, owner, name, wrapper):
+        self.saved.append((owner, name, getattr(owner, name)))
+        setattr(owner, name, wrapper)
+
+    def _one(self, owner, name):
+        orig = getattr(owner, name)
+        self._patch(owner, name, lambda path, *a, **k: orig(self.tr(path), *a, **k))
+
+    def _two(self, owner, name):
+        orig = getattr(owner, name)
+        self._patch(owner, name, lambda src, dst, *a, **k: orig(self.tr(src), self.tr(dst), *a, **k))
+
+    def __enter__(self):
+        for name in ("stat", "lstat", "chmod", "unlink", "remove", "mkdir", "rmdir", "listdir", "utime",
+                     "access", "open", "truncate", "statvfs", "chdir"):
+            if hasattr(os, name):
+                self._one(os, name)
+        for name in ("symlink", "link", "rename", "replace"):
+            self._two(os, name)
+        self._one(builtins, "open")
+        self._one(io, "open")
+        self._one(sqlite3, "connect")
+
+        orig_readlink = os.readlink
+        self._patch(os, "readlink", lambda path, *a, **k: self.untr(orig_readlink(self.tr(path), *a, **k)))
+
+        orig_scandir = os.scandir
+        redirect = self
+
+        class _Scandir:
+            def __init__(self, path=".", *a, **k):
+                self.virtual = os.fspath(path) if not isinstance(path, int) else None
+                self.it = orig_scandir(redirect.tr(path), *a, **k)
+
+            def __iter__(self):
+                return self
+
+            def __next__(self):
+                return _Entry(next(self.it), self.virtual)
+
+            def __enter__(self):
+                return self
+
+            def __exit__(self, *exc):
+                self.it.close()
+
+            def close(self):
+                self.it.close()
+
+        class _Entry:
+            def __init__(self, entry, virtual):
+                self._entry = entry
+                self.name = entry.name
+                self.path = os.path.join(virtual, entry.name) if virtual is not None else entry.path
+
+            def __getattr__(self, attr):
+                return getattr(self._entry, attr)
+
+            def __fspath__(self):
+                return self.path
+
+        self._patch(os, "scandir", _Scandir)
+
+        def _helper(argv):
+            cmd = os.path.basename(str(argv[0] if isinstance(argv, (list, tuple)) else argv).split()[0])
+            return cmd in ("batocera-mouse", "batocera-settings-get")
+
+        orig_run = subprocess.run
+        orig_popen = subprocess.Popen
+
+        def fake_run(args, *a, **k):
+            if _helper(args):
+                return orig_run(["true"], *a, **{key: v for key, v in k.items() if key != "shell"})
+            return orig_run(args, *a, **k)
+
+        def fake_popen(args, *a, **k):
+            if _helper(args):
+                return orig_popen(["true"], *a, **{key: v for key, v in k.items() if key != "shell"})
+            return orig_popen(args, *a, **k)
+
+        self._patch(subprocess, "run", fake_run)
+        self._patch(subprocess, "Popen", fake_popen)
+        return self
+
+    def __exit__(self, *exc):
+        while self.saved:
+            owner, name, orig = self.saved.pop()
+            setattr(owner, name, orig)
+
+
+###STUBBED MODULES#######################################################################################################
+class PhaseTimer:
+    """Exclusive wall time per phase; nested phases are subtracted from their parent."""
+
+    def __init__(self):
+        self.totals: dict[str, float] = {}
+        self.stack: list[list] = []
+
+    def reset(self):
+        self.totals = {}
+        self.stack = []
+
+    def enter(self, phase):
+        self.stack.append([phase, time.perf_counter(), 0.0])
+
+    def leave(self):
+        phase, start, child = self.stack.pop()
+        elapsed = time.perf_counter() - start
+        self.totals[phase] = self.totals.get(phase, 0.0) + elapsed - child
+        if self.stack:
+            self.stack[-1][2] += elapsed
+        return elapsed
+
+    def wrap(self, phase, func):
+        def wrapper(*args, **kwargs):
+            self.enter(phase)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.leave()
+        wrapper.__wrapped__ = func
+        return wrapper
+
+
+TIMER = PhaseTimer()
+
+
+@dataclass
+class Input:
+    name: str
+    type: str
+    id: str
+    value: str | int = 1
+    code: str | int | None = None
+
+
+class FakeController:
+    def __init__(self, index, model, event, guid):
+        vid, pid, bus, name, mapping = model
+        self.index = index
+        self.player_number = index + 1
+        self.name = name
+        self.real_name = name
+        self.device_path = f"/dev/input/event{event}"
+        self.guid = guid
+        self.inputs = _parse_inputs(mapping)
+        self.mapping = mapping
+
+
+class FakeSystem:
+    def __init__(self, emulator, options=None):
+        self.name = "switch"
+        self.config = {"emulator": emulator, "core": emulator, **(options or {})}
+
+    def isOptSet(self, key):
+        return key in self.config
+
+
+def _parse_inputs(mapping):
+    inputs = {}
+    for element in mapping.split(","):
+        if ":" not in element or element.startswith("platform"):
+            continue
+        key, value = element.split(":", 1)
+        kind = {"b": "button", "a": "axis", "h": "hat"}[value[0]]
+        inputs[key] = Input(name=key, type=kind, id=value[1:].split(".")[-1])
+    return inputs
+
+
+def _pad_guid(model):
+    vid, pid, bus, _, _ = model
+    return f"{bus[2:]}000000{vid[2:]}{vid[:2]}0000{pid[2:]}{pid[:2]}000000000000"
+
+
+def _module(name, **attrs):
+    module = types.ModuleType(name)
+    module.__dict__.update(attrs)
+    if "." not in name:
+        module.__path__ = []
+    sys.modules[name] = module
+    parent, _, child = name.rpartition(".")
+    if parent:
+        setattr(sys.modules[parent], child, module)
+    return module
+
+
+def install_stubs(npads):
+    class Command:
+        def __init__(self, array, env=None):
+            self.array = array
+            self.env = env or {}
+
+    class CaseSensitiveRawConfigParser(configparser.RawConfigParser):
+        def optionxform(self, optionstr):
+            return optionstr
+
+    def mkdir_if_not_exists(path):
+        if not path.exists():
+            path.mkdir(parents=True)
+
+    def generate_sdl_game_controller_config(controllers):
+        return "\n".join(f"{c.guid},{c.real_name},{c.mapping}" for c in controllers)
+
+    _module("configgen", __path__=[])
+    _module("configgen.Command", Command=TIMER.wrap("command", Command))
+    _module("configgen.batoceraPaths",
+            HOME=Path("/userdata/system"), CONFIGS=Path("/userdata/system/configs"), ROMS=Path("/userdata/roms"),
+            SAVES=Path("/userdata/saves"), CACHE=Path("/userdata/system/.cache"), BIOS=Path("/userdata/bios"),
+            DEFAULTS_DIR=Path("/usr/share/batocera/configgen"), mkdir_if_not_exists=mkdir_if_not_exists)
+    _module("configgen.controller", generate_sdl_game_controller_config=generate_sdl_game_controller_config)
+    _module("configgen.generators", __path__=[], get_generator=lambda emulator: None)
+    _module("configgen.generators.Generator", Generator=type("Generator", (), {}))
+    _module("configgen.utils", __path__=[])
+    _module("configgen.utils.configparser", CaseSensitiveRawConfigParser=CaseSensitiveRawConfigParser)
+    _module("configgen.utils.vulkan")
+    _module("configgen.input", Input=Input, InputDict=dict, InputMapping=dict)
+    _module("configgen.types", HotkeysContext=dict)
+    _module("configgen.exceptions", BatoceraException=type("BatoceraException", (Exception,), {}))
+    _module("configgen.Emulator", Emulator=object, _dict_merge=lambda a, b: a.update(b),
+            _load_defaults=lambda *a: {}, _load_system_config=lambda name: {})
+    _module("configgen.emulatorlauncher", launch=lambda: 0, get_generator=None)
+    _module("evdev", InputDevice=object, ecodes=types.SimpleNamespace())
+
+    models = [PAD_MODELS[n % len(PAD_MODELS)] for n in range(npads)]
+
+    def guid_string(guid, buff, size):
+        raw = _pad_guid(models[guid]).encode()
+        for i, byte in enumerate(raw[:size - 1]):
+            buff[i] = bytes([byte])
+
+    _module("sdl2", SDL_INIT_GAMECONTROLLER=0x2000,
+            SDL_ClearError=lambda: None, SDL_Init=lambda flags: 0, SDL_Quit=lambda: None,
+            SDL_IsGameController=lambda i: 1, SDL_GameControllerOpen=lambda i: i,
+            SDL_GameControllerPath=lambda pad: f"/dev/hidraw{pad}".encode(),
+            SDL_GameControllerMapping=lambda pad: f"{_pad_guid(models[pad])},{models[pad][3]},{models[pad][4]}".encode())
+    _module("sdl2.joystick", SDL_NumJoysticks=lambda: npads, SDL_JoystickGetDeviceGUID=lambda i: i,
+            SDL_JoystickGetGUIDString=guid_string, SDL_JoystickPathForIndex=lambda i: f"/dev/hidraw{i}".encode())
+
+
+###RUNNER################################################################################################################
+PHASE_HOOKS = {
+    "config": ["writeYuzuConfig", "writeRyujinxConfig"],
+    "detect": ["log_hid_devices", "hid_topology", "list_sdl_gamepads", "probe_sdl_gamepads", "generate_sdl_game_controller_config"],
+}
+
+
+def _purge_modules():
+    for name in list(sys.modules):
+        if name == "switchlauncher" or name == "generators" or name.startswith("generators."):
+            del sys.modules[name]
+
+
+def _instrument(generator):
+    module = sys.modules[type(generator).__module__]
+    cls = type(generator)
+    for phase, names in PHASE_HOOKS.items():
+        for name in names:
+            if name in cls.__dict__:
+                setattr(cls, name, staticmethod(TIMER.wrap(phase, cls.__dict__[name])))
+            elif hasattr(module, name):
+                setattr(module, name, TIMER.wrap(phase, getattr(module, name)))
+
+
+def run_once(emulator, npads, options):
+    TIMER.reset()
+    _purge_modules()
+    start = time.perf_counter()
+
+    TIMER.enter("imports")
+    import switchlauncher
+    generator = switchlauncher._new_get_generator(emulator)
+    TIMER.leave()
+
+    _instrument(generator)
+    models = [PAD_MODELS[n % len(PAD_MODELS)] for n in range(npads)]
+    controllers = [FakeController(n, models[n], n, _pad_guid(models[n])) for n in range(npads)]
+    system = FakeSystem(emulator, options)
+
+    TIMER.enter("layout")
+    command = generator.generate(system, "/userdata/roms/switch/game.nsp", controllers, {}, [], [], {"width": 1920, "height": 1080})
+    TIMER.leave()
+
+    totals = dict(TIMER.totals)
+    totals["total"] = time.perf_counter() - start
+    # background work of the launch (shader warm-up) ends inside the redirected tree
+    for thread in threading.enumerate():
+        if thread is not threading.main_thread():
+            thread.join(10)
+    return totals, command
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[rank]
+
+
+def summarize(samples):
+    summary = {}
+    for phase in PHASES:
+        values = [s.get(phase, 0.0) * 1000.0 for s in samples]
+        summary[phase] = {
+            "min": min(values), "p50": percentile(values, 50), "p90": percentile(values, 90),
+            "p99": percentile(values, 99), "max": max(values), "mean": sum(values) / len(values),
+        }
+    return summary
+
+
+def bench(emulator, runs, warmup, npads, cold, options, workdir):
+    userdata = workdir / "userdata"
+    sysfs = workdir / "sys"
+    build_sysfs(sysfs, npads)
+    build_userdata(userdata)
+    install_stubs(npads)
+    # the ryujinx log file is outside /userdata: its logger is set up here first, with a path in the work dir,
+    # and the generator's get_switch_logger() keeps that handler (the logger outlives the module purges)
+    from generators.switchLog import get_switch_logger
+    get_switch_logger("ryujinx", str(workdir / "debugryujinx.txt"))
+
+    samples = []
+    # the generators print their pad detection to stdout, keep it out of the report
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull), \
+            Redirect({"/userdata": str(userdata), "/sys": str(sysfs)}):
+        for n in range(warmup + runs):
+            if cold:
+                shutil.rmtree(userdata)
+                build_userdata(userdata)
+            totals, _ = run_once(emulator, npads, options)
+            if n >= warmup:
+                samples.append(totals)
+    return summarize(samples)
+
+
+def print_table(emulator, summary, runs):
+    print(f"\n{emulator} ({runs} runs, ms)")
+    print(f"  {'phase':<10}{'min':>9}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}{'mean':>9}")
+    for phase in PHASES:
+        s = summary[phase]
+        print(f"  {phase:<10}" + "".join(f"{s[k]:>9.2f}" for k in ("min", "p50", "p90", "p99", "max", "mean")))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Switch configgen launch-latency benchmark")
+    parser.add_argument("--emulator", default="all", choices=EMULATORS + ["all"])
+    parser.add_argument("--runs", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--pads", type=int, default=4)
+    parser.add_argument("--cold", action="store_true", help="rebuild the fake /userdata before every run")
+    parser.add_argument("--option", action="append", default=[], metavar="KEY=VALUE", help="system.config option")
+    parser.add_argument("--json", action="store_true", help="print the summary as json")
+    parser.add_argument("--keep", action="store_true", help="keep the fake trees for inspection")
+    args = parser.parse_args(argv)
+
+    sys.path.insert(0, str(CONFIGGEN_DIR))
+    os.environ.setdefault("LANG", "en_US.UTF-8")
+    options = dict(opt.split("=", 1) for opt in args.option)
+    emulators = EMULATORS if args.emulator == "all" else [args.emulator]
+
+    results = {}
+    for emulator in emulators:
+        workdir = Path(tempfile.mkdtemp(prefix="launchbench-"))
+        try:
+            results[emulator] = bench(emulator, args.runs, args.warmup, args.pads, args.cold, options, workdir)
+        finally:
+            if args.keep:
+                print(f"fake trees kept in {workdir}", file=sys.stderr)
+            else:
+                shutil.rmtree(workdir, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+    else:
+        for emulator, summary in results.items():
+            print_table(emulator, summary, args.runs)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Throughput / peak-RSS benchmark for generators/nszDecompress.py.
+
+Builds a synthetic NSZ (one NCZ with a plain nca header, a ctr or plain
+section, zstd blocks of partly random data) of the requested size, then runs
+``python -m generators.nszDecompress`` on it in a child process for each
+worker count and reports wall time, MiB/s of nca written and the peak RSS of
+the child and its pool (wait4 rusage). The expected nca is encrypted with a
+single cryptography AES-CTR stream over the whole section, not with the code
+under test, and the decompressor checks every nca hash. Then a block of a small
+nsz is corrupted: prelaunch has to fall back to the rom itself.
+
+Needs the zstandard module, and cryptography with --encrypted.
+
+Usage (from /userdata/system/switch/configgen):
+    python benchmarks/nszbench.py --size 4096 --workers 1,2,4
+    python benchmarks/nszbench.py --size 2048 --encrypted --solid
+"""
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+CONFIGGEN_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(CONFIGGEN_DIR))
+
+from generators import nszDecompress                                       # noqa: E402
+from generators.switchContainers import NCZ_SECTION_OFFSET, NczSection     # noqa: E402
+
+MIB = 1 << 20
+ZSTD_MAGIC = b"\x28\xb5\x2f\xfd"
+
+
+###SYNTHETIC NSZ#########################################################################################################
+def _block(index: int, size: int) -> bytes:
+    # ~1/4 random, the rest a repeated pattern: compresses around 3:1 like real game data
+    random_part = os.urandom(size // 4)
+    pattern = struct.pack("<Q", index) * ((size - len(random_part)) // 8 + 1)
+    return random_part + pattern[:size - len(random_part)]
+
+
+def _pfs0(entries: list[tuple[str, int]]) -> bytes:
+    strings = b""
+    offsets = []
+    for name, _ in entries:
+        offsets.append(len(strings))
+        strings += name.encode() + b"\0"
+    strings += bytes(-(0x10 + len(entries) * 0x18 + len(strings)) % 0x10)
+    table, position = b"", 0
+    for (name, size), name_offset in zip(entries, offsets):
+        table += struct.pack("<QQII", position, size, name_offset, 0)
+        position += size
+    return b"PFS0" + struct.pack("<III", len(entries), len(strings), 0) + table + strings
+
+
+def _section_encryptor(section: NczSection):
+    # one ctr stream from the start of the section: the counter is the nonce + the 16 byte block number in the nca
+    from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+    counter = section.counter[:8] + struct.pack(">Q", section.offset >> 4)
+    return Cipher(algorithms.AES(section.key), modes.CTR(counter)).encryptor().update
+
+
+def build_nsz(path: Path, size: int, block_exponent: int, encrypted: bool, solid: bool) -> None:
+    import zstandard
+
+    block_size = 1 << block_exponent
+    body = size - NCZ_SECTION_OFFSET
+    section = NczSection(NCZ_SECTION_OFFSET, body, 3 if encrypted else 1, os.urandom(16), os.urandom(8) + bytes(8))
+    nca_header = os.urandom(NCZ_SECTION_OFFSET)
+    sections = b"NCZSECTN" + struct.pack("<Q", 1) + struct.pack("<QQQQ", section.offset, section.size, section.crypto_type, 0) + section.key + section.counter
+
+    count = (body + block_size - 1) // block_size
+    sizes = [min(block_size, body - i * block_size) for i in range(count)]
+    sha = hashlib.sha256(nca_header)
+    compressor = zstandard.ZstdCompressor(level=3)
+    encrypt = _section_encryptor(section) if encrypted else bytes
+
+    def make(i):
+        plain = _block(i, sizes[i])
+        if solid:
+            return plain, plain
+        # compressor objects are not thread safe, one per block
+        compressed = zstandard.ZstdCompressor(level=3).compress(plain)
+        return (compressed if len(compressed) < len(plain) else plain), plain
+
+    chunks = tempfile.TemporaryFile(dir=path.parent)
+    compressed_sizes = []
+    with ThreadPoolExecutor(os.cpu_count()) as pool:
+        if solid:
+            writer = compressor.stream_writer(chunks, closefd=False)
+            for plain, _ in pool.map(make, range(count)):
+                writer.write(plain)
+                sha.update(encrypt(plain))
+            writer.flush(zstandard.FLUSH_FRAME)
+        else:
+            for data, plain in pool.map(make, range(count)):
+                chunks.write(data)
+                compressed_sizes.append(len(data))
+                sha.update(encrypt(plain))
+
+    ncz_header = nca_header + sections
+    if not solid:
+        ncz_header += b"NCZBLOCK" + bytes([2, 1, 0, block_exponent]) + struct.pack("<IQ", count, body)
+        ncz_header += struct.pack(f"<{count}I", *compressed_sizes)
+    ncz_size = len(ncz_header) + chunks.tell()
+    name = sha.hexdigest()[:32] + ".ncz"
+    ticket = ("0100000000010000" + "0" * 16 + ".tik", b"\0" * 0x2C0)
+
+    with open(path, "wb") as out:
+        out.write(_pfs0([(name, ncz_size), (ticket[0], len(ticket[1]))]))
+        out.write(ncz_header)
+        chunks.seek(0)
+        shutil.copyfileobj(chunks, out, 16 * MIB)
+        out.write(ticket[1])
+    chunks.close()
+
+
+###CORRUPT BLOCK#######################################################################################################
+def check_corrupt(work: Path) -> list[str]:
+    # a zstd block with a broken frame header: no exception may escape, the rom is launched as is
+    errors = []
+    for solid in (False, True):
+        src = work / f"corrupt{'-solid' if solid else ''}.nsz"
+        build_nsz(src, 4 * MIB, 16, False, solid)
+        data = bytearray(src.read_bytes())
+        frames, position = [], data.find(ZSTD_MAGIC)
+        while position >= 0:
+            frames.append(position)
+            position = data.find(ZSTD_MAGIC, position + 1)
+        frame = frames[len(frames) // 2]
+        data[frame:frame + len(ZSTD_MAGIC)] = bytes(len(ZSTD_MAGIC))
+        src.write_bytes(data)
+        cache_dir = work / "cache"
+        try:
+            nszDecompress.decompress(src, cache_dir / nszDecompress.output_name(src), workers=2)
+            errors.append(f"{src.name}: decompressed without error")
+        except nszDecompress.DecompressError:
+            pass
+        except Exception as e:
+            errors.append(f"{src.name}: {type(e).__name__} escaped decompress: {e}")
+        try:
+            rom = nszDecompress.prelaunch(str(src), "1", cache_dir)
+            if rom != str(src):
+                errors.append(f"{src.name}: prelaunch returned {rom}")
+        except Exception as e:
+            errors.append(f"{src.name}: {type(e).__name__} escaped prelaunch: {e}")
+        if cache_dir.exists() and any(cache_dir.iterdir()):
+            errors.append(f"{src.name}: left {[f.name for f in cache_dir.iterdir()]}")
+        src.unlink()
+    return errors
+
+
+###RUNNER################################################################################################################
+def run(src: Path, out_dir: Path, workers: int) -> dict:
+    start = time.perf_counter()
+    child = subprocess.Popen([sys.executable, "-m", "generators.nszDecompress", "--out", str(out_dir), "--workers", str(workers), str(src)],
+                             cwd=CONFIGGEN_DIR, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+    output_text = child.stdout.read().decode(errors="replace")
+    # wait4: peak RSS of this child, its pool workers included
+    _, status, usage = os.wait4(child.pid, 0)
+    seconds = time.perf_counter() - start
+    child.returncode = os.waitstatus_to_exitcode(status)
+    if child.returncode != 0:
+        raise SystemExit(output_text)
+    output = next(out_dir.iterdir())
+    size = output.stat().st_size
+    output.unlink()
+    return {
+        "workers": workers,
+        "seconds": round(seconds, 2),
+        "mib_s": round(size / MIB / seconds, 1),
+        "peak_rss_mib": round(usage.ru_maxrss / 1024, 1),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--size", type=int, default=2048, help="nca size in MiB (default 2048)")
+    parser.add_argument("--block-exponent", type=int, default=20, help="ncz block size 2^N (default 20, 1 MiB)")
+    parser.add_argument("--workers", default=f"1,{os.cpu_count()}", help="comma separated worker counts")
+    parser.add_argument("--encrypted", action="store_true", help="ctr section, exercises the re-encryption")
+    parser.add_argument("--solid", action="store_true", help="single zstd frame instead of blocks")
+    parser.add_argument("--dir", default=None, help="where the synthetic files go (default: a temp dir)")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    work = Path(tempfile.mkdtemp(prefix="nszbench-", dir=args.dir))
+    try:
+        src = work / "synthetic.nsz"
+        start = time.perf_counter()
+        build_nsz(src, args.size * MIB, args.block_exponent, args.encrypted, args.solid)
+        if not args.json:
+            print(f"built {src.stat().st_size / MIB:.0f} MiB nsz ({args.size} MiB nca) in {time.perf_counter() - start:.1f}s")
+        out_dir = work / "out"
+        out_dir.mkdir()
+        results = [run(src, out_dir, int(w)) for w in args.workers.split(",")]
+        src.unlink()
+        errors = check_corrupt(work)
+    finally:
+        shutil.rmtree(work, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps({"size_mib": args.size, "encrypted": args.encrypted, "solid": args.solid, "runs": results,
+                          "errors": errors}, indent=2))
+    else:
+        print(f"{'workers':>8} {'seconds':>9} {'MiB/s':>9} {'peak RSS MiB':>13}")
+        for r in results:
+            print(f"{r['workers']:>8} {r['seconds']:>9.2f} {r['mib_s']:>9.1f} {r['peak_rss_mib']:>13.1f}")
+        print(f"corrupt block: {len(errors)} error(s)")
+        for error in errors:
+            print(f"  {error}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""Cost of applying the es options (generators/optionTable.py).
+
+Every table of generators/emulatorOptions.py is applied to the shipped
+qt-config.ini / Config.json templates with three es configurations: nothing
+set, every option set (first choice of es_features_switch.cfg) and random
+choices. For each one the compiled setter is checked against a plain walk of
+the Option objects (same output, byte for byte) and both are timed.
+
+Usage (from /userdata/system/switch/configgen):
+    python benchmarks/optionbench.py --runs 5000
+    python benchmarks/optionbench.py --json
+"""
+from __future__ import annotations
+
+import argparse
+import configparser
+import json
+import random
+import re
+import sys
+import time
+
+from pathlib import Path
+
+CONFIGGEN_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(CONFIGGEN_DIR))
+
+from generators import emulatorOptions                                          # noqa: E402
+from generators.iniTemplate import IniDocument                                  # noqa: E402
+from generators.optionTable import DEFAULT_IF_UNSET, SKIP, OptionTable, compile_table  # noqa: E402
+
+ES_FEATURES = CONFIGGEN_DIR.parent.parent / "configs" / "emulationstation" / "es_features_switch.cfg"
+FEATURE = re.compile(r'<feature [^>]*value="([^"]+)"[^>]*>(.*?)</feature>', re.S)
+CHOICE = re.compile(r'<choice [^>]*value="([^"]*)"')
+
+
+class FakeSystem:
+    def __init__(self, config):
+        self.config = config
+
+    def isOptSet(self, key):
+        return key in self.config
+
+
+###INPUTS################################################################################################################
+def es_choices() -> dict[str, list[str]]:
+    choices: dict[str, list[str]] = {}
+    for key, body in FEATURE.findall(ES_FEATURES.read_text()):
+        choices.setdefault(key, CHOICE.findall(body))
+    return choices
+
+
+def templates() -> dict[str, object]:
+    parser = configparser.RawConfigParser(strict=False)
+    parser.optionxform = str
+    parser.read(CONFIGGEN_DIR / "qt-config.ini.template")
+    ini = {section: dict(parser.items(section, raw=True)) for section in parser.sections()}
+    return {"ini": ini, "json": json.loads((CONFIGGEN_DIR / "Config.json.template").read_text())}
+
+
+def fresh_target(fmt: str, template):
+    if fmt == "ini":
+        return IniDocument({section: dict(options) for section, options in template.items()})
+    return dict(template)
+
+
+def render(fmt: str, target) -> str:
+    return target.render() if fmt == "ini" else json.dumps(target, indent=2)
+
+
+###REFERENCE#############################################################################################################
+def interpreted(table: OptionTable, system, target) -> None:
+    # what the setter does, without the compilation step
+    for option in table.options:
+        if table.format == "ini" and not target.has_section(option.section):
+            target.add_section(option.section)
+        if option.es_key is not None and system.isOptSet(option.es_key):
+            value, user = system.config[option.es_key], True
+            if option.transform is not None:
+                value = option.transform(value)
+        else:
+            value, user = option.default, False
+        if value is SKIP:
+            continue
+        if table.format == "json":
+            target[option.key] = value
+            continue
+        target.set(option.section, option.key, value)
+        policy = option.default_policy
+        if policy is None:
+            continue
+        if policy is DEFAULT_IF_UNSET:
+            policy = "false" if user else "true"
+        elif callable(policy):
+            policy = policy(value)
+        target.set(option.section, option.key + "\\default", policy)
+
+
+###BENCH#################################################################################################################
+def _time(func, table, system, fmt, template, runs) -> float:
+    targets = [fresh_target(fmt, template) for _ in range(runs)]
+    start = time.perf_counter()
+    for target in targets:
+        func(table, system, target)
+    return (time.perf_counter() - start) / runs * 1e6
+
+
+def bench_table(table: OptionTable, choices: dict[str, list[str]], template, runs: int, rng: random.Random) -> dict:
+    keys = table.es_keys()
+    missing = [key for key in keys if not choices.get(key)]
+    cases = {
+        "unset": {},
+        "all set": {key: choices[key][0] for key in keys if choices.get(key)},
+        "random": {key: rng.choice(choices[key]) for key in keys if choices.get(key) and rng.random() < 0.5},
+    }
+    start = time.perf_counter()
+    setter = compile_table(table)
+    compile_us = (time.perf_counter() - start) * 1e6
+
+    def compiled(table, system, target):
+        setter(system, target)
+
+    result = {"table": table.name, "version": table.version, "options": len(table.options), "es_keys": len(keys),
+              "missing_choices": missing, "compile_us": compile_us, "cases": {}}
+    for name, config in cases.items():
+        system = FakeSystem(config)
+        a, b = fresh_target(table.format, template), fresh_target(table.format, template)
+        interpreted(table, system, a)
+        setter(system, b)
+        if render(table.format, a) != render(table.format, b):
+            raise SystemExit(f"{table.name} / {name}: compiled setter output differs")
+        result["cases"][name] = {
+            "set": len(config),
+            "compiled_us": _time(compiled, table, system, table.format, template, runs),
+            "interpreted_us": _time(interpreted, table, system, table.format, template, runs),
+        }
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=2000, help="applications per table and case (default 2000)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    choices = es_choices()
+    bases = templates()
+    rng = random.Random(args.seed)
+    tables = [value for value in vars(emulatorOptions).values() if isinstance(value, OptionTable)]
+    results = [bench_table(table, choices, bases[table.format], args.runs, rng) for table in tables]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    print(f"{'table':<16} {'case':<8} {'set':>4} {'compiled us':>12} {'walk us':>9} {'speedup':>8}")
+    for r in results:
+        for name, case in r["cases"].items():
+            print(f"{r['table'] + ' v' + str(r['version']):<16} {name:<8} {case['set']:>4} {case['compiled_us']:>12.2f} "
+                  f"{case['interpreted_us']:>9.2f} {case['interpreted_us'] / case['compiled_us']:>7.2f}x")
+        print(f"{'':<16} {r['options']} option(s), {r['es_keys']} es key(s), compiled in {r['compile_us']:.0f} us"
+              + (f", no es choices for {', '.join(r['missing_choices'])}" if r["missing_choices"] else ""))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,213 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+"""switch-padd state machine and service loop (generators/padDaemon.py).
+
+Drives PadState with a fake topology, a fake SDL probe and injected uevents:
+filtering, settling of a hotplug burst into one probe, the "settling" answer
+while it is pending, lazy probing of another sdl version and the resync after
+lost events. Then runs serve() on a temporary socket with a uevent socket that
+overruns (ENOBUFS) and checks the daemon still answers, and reports the
+request latency.
+
+Usage (from /userdata/system/switch/configgen):
+    python benchmarks/padbench.py --requests 500
+    python benchmarks/padbench.py --json
+"""
+from __future__ import annotations
+
+import argparse
+import errno
+import json
+import os
+import signal
+import socket
+import sys
+import tempfile
+import threading
+import time
+import types
+
+from dataclasses import dataclass
+from pathlib import Path
+
+CONFIGGEN_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(CONFIGGEN_DIR))
+
+from generators import padDaemon                                  # noqa: E402
+from generators.padDaemon import SETTLE_DELAY, PadState, request  # noqa: E402
+
+
+@dataclass
+class Input:
+    name: str
+    type: str
+    id: str
+    value: str | int = 1
+    code: str | int | None = None
+
+
+class FakeDevices:
+    """Connected pads, changed by the checks; counts the probes."""
+
+    def __init__(self):
+        self.pads = 1
+        self.probes: list[int] = []
+
+    def topology(self):
+        return types.SimpleNamespace(evdev_hidraw={f"/dev/input/event{n}": f"/dev/hidraw{n}" for n in range(self.pads)})
+
+    def probe(self, sdlversion):
+        self.probes.append(sdlversion)
+        return {f"/dev/hidraw{n}": {"guid": f"{n:032x}", "platform": "Linux", "inputs": {"a": Input("a", "button", "0")}}
+                for n in range(self.pads)}
+
+
+def uevent(action="add", subsystem="hidraw", n=0):
+    return padDaemon.parse_uevent(f"{action}@/devices/x\0ACTION={action}\0DEVPATH=/devices/x\0SUBSYSTEM={subsystem}\0"
+                                  f"DEVNAME=hidraw{n}\0".encode())
+
+
+###STATE MACHINE#########################################################################################################
+def check_state() -> list[str]:
+    errors = []
+
+    def expect(condition, message):
+        if not condition:
+            errors.append(message)
+
+    devices = FakeDevices()
+    state = PadState(devices.probe, devices.topology, sdlversions=(2,))
+    state.refresh()
+    expect(devices.probes == [2] and state.generation == 1, f"initial refresh: probes {devices.probes}")
+
+    expect(not state.uevent(uevent(subsystem="usb"), now=10.0), "usb event not ignored")
+    expect(not state.uevent(uevent(action="bind"), now=10.0), "bind event not ignored")
+    expect(state.settle_timeout(10.0) is None, "ignored events made the state dirty")
+
+    # a hotplug burst: one probe once the bus settled
+    devices.pads = 2
+    for n, kind in enumerate(("hidraw", "input", "input", "hidraw")):
+        expect(state.uevent(uevent(subsystem=kind, n=n), now=10.0 + n * 0.01), f"{kind} event ignored")
+    expect(state.settle_timeout(10.1) > 0, "burst settled too early")
+    reply = state.answer({"cmd": "gamepads", "sdlversion": 2})
+    expect(reply == {"ok": False, "error": "settling"}, f"answer while settling: {reply}")
+    expect(state.settle_timeout(10.0 + SETTLE_DELAY) == 0, "burst never settles")
+    state.refresh()
+    expect(devices.probes == [2, 2], f"burst probes: {devices.probes}")
+    reply = state.answer({"cmd": "gamepads", "sdlversion": 2})
+    expect(reply["ok"] and reply["generation"] == 2 and len(reply["sdl_gamepads"]) == 2 and len(reply["evdev_hidraw"]) == 2,
+           f"answer after the burst: {reply}")
+
+    # another sdl version is probed on the first request only
+    state.answer({"cmd": "gamepads", "sdlversion": 3})
+    state.answer({"cmd": "gamepads", "sdlversion": 3})
+    expect(devices.probes == [2, 2, 3], f"sdl3 probes: {devices.probes}")
+
+    # lost events: a resync probes again after the settle delay
+    devices.pads = 0
+    state.resync(now=20.0)
+    expect(state.settle_timeout(20.0) == SETTLE_DELAY, "resync did not mark the state dirty")
+    state.refresh()
+    reply = state.answer({"cmd": "gamepads", "sdlversion": 2})
+    expect(reply["ok"] and reply["sdl_gamepads"] == {} and reply["evdev_hidraw"] == {}, f"answer after resync: {reply}")
+    expect(state.answer({"cmd": "nope"})["ok"] is False, "unknown command accepted")
+    return errors
+
+
+###SERVICE LOOP##########################################################################################################
+class OverrunSocket:
+    """uevent socket: a few events, then ENOBUFS once, then events again."""
+
+    def __init__(self):
+        self.reader, self.writer = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.reader.setblocking(False)
+        self.overrun = False
+
+    def fileno(self):
+        return self.reader.fileno()
+
+    def send(self, fields_data: bytes, overrun: bool = False) -> None:
+        self.overrun = overrun
+        self.writer.send(fields_data)
+
+    def recv(self, size):
+        if self.overrun:
+            self.overrun = False
+            self.reader.recv(size)
+            raise OSError(errno.ENOBUFS, os.strerror(errno.ENOBUFS))
+        return self.reader.recv(size)
+
+    def close(self):
+        self.reader.close()
+        self.writer.close()
+
+
+def check_serve(requests: int) -> tuple[list[str], list[float]]:
+    errors, latencies = [], []
+    devices = FakeDevices()
+    state = PadState(devices.probe, devices.topology, sdlversions=(2,))
+    uevents = OverrunSocket()
+    socket_path = os.path.join(tempfile.mkdtemp(prefix="padbench-"), "padd.sock")
+    event = b"add@/x\0ACTION=add\0SUBSYSTEM=hidraw\0"
+
+    def client():
+        try:
+            for _ in range(200):
+                if request({"cmd": "ping"}, socket_path, timeout=1.0):
+                    break
+                time.sleep(0.01)
+            uevents.send(event, overrun=True)
+            time.sleep(0.05)
+            if request({"cmd": "ping"}, socket_path, timeout=1.0) is None:
+                errors.append("daemon gone after ENOBUFS")
+            time.sleep(SETTLE_DELAY + 0.3)
+            if state.generation < 2:
+                errors.append(f"no resync probe after ENOBUFS (generation {state.generation})")
+            uevents.send(event)
+            time.sleep(SETTLE_DELAY + 0.3)
+            for _ in range(requests):
+                start = time.perf_counter()
+                reply = request({"cmd": "gamepads", "sdlversion": 2}, socket_path, timeout=1.0)
+                latencies.append((time.perf_counter() - start) * 1e6)
+                if not reply or not reply.get("ok"):
+                    errors.append(f"bad answer {reply}")
+                    break
+        finally:
+            os.kill(os.getpid(), signal.SIGTERM)
+
+    thread = threading.Thread(target=client)
+    thread.start()
+    padDaemon.serve(state, socket_path, uevents)
+    thread.join()
+    os.rmdir(os.path.dirname(socket_path))
+    if state.generation < 3:
+        errors.append(f"events after the overrun not processed (generation {state.generation})")
+    return errors, latencies
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200, help="gamepads requests timed against serve() (default 200)")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    errors = check_state()
+    serve_errors, latencies = check_serve(args.requests)
+    errors += serve_errors
+    latencies.sort()
+    result = {"errors": errors, "requests": len(latencies),
+              "p50_us": latencies[len(latencies) // 2] if latencies else None,
+              "p99_us": latencies[int(len(latencies) * 0.99)] if latencies else None}
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        print(f"state machine + serve: {len(errors)} error(s)")
+        for error in errors:
+            print(f"  {error}")
+        if latencies:
+            print(f"{len(latencies)} gamepads requests: p50 {result['p50_us']:.0f} us, p99 {result['p99_us']:.0f} us")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
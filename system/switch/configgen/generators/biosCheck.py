@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import sys
+
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from generators.configWriter import atomic_write
+from generators.switchPaths import SWITCH_CACHE
+
+eslog = logging.getLogger(__name__)
+
+KEYS_DIR = Path("/userdata/bios/switch/keys")
+FIRMWARE_DIR = Path("/userdata/bios/switch/firmware")
+BIOS_MANIFEST = SWITCH_CACHE / "bios_check.json"
+# ryujinx installs the firmware itself (bis/system/Contents/registered, <id>.nca/00)
+RYUJINX_FIRMWARE_DIR = Path("/userdata/system/configs/Ryujinx/bis/system/Contents/registered")
+RYUJINX_BIOS_MANIFEST = SWITCH_CACHE / "bios_check_ryujinx.json"
+# bump when the checks change so every cached result is done again
+CHECK_VERSION = 2
+
+KEY_LINE = re.compile(r"^\s*([0-9A-Za-z_]+)\s*=\s*([0-9A-Fa-f]+)\s*$")
+# 16 byte keys the emulators derive everything from, header_key is 32 bytes
+KEY_16 = re.compile(r"(master_key|titlekek|key_area_key_(application|ocean|system))_[0-9a-f]{2}")
+NCA_NAME = re.compile(r"([0-9a-f]{32})(\.cnmt)?\.nca")
+NCA_MAGIC = (b"NCA3", b"NCA2")
+
+class BiosError(Exception):
+    pass
+
+@dataclass
+class BiosReport:
+    errors: list[str] = field(default_factory=list)
+    warnings: list[str] = field(default_factory=list)
+    firmware_files: int = 0
+    cached: bool = False
+
+###KEYS#################################################################################################################
+def parse_keys(path: Path, report: BiosReport) -> dict[str, str]:
+    keys = {}
+    with open(path, errors="replace") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip() or line.lstrip()[0] in "#;":
+                continue
+            match = KEY_LINE.match(line)
+            if match is None:
+                report.errors.append(f"{path.name} line {number}: not a 'name = hex value' line")
+                continue
+            name, value = match.group(1).lower(), match.group(2).lower()
+            expected = 64 if name == "header_key" else 32 if KEY_16.fullmatch(name) else None
+            if expected is not None and len(value) != expected:
+                report.errors.append(f"{path.name} line {number}: {name} is {len(value) // 2} bytes, {expected // 2} expected")
+                continue
+            keys[name] = value
+    return keys
+
+def check_prod_keys(path: Path, report: BiosReport) -> dict[str, str]:
+    if not path.is_file():
+        report.errors.append(f"{path.name} missing in {path.parent} (dump it from the console with lockpick)")
+        return {}
+    keys = parse_keys(path, report)
+    if "header_key" not in keys:
+        report.errors.append(f"{path.name} has no header_key")
+    if not any(name.startswith(("master_key_", "key_area_key_application_")) for name in keys):
+        report.errors.append(f"{path.name} has no master_key_xx / key_area_key_application_xx")
+    return keys
+
+def check_title_keys(path: Path, report: BiosReport) -> None:
+    # optional: rights id (16 bytes) = title key (16 bytes)
+    if not path.is_file():
+        return
+    with open(path, errors="replace") as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip() or line.lstrip()[0] in "#;":
+                continue
+            match = KEY_LINE.match(line)
+            if match is None or len(match.group(1)) != 32 or len(match.group(2)) != 32:
+                report.errors.append(f"{path.name} line {number}: not a 'rights id = title key' line")
+
+def max_key_generation(keys: dict[str, str]) -> int:
+    # master key index the keys can decrypt up to
+    indexes = [int(name[-2:], 16) for name in keys if name.startswith(("master_key_", "key_area_key_application_"))]
+    return max(indexes, default=-1)
+
+###FIRMWARE#############################################################################################################
+def _xts_decryptor(key: bytes):
+    # nintendo aes-xts: 0x200 byte sectors, the tweak is the big endian sector number
+    try:
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+        def decrypt(data: bytes, sector: int) -> bytes:
+            return Cipher(algorithms.AES(key), modes.XTS(sector.to_bytes(16, "big"))).decryptor().update(data)
+        return decrypt
+    except ImportError:
+        pass
+    try:
+        from Crypto.Cipher import AES
+    except ImportError:
+        return None
+    data_cipher, tweak_cipher = AES.new(key[:16], AES.MODE_ECB), AES.new(key[16:], AES.MODE_ECB)
+
+    def decrypt(data: bytes, sector: int) -> bytes:
+        tweak = int.from_bytes(tweak_cipher.encrypt(sector.to_bytes(16, "big")), "little")
+        out = bytearray()
+        for offset in range(0, len(data), 16):
+            t = tweak.to_bytes(16, "little")
+            block = bytes(a ^ b for a, b in zip(data[offset:offset + 16], t))
+            out += bytes(a ^ b for a, b in zip(data_cipher.decrypt(block), t))
+            # next tweak: multiply by x in GF(2^128)
+            tweak = ((tweak << 1) ^ (0x87 if tweak >> 127 else 0)) & ((1 << 128) - 1)
+        return bytes(out)
+    return decrypt
+
+def firmware_files(firmware_dir: Path) -> dict[str, tuple[Path, os.stat_result]]:
+    # <id>.nca files, or <id>.nca/00 directories (ryujinx registered contents), with their stat
+    files = {}
+    try:
+        entries = list(os.scandir(firmware_dir))
+    except OSError:
+        return files
+    for entry in entries:
+        if not NCA_NAME.fullmatch(entry.name.lower()):
+            continue
+        try:
+            if entry.is_dir():
+                path = Path(entry.path) / "00"
+                st = path.stat()
+            else:
+                path, st = Path(entry.path), entry.stat()
+        except OSError:
+            continue
+        files[entry.name] = path, st
+    return files
+
+def check_nca(name: str, path: Path, decrypt) -> dict:
+    """Hash (the name of a content nca is its sha256) and header of one firmware nca."""
+    result = {"error": None, "generation": None}
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        header = f.read(0x400)
+        digest.update(header)
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    if len(header) < 0x400:
+        result["error"] = f"firmware {name}: truncated"
+    elif digest.hexdigest()[:32] != NCA_NAME.fullmatch(name.lower()).group(1):
+        result["error"] = f"firmware {name}: corrupted (its sha256 does not match its name)"
+    elif decrypt is not None:
+        plain = decrypt(header[:0x200], 0) + decrypt(header[0x200:0x400], 1)
+        if plain[0x200:0x204] not in NCA_MAGIC:
+            result["error"] = f"firmware {name}: header does not decrypt with the header_key of prod.keys"
+        else:
+            result["generation"] = max(plain[0x206], plain[0x220])
+    return result
+
+###MANIFEST#############################################################################################################
+def _stamp(paths: list[Path]) -> list:
+    stamp = []
+    for path in paths:
+        try:
+            st = path.stat()
+            stamp.append([str(path), st.st_size, st.st_mtime_ns])
+        except OSError:
+            stamp.append([str(path), None, None])
+    return stamp
+
+def validate_bios(keys_dir: Path = KEYS_DIR, firmware_dir: Path | None = FIRMWARE_DIR,
+                  manifest_file: Path = BIOS_MANIFEST) -> BiosReport:
+    """Checks prod.keys / title.keys and the firmware ncas.
+
+    Warm path: the manifest is read, the key files and the firmware ncas
+    (one scandir) are stat'ed, nothing else when none of them changed. When
+    they did, only the ncas whose size/mtime changed are hashed again.
+    """
+    prod_keys, title_keys = keys_dir / "prod.keys", keys_dir / "title.keys"
+    files = firmware_files(firmware_dir) if firmware_dir is not None else {}
+    # the ncas themselves: a file replaced in place does not change the directory mtime
+    stamp = [CHECK_VERSION] + _stamp([prod_keys, title_keys]) + [
+        [name, st.st_size, st.st_mtime_ns] for name, (_, st) in sorted(files.items())]
+    try:
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+    if manifest.get("stamp") == stamp:
+        cached = manifest["report"]
+        return BiosReport(cached["errors"], cached["warnings"], cached["firmware_files"], cached=True)
+
+    report = BiosReport()
+    keys = check_prod_keys(prod_keys, report)
+    check_title_keys(title_keys, report)
+
+    known = manifest.get("ncas", {})
+    header_key = keys.get("header_key")
+    # the header check depends on the keys: redone when header_key changed
+    key_id = hashlib.sha256(header_key.encode()).hexdigest()[:16] if header_key else None
+    ncas = {}
+    if firmware_dir is not None:
+        report.firmware_files = len(files)
+        if not files:
+            report.warnings.append(f"no firmware in {firmware_dir}")
+        decrypt = None
+        if header_key is not None:
+            decrypt = _xts_decryptor(bytes.fromhex(header_key))
+            if decrypt is None:
+                report.warnings.append("cryptography / pycryptodome missing, firmware headers not checked")
+        for name, (path, st) in sorted(files.items()):
+            entry = known.get(name)
+            if entry is None or entry["size"] != st.st_size or entry["mtime_ns"] != st.st_mtime_ns or entry["key"] != key_id:
+                entry = dict(check_nca(name, path, decrypt), size=st.st_size, mtime_ns=st.st_mtime_ns,
+                             key=key_id if decrypt is not None else None)
+            ncas[name] = entry
+
+        failed = [entry["error"] for entry in ncas.values() if entry["error"]]
+        if failed and len(failed) == len(ncas) and all("header does not decrypt" in error for error in failed):
+            report.errors.append(f"header_key of {prod_keys.name} does not decrypt any firmware nca (wrong keys file)")
+        else:
+            report.errors.extend(failed)
+        generation = max((entry["generation"] for entry in ncas.values() if entry["generation"]), default=0)
+        if keys and generation and generation - 1 > max_key_generation(keys):
+            report.errors.append(f"the firmware needs master_key_{generation - 1:02x}, {prod_keys.name} stops at "
+                                 f"master_key_{max_key_generation(keys):02x}: dump the keys of the same console firmware")
+
+    try:
+        atomic_write(manifest_file, json.dumps({"stamp": stamp, "ncas": ncas, "report": {
+            "errors": report.errors, "warnings": report.warnings, "firmware_files": report.firmware_files}}).encode())
+    except OSError as e:
+        eslog.warning(f"unable to write {manifest_file}: {e}")
+    return report
+
+def check_bios(mode: str | None, rom: str | None = None, firmware_dir: Path | None = FIRMWARE_DIR,
+               manifest_file: Path = BIOS_MANIFEST) -> BiosReport | None:
+    """switch_bios_check es option (on unless "0"): raises BiosError with the first problem found."""
+    # homebrew (.nro) runs without keys nor firmware
+    if mode == "0" or (rom is not None and rom.lower().endswith(".nro")):
+        return None
+    report = validate_bios(firmware_dir=firmware_dir, manifest_file=manifest_file)
+    for warning in report.warnings:
+        eslog.warning(f"bios check: {warning}")
+    for error in report.errors:
+        eslog.error(f"bios check: {error}")
+    if report.errors:
+        more = f" (+{len(report.errors) - 1} more, see the launch log)" if len(report.errors) > 1 else ""
+        raise BiosError(report.errors[0] + more)
+    return report
+
+if __name__ == "__main__":
+    # python -m generators.biosCheck [firmware dir]
+    firmware = Path(sys.argv[1]) if len(sys.argv) > 1 else FIRMWARE_DIR
+    result = validate_bios(firmware_dir=firmware)
+    print(f"{result.firmware_files} firmware nca(s){' (cached)' if result.cached else ''}")
+    for message in result.warnings:
+        print(f"warning: {message}")
+    for message in result.errors:
+        print(f"error: {message}")
+    sys.exit(1 if result.errors else 0)
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+
+from pathlib import Path
+from typing import Callable
+
+eslog = logging.getLogger(__name__)
+
+def digest_bytes(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def atomic_write(path: Path, data: bytes, mode: int = 0o644) -> None:
+    # temp file + fsync + rename in the same directory: readers see the old or the new file, never half of it
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix="." + path.name + ".")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            os.fchmod(f.fileno(), mode)
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.lexists(tmp):
+            os.unlink(tmp)
+        raise
+
+###STRUCTURED DIFFS#####################################################################################################
+def _flatten(value, prefix, out):
+    if isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(item, f"{prefix}.{key}" if prefix else str(key), out)
+    elif isinstance(value, list):
+        for index, item in enumerate(value):
+            _flatten(item, f"{prefix}[{index}]", out)
+    else:
+        out[prefix] = value
+    return out
+
+def _diff_flat(old: dict, new: dict) -> dict:
+    return {
+        "changed": {k: [old[k], new[k]] for k in old if k in new and old[k] != new[k]},
+        "added": {k: new[k] for k in new if k not in old},
+        "removed": {k: old[k] for k in old if k not in new},
+    }
+
+def json_diff(old_text: str, new_text: str) -> dict:
+    try:
+        old = json.loads(old_text)
+    except ValueError:
+        old = {}
+    return _diff_flat(_flatten(old, "", {}), _flatten(json.loads(new_text), "", {}))
+
+def _ini_flat(text: str) -> dict:
+    values = {}
+    section = ""
+    for line in text.splitlines():
+        line = line.strip()
+        if not line or line[0] in "#;":
+            continue
+        if line.startswith("[") and line.endswith("]"):
+            section = line[1:-1]
+        elif "=" in line:
+            key, value = line.split("=", 1)
+            values[f"{section}/{key.strip()}"] = value.strip()
+    return values
+
+def ini_diff(old_text: str, new_text: str) -> dict:
+    return _diff_flat(_ini_flat(old_text), _ini_flat(new_text))
+
+###WRITER###############################################################################################################
+def write_if_changed(path: Path, content: str | bytes, differ: Callable[[str, str], dict] | None = None) -> bool:
+    """Write content to path only when it differs from what is on disk.
+
+    The digest of the last written content is kept in <path>.sha256. When the
+    file on disk no longer matches it (the emulator or the user changed it),
+    a structured diff between that file and the new content is written to
+    <path>.diff.json before the file is replaced. Returns True if the file
+    was written.
+    """
+    path = Path(path)
+    data = content.encode() if isinstance(content, str) else content
+    new_digest = digest_bytes(data)
+    digest_file = path.with_name(path.name + ".sha256")
+
+    try:
+        old = path.read_bytes()
+    except FileNotFoundError:
+        old = None
+    try:
+        stored_digest = digest_file.read_text().strip()
+    except OSError:
+        stored_digest = None
+
+    if old is not None:
+        old_digest = digest_bytes(old)
+        if stored_digest and stored_digest != old_digest != new_digest and differ is not None:
+            report = differ(old.decode(errors="replace"), data.decode(errors="replace"))
+            report["file"] = str(path)
+            atomic_write(path.with_name(path.name + ".diff.json"), json.dumps(report, indent=2).encode())
+            eslog.info(f"{path} was modified outside of configgen: {len(report['changed'])} changed, "
+                       f"{len(report['added'])} added, {len(report['removed'])} removed")
+        if old_digest == new_digest:
+            if stored_digest != new_digest:
+                atomic_write(digest_file, (new_digest + "\n").encode())
+            return False
+
+    atomic_write(path, data)
+    atomic_write(digest_file, (new_digest + "\n").encode())
+    return True
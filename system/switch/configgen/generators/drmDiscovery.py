@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import sys
+
+from dataclasses import asdict, dataclass
+from pathlib import Path
+
+from generators.configWriter import atomic_write
+from generators.switchPaths import SWITCH_CACHE
+
+eslog = logging.getLogger(__name__)
+
+BATOCERA_CONF = Path("/userdata/system/batocera.conf")
+GPU_CACHE = SWITCH_CACHE / "gpu.json"
+
+@dataclass(frozen=True)
+class DrmConnector:
+    name: str        # card0-HDMI-A-1
+    card: str        # card0
+    status: str      # connected / disconnected / unknown
+
+@dataclass(frozen=True)
+class DrmCard:
+    path: str        # /sys/class/drm/card0
+    vendor: str      # 0x1002
+    device: str      # 0x73BF
+
+    @property
+    def preferred_gpu(self) -> str:
+        # same format as ryujinx writes it: 0x1002_0x73BF
+        return self.vendor + "_" + self.device
+
+def _read(path: str) -> str | None:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+def _pci_id(value: str) -> str:
+    return value.upper().replace("0X", "0x")
+
+def list_connectors(sysfs: str = "/sys") -> list[DrmConnector]:
+    drm = os.path.join(sysfs, "class", "drm")
+    connectors = []
+    try:
+        cards = sorted(entry.name for entry in os.scandir(drm) if re.fullmatch(r"card[0-9]+", entry.name))
+    except OSError:
+        return connectors
+    for card in cards:
+        try:
+            names = sorted(entry.name for entry in os.scandir(os.path.join(drm, card)) if entry.name.startswith(card + "-"))
+        except OSError:
+            continue
+        for name in names:
+            status = _read(os.path.join(drm, card, name, "status")) or "unknown"
+            connectors.append(DrmConnector(name=name, card=card, status=status))
+    return connectors
+
+def read_videooutput(batocera_conf: Path = BATOCERA_CONF) -> str | None:
+    # what batocera-settings-get global.videooutput returns, without the fork
+    try:
+        with open(batocera_conf) as f:
+            for line in f:
+                line = line.strip()
+                if line.startswith("global.videooutput="):
+                    return line.split("=", 1)[1].strip() or None
+    except OSError:
+        pass
+    return None
+
+def select_connector(connectors: list[DrmConnector], videooutput: str | None) -> DrmConnector | None:
+    connected = [c for c in connectors if c.status == "connected"]
+    if not connected:
+        return None
+    if videooutput:
+        display_type = videooutput.split("-")[0]
+        if display_type == "DisplayPort":
+            # workaround some cards using DisplayPort as the xorg output name
+            display_type = "DP"
+    else:
+        # no preference, first connected display
+        display_type = connected[0].name.split("-", 1)[1].split("-")[0]
+    for connector in connected:
+        if display_type in connector.name:
+            return connector
+    return None
+
+def read_card(sysfs: str, card: str) -> DrmCard | None:
+    path = os.path.join(sysfs, "class", "drm", card)
+    vendor = _read(os.path.join(path, "device", "vendor"))
+    device = _read(os.path.join(path, "device", "device"))
+    if vendor is None or device is None:
+        return None
+    return DrmCard(path=path, vendor=_pci_id(vendor), device=_pci_id(device))
+
+def discover_card(sysfs: str = "/sys", batocera_conf: Path = BATOCERA_CONF, cache_file: Path | None = GPU_CACHE) -> DrmCard | None:
+    """Card driving the preferred (or first) connected display.
+
+    The result is cached per boot, keyed on the connector set and the
+    global.videooutput setting, so it is only recomputed after a hotplug or
+    a settings change.
+    """
+    connectors = list_connectors(sysfs)
+    videooutput = read_videooutput(batocera_conf)
+    key = {
+        "boot_id": _read(os.path.join("/proc", "sys", "kernel", "random", "boot_id")),
+        "videooutput": videooutput,
+        "connectors": [[c.name, c.status] for c in connectors],
+    }
+
+    if cache_file is not None:
+        try:
+            with open(cache_file) as f:
+                cached = json.load(f)
+            if cached.get("key") == key:
+                return DrmCard(**cached["card"]) if cached.get("card") else None
+        except (OSError, ValueError, TypeError):
+            pass
+
+    connector = select_connector(connectors, videooutput)
+    card = read_card(sysfs, connector.card) if connector is not None else None
+    eslog.debug(f"drm: videooutput={videooutput} connector={connector.name if connector else None} card={card}")
+
+    if cache_file is not None:
+        try:
+            atomic_write(Path(cache_file), json.dumps({"key": key, "card": asdict(card) if card else None}).encode())
+        except OSError as e:
+            eslog.warning(f"unable to write {cache_file}: {e}")
+    return card
+
+if __name__ == "__main__":
+    sysfs = sys.argv[1] if len(sys.argv) > 1 else "/sys"
+    for connector in list_connectors(sysfs):
+        print(f"{connector.name:<24} {connector.status}")
+    card = discover_card(sysfs, cache_file=None)
+    print(f"card: {card.path if card else None}  preferred_gpu: {card.preferred_gpu if card else None}")
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import filecmp
+import functools
 import logging
 import os
 from os import environ
@@ -20,16 +21,25 @@ from configgen.utils import vulkan
 from configgen import Command as Command
 from configgen.batoceraPaths import CONFIGS, HOME, ROMS, SAVES, mkdir_if_not_exists
 from configgen.controller import generate_sdl_game_controller_config
+from configgen.exceptions import BatoceraException
 from configgen.generators.Generator import Generator
 from configgen.utils.configparser import CaseSensitiveRawConfigParser
 from configgen.input import Input, InputDict, InputMapping
-from datetime import datetime
+from generators.biosCheck import BiosError, check_bios
+from generators.configWriter import ini_diff, write_if_changed
+from generators.emulatorOptions import YUZU_OPTIONS, YUZU_SERVICE_OPTIONS
+from generators.hidTopology import hid_topology
+from generators.iniTemplate import load_template
+from generators.optionTable import apply_options
+from generators.padCache import cached_gamepads
+from generators.padDaemon import query_gamepads
+from generators.shaderCache import manage_shader_cache, warm_shader_cache
+from generators.switchLayout import eden_layout, overlay_enabled, reconcile
+from generators.switchLog import configure_switch_logging, flush_switch_logs, get_switch_logger
+from generators.switchPaths import SWITCH_CACHE
+from generators.titleProfiles import apply_title_profile
 from evdev import InputDevice, ecodes
 
-os.environ["PYSDL2_DLL_PATH"] = "/userdata/system/switch/configgen/sdl2/"
-
-import sdl2
-from sdl2 import joystick
 from ctypes import create_string_buffer
 
 eslog = logging.getLogger(__name__)
@@ -44,77 +54,36 @@ class DictToObject:
                 value = DictToObject(value)
             setattr(self, key, value)
 
-def switch_log(msg):
-    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"{ts} [SWITCH-DEBUG] {msg}", flush=True)
+# buffered, written to es_launch_stdout.log once at the end of generate()
+switchlog = get_switch_logger("eden")
+
+# SDL drivers of the pad detection and of the appimage: both have to agree for
+# the guids written to qt-config.ini to match what the emulator sees
+SDL_HIDAPI_ENVIRONMENT = {
+    "SDL_JOYSTICK_HIDAPI": "1",
+    "SDL_JOYSTICK_HIDAPI_XBOX": "0",
+    "SDL_JOYSTICK_HIDAPI_XBOX_ONE": "0",
+    "SDL_JOYSTICK_HIDAPI_SWITCH": "0",
+    "SDL_JOYSTICK_HIDAPI_STEAMDECK": "0",
+    "SDL_JOYSTICK_HIDAPI_PS4": "0",
+    "SDL_JOYSTICK_HIDAPI_PS5": "0",
+}
 
-def log_stderr(msg):
-    ts = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    print(f"{ts} [SWITCH-DEBUG] {msg}", file=sys.stdout)	
 ###START PAD DETECTION--SEE-ES_LAUNCH_STDOUT.LOG#######################################################################
 #######################################################################################################################
-def hidraw_get_guid(devpath):
-    try:
-        vid = pid = None
-        p = devpath
-        while p != "/" and p:
-            if os.path.exists(os.path.join(p, "idVendor")):
-                with open(os.path.join(p, "idVendor")) as f:
-                    vid = f.read().strip()
-                with open(os.path.join(p, "idProduct")) as f:
-                    pid = f.read().strip()
-                break
-            p = os.path.dirname(p)
-        if not vid or not pid:
-            return "00000000000000000000000000000000"
-        return f"{vid}{pid}000000000000000000000000"
-    except:
-        return "00000000000000000000000000000000"
-def list_hidraw_devices():
-    devices = []
-    for h in glob.glob("/sys/class/hidraw/hidraw*"):
-        dev = os.path.basename(h)
-        devpath = os.path.realpath(os.path.join(h, "device"))
-        # Nom humain
-        name = "unknown"
-        try:
-            with open(os.path.join(devpath, "uevent")) as f:
-                for line in f:
-                    if line.startswith("HID_NAME="):
-                        name = line.strip().split("=",1)[1]
-        except:
-            pass
-        # Bus USB / Bluetooth
-        bus = os.path.basename(devpath).split(":")[0]
-        guid = hidraw_get_guid(devpath)
-        devices.append({
-            "hidraw": f"/dev/{dev}",
-            "name": name,
-            "bus": bus,
-            "guid": guid
-        })
-    return devices
-def map_hidraw_to_evdev():
-    mapping = {}
-    for h in glob.glob("/sys/class/hidraw/hidraw*"):
-        hid = os.path.basename(h)
-        devpath = os.path.realpath(os.path.join(h, "device"))
-        for root, dirs, files in os.walk(devpath):
-            for d in dirs:
-                if d.startswith("event"):
-                    mapping[f"/dev/{hid}"] = f"/dev/input/{d}"
-    return mapping
-hidraws = list_hidraw_devices()
-hidmap = map_hidraw_to_evdev()
-for d in hidraws:
-    hid = d["hidraw"]
-    ev = hidmap.get(hid, "no evdev")
-
-    switch_log(f"[HID] {d['name']}")
-    switch_log(f"  hidraw = {hid}")
-    switch_log(f"  evdev  = {ev}")
-    #switch_log(f"  bus    = {d['bus']}")
-    switch_log(f"  guid   = {d['guid']}")
+@functools.cache
+def log_hid_devices():
+    # only once per process, from generate(), never at import time
+    topology = hid_topology()
+    for d in topology.devices:
+        hid = d.hidraw
+        ev = topology.hidraw_to_evdev(hid) or "no evdev"
+
+        switchlog.info("[HID] %s", d.name)
+        switchlog.info("  hidraw = %s", hid)
+        switchlog.info("  evdev  = %s", ev)
+        #switchlog.info("  bus    = %s", d.bus)
+        switchlog.info("  guid   = %s", d.guid)
 ###END PAD DETECTION--SEE-ES_LAUNCH_STDOUT.LOG#########################################################################
 #######################################################################################################################
 
@@ -184,62 +153,29 @@ def sdlmapping_to_controller(mapping, guid):
 
     return current_controller
 
-def evdev_to_hidraw():
-
-    evdev_hidraw = {}
-
-    for hid_path in glob.glob('/sys/class/hidraw/hidraw*'):
-        # Obtenir le chemin du périphérique
-        hid_dev = os.path.realpath(os.path.join(hid_path, "device"))
-
-        events = []
-        for root, dirs, files in os.walk(hid_dev):
-            for dir in dirs:
-                if dir.startswith("event"):
-                    event_path = os.path.join(root, dir)
-                    if "/input" in event_path and "/event" in event_path:
-                        events.append(event_path)
+@functools.cache
+def load_sdl2():
+    # loading libSDL2 is only needed for the pad detection
+    os.environ["PYSDL2_DLL_PATH"] = "/userdata/system/switch/configgen/sdl2/"
+    import sdl2
+    from sdl2 import joystick
+    return sdl2, joystick
 
-        if events:
-            for ev in events:
-                ev_name = os.path.basename(ev)
-                hid_name = os.path.basename(hid_path)
-                evdev_hidraw[f"/dev/input/{ev_name}"] = f"/dev/{hid_name}"
-    return evdev_hidraw
-
-def detect_bus_from_hidraw(hidraw_path: str):
-    # pass /dev/hidrawx
-    hidraw_device = os.path.basename(hidraw_path)
-    sysfs_path = f"/sys/class/hidraw/{hidraw_device}/device"
-
-    if not os.path.exists(sysfs_path):
-        return f"Device {hidraw_device} not found in sysfs"
+def list_sdl_gamepads(sdlversion):
+    # SDL is only initialised when the connected devices changed since the last launch
+    return cached_gamepads(sdlversion, lambda: probe_sdl_gamepads(sdlversion), Input)
 
-    # Resolve the real path (follows symlinks)
-    try:
-        real_device_path = os.path.realpath(sysfs_path)
-        bus_prefix = os.path.basename(real_device_path).split(":")[0]
-    except Exception as e:
-        return f"Error reading device path: {e}"
+def probe_sdl_gamepads(sdlversion):
 
-    return bus_prefix[2:]
+    sdl2, joystick = load_sdl2()
 
-def list_sdl_gamepads(sdlversion):
-    
-    
-    os.environ["SDL_JOYSTICK_HIDAPI"] = "1"
-    os.environ["SDL_JOYSTICK_HIDAPI_XBOX"] = "0"
-    os.environ["SDL_JOYSTICK_HIDAPI_XBOX_ONE"] = "0"
-    os.environ["SDL_JOYSTICK_HIDAPI_SWITCH"] = "0"
-    os.environ["SDL_JOYSTICK_HIDAPI_STEAMDECK"] = "0"
-    os.environ["SDL_JOYSTICK_HIDAPI_PS4"] = "0"
-    os.environ["SDL_JOYSTICK_HIDAPI_PS5"] = "0"
+    os.environ.update(SDL_HIDAPI_ENVIRONMENT)
 
     sdl2.SDL_ClearError()
     try:
-      ret = sdl2.SDL_Init(sdl2.SDL_INIT_GAMECONTROLLER)
-    except:
-      print("An exception occurred")
+        sdl2.SDL_Init(sdl2.SDL_INIT_GAMECONTROLLER)
+    except Exception:
+        switchlog.exception("[SDL] SDL_Init failed")
 
     count = joystick.SDL_NumJoysticks()
 
@@ -264,13 +200,12 @@ def list_sdl_gamepads(sdlversion):
 
             #sdl3 have implemented bus type in hidraw guid, we still use old sdl2 for this script
             if 'hidraw' in joy_path and sdlversion == 3:
-                bustype = detect_bus_from_hidraw(joy_path)
-                guidstring = bustype + guidstring[2:]
+                bustype = hid_topology().bus(joy_path)
+                if bustype is not None:
+                    guidstring = bustype[2:] + guidstring[2:]
 
             mapping = sdl2.SDL_GameControllerMapping(pad);
-            import pprint
-            pprint.pprint(mapping)
-            eslog.debug(str(mapping))
+            switchlog.debug("[SDL] %s mapping %s", joy_path, mapping)
             controller = sdlmapping_to_controller(str(mapping), guidstring)
             sdl_devices[joy_path] = controller
 
@@ -291,6 +226,9 @@ class EdenGenerator(Generator):
 
     def generate(self, system, rom, playersControllers, metadata, guns, wheels, gameResolution):
 
+        configure_switch_logging(system.config.get("switch_log_level"))
+        log_hid_devices()
+
         emulator = system.config['emulator']
 
         if emulator == 'citron-emu':
@@ -310,143 +248,47 @@ class EdenGenerator(Generator):
         st = os.stat("/userdata/system/switch/appimages/"+emulator+".AppImage")
         os.chmod("/userdata/system/switch/appimages/"+emulator+".AppImage", st.st_mode | stat.S_IEXEC)
 
-        #Create Keys/Firmware Folder
-        mkdir_if_not_exists(Path("/userdata/bios/switch"))
-        mkdir_if_not_exists(Path("/userdata/bios/switch/keys"))
-        mkdir_if_not_exists(Path("/userdata/bios/switch/firmware"))
-        mkdir_if_not_exists(Path("/userdata/system/configs/yuzu"))
-        mkdir_if_not_exists(Path("/userdata/system/configs/yuzu/nand"))
-        mkdir_if_not_exists(Path("/userdata/system/configs/yuzu/nand/system"))
-        mkdir_if_not_exists(Path("/userdata/system/configs/yuzu/nand/system/Contents"))
-
-        #Link Yuzu firmware/key folder
-        #KEY-------
-        if os.path.exists("/userdata/system/configs/yuzu/keys"):
-            if not os.path.islink("/userdata/system/configs/yuzu/keys"):
-                shutil.rmtree("/userdata/system/configs/yuzu/keys")
-                os.symlink("/userdata/bios/switch/keys", "/userdata/system/configs/yuzu/keys")
-            else:
-                current_target = os.readlink("/userdata/system/configs/yuzu/keys")
-                if current_target != "/userdata/bios/switch/keys":
-                    os.unlink("/userdata/system/configs/yuzu/keys")
-                    os.symlink("/userdata/bios/switch/keys", "/userdata/system/configs/yuzu/keys")
-        else:
-            os.symlink("/userdata/bios/switch/keys", "/userdata/system/configs/yuzu/keys")
-        #FIRMWARE-------
-        if os.path.exists("/userdata/system/configs/yuzu/nand/system/Contents/registered"):
-            if not os.path.islink("/userdata/system/configs/yuzu/nand/system/Contents/registered"):
-                shutil.rmtree("/userdata/system/configs/yuzu/nand/system/Contents/registered")
-                os.symlink("/userdata/bios/switch/firmware", "/userdata/system/configs/yuzu/nand/system/Contents/registered")
-            else:
-                current_target = os.readlink("/userdata/system/configs/yuzu/nand/system/Contents/registered")
-                if current_target != "/userdata/bios/switch/firmware":
-                    os.unlink("/userdata/system/configs/yuzu/nand/system/Contents/registered")
-                    os.symlink("/userdata/bios/switch/firmware", "/userdata/system/configs/yuzu/nand/system/Contents/registered")
-        else:
-            os.symlink("/userdata/bios/switch/firmware", "/userdata/system/configs/yuzu/nand/system/Contents/registered")
-
-        #Link Yuzu App Directory to /system/configs/yuzu
-        mkdir_if_not_exists(Path("/userdata/system/.local"))
-        mkdir_if_not_exists(Path("/userdata/system/.local/share"))
-
-        #Remove .local/share/yuzu if it exists and isnt' a link
-        if os.path.exists("/userdata/system/.local/share/"+emudir):
-            if not os.path.islink("/userdata/system/.local/share/"+emudir):
-                shutil.rmtree("/userdata/system/.local/share/"+emudir)
-
-        if not os.path.exists("/userdata/system/.local/share/"+emudir):
-            st = os.symlink("/userdata/system/configs/yuzu","/userdata/system/.local/share/"+emudir)
-
-        #Link Yuzu Config Directory to /system/configs/yuzu
-        mkdir_if_not_exists(Path("/userdata/system/.config"))
-
-        #Remove .config/yuzu if it exists and isnt' a link
-        if os.path.exists("/userdata/system/.config/"+emudir):
-            if not os.path.islink("/userdata/system/.config/"+emudir):
-                shutil.rmtree("/userdata/system/.config/"+emudir)
-
-        if not os.path.exists("/userdata/system/.config/"+emudir):
-            st = os.symlink("/userdata/system/configs/yuzu","/userdata/system/.config/"+emudir)
-
-        #Remove configs/emu if it exists and isnt' a link
-        if os.path.exists("/userdata/system/configs/"+emudir):
-            if not os.path.islink("/userdata/system/configs/"+emudir):
-                shutil.rmtree("/userdata/system/configs/"+emudir)
-
-        if not os.path.exists("/userdata/system/configs/"+emudir):
-            st = os.symlink("/userdata/system/configs/yuzu","/userdata/system/configs/"+emudir)
-
-        cachedir = ".cache/" + emudir
-        #Link .cache Directory to /userdata/saves/yuzu
-        mkdir_if_not_exists(Path("/userdata/system/.cache"))
-        mkdir_if_not_exists(Path("/userdata/system/" + cachedir))
-
-        #remove game_list if it exists and isn't a link
-        if os.path.exists("/userdata/system/.cache/"+emudir+"/game_list"):
-            if not os.path.islink("/userdata/system/.cache/"+emudir+"/game_list"):
-                shutil.rmtree("/userdata/system/.cache/"+emudir+"/game_list")
-
-        mkdir_if_not_exists(Path("/userdata/saves/yuzu"))
-        mkdir_if_not_exists(Path("/userdata/saves/yuzu/game_list"))
-        if not os.path.exists("/userdata/system/.cache/"+emudir+"/game_list"):
-            st = os.symlink("/userdata/saves/yuzu/game_list","/userdata/system/.cache/"+emudir+"/game_list")
-
-        #Create Save/Mods Folder
-        mkdir_if_not_exists(Path("/userdata/system/configs/yuzu/nand/user"))
-        mkdir_if_not_exists(Path("/userdata/system/configs/yuzu/nand/user/save"))
-        mkdir_if_not_exists(Path("/userdata/system/configs/yuzu/load"))
-        mkdir_if_not_exists(Path("/userdata/saves/switch"))
-        mkdir_if_not_exists(Path("/userdata/saves/switch/eden_citron"))
-        mkdir_if_not_exists(Path("/userdata/saves/switch/eden_citron/save"))
-        mkdir_if_not_exists(Path("/userdata/saves/switch/eden_citron/save/save_user"))
-        mkdir_if_not_exists(Path("/userdata/saves/switch/eden_citron/save/save_system"))
-        mkdir_if_not_exists(Path("/userdata/saves/switch/eden_citron/mods"))
-        mkdir_if_not_exists(Path("/userdata/system/configs/yuzu/nand/system/save"))
-
-        #Link YUZU SAVE Directory to /userdata/saves/eden_citron/save_user
-        if os.path.exists("/userdata/system/configs/yuzu/nand/user/save"):
-            if not os.path.islink("/userdata/system/configs/yuzu/nand/user/save"):
-                shutil.rmtree("/userdata/system/configs/yuzu/nand/user/save")
-                os.symlink("/userdata/saves/switch/eden_citron/save/save_user", "/userdata/system/configs/yuzu/nand/user/save")
-            else:
-                current_target = os.readlink("/userdata/system/configs/yuzu/nand/user/save")
-                if current_target != "/userdata/saves/switch/eden_citron/save/save_user":
-                    os.unlink("/userdata/system/configs/yuzu/nand/user/save")
-                    os.symlink("/userdata/saves/switch/eden_citron/save/save_user", "/userdata/system/configs/yuzu/nand/user/save")
-        else:
-            os.symlink("/userdata/saves/switch/eden_citron/save/save_user", "/userdata/system/configs/yuzu/nand/user/save")
+        #Keys/firmware, app/config/cache and save/mods folders and links
+        mod_overlay = overlay_enabled(system.config.get("switch_mod_overlay"), rom)
+        reconcile(emulator, eden_layout(emudir, mod_overlay))
+        #only the enabled mods of this title in load/ when switch_mod_overlay is set
+        #(optional features are imported only when their es option is on)
+        if mod_overlay:
+            from generators.modOverlay import prepare_mods
+            prepare_mods(emulator, rom, system.config.get("switch_mod_overlay"))
 
-        #Link YUZU SYSTEM SAVE Directory to /userdata/saves/eden_citron/save_system
-        if os.path.exists("/userdata/system/configs/yuzu/nand/system/save"):
-            if not os.path.islink("/userdata/system/configs/yuzu/nand/system/save"):
-                shutil.rmtree("/userdata/system/configs/yuzu/nand/system/save")
-                os.symlink("/userdata/saves/switch/eden_citron/save/save_system", "/userdata/system/configs/yuzu/nand/system/save")
-            else:
-                current_target = os.readlink("/userdata/system/configs/yuzu/nand/system/save")
-                if current_target != "/userdata/saves/switch/eden_citron/save/save_system":
-                    os.unlink("/userdata/system/configs/yuzu/nand/system/save")
-                    os.symlink("/userdata/saves/switch/eden_citron/save/save_system", "/userdata/system/configs/yuzu/nand/system/save")
-        else:
-            os.symlink("/userdata/saves/switch/eden_citron/save/save_system", "/userdata/system/configs/yuzu/nand/system/save")
+        #keys and firmware checked before the appimage boots (cached, only changed files are read again), not for homebrew
+        try:
+            check_bios(system.config.get("switch_bios_check"), rom)
+        except BiosError as e:
+            raise BatoceraException(f"{emulator}: {e}") from e
 
-        #Link YUZU MODS Directory to /userdata/saves/eden_citron/mods
-        if os.path.exists("/userdata/system/configs/yuzu/load"):
-            if not os.path.islink("/userdata/system/configs/yuzu/load"):
-                shutil.rmtree("/userdata/system/configs/yuzu/load")
-                os.symlink("/userdata/saves/switch/eden_citron/mods", "/userdata/system/configs/yuzu/load")
-            else:
-                current_target = os.readlink("/userdata/system/configs/yuzu/load")
-                if current_target != "/userdata/saves/switch/eden_citron/mods":
-                    os.unlink("/userdata/system/configs/yuzu/load")
-                    os.symlink("/userdata/saves/switch/eden_citron/mods", "/userdata/system/configs/yuzu/load")
-        else:
-            os.symlink("/userdata/saves/switch/eden_citron/mods", "/userdata/system/configs/yuzu/load")
+        #per title options (title-profiles.ini) for what is not set in ES
+        apply_title_profile(system, rom)
 
         yuzuConfig = str(CONFIGS) + '/yuzu/qt-config.ini'
         yuzuConfigTemplate = '/userdata/system/switch/configgen/qt-config.ini.template'
 
         EdenGenerator.writeYuzuConfig(yuzuConfig, yuzuConfigTemplate, system, playersControllers, sdlversion, emulator)
 
+        #shader caches: last use of this title, least recently played ones trimmed to the budget
+        manage_shader_cache(emulator, rom, system.config.get("switch_shader_cache_budget"))
+        #prefetch of its shader cache in the background while the appimage mounts
+        warm_shader_cache(emulator, rom, system.config.get("switch_shader_warmup"))
+        #save snapshots before the session and after the emulator exits
+        if system.config.get("switch_save_backup") == "1":
+            from generators.saveBackup import backup_around_launch
+            backup_around_launch("eden_citron", system.config.get("switch_save_backup"))
+        #save of this title from ryujinx when it was played there last
+        if system.config.get("switch_save_sync") == "1":
+            from generators.saveSync import sync_saves
+            sync_saves(rom, system.config.get("switch_save_sync"))
+
+        #nsz/xcz decompressed to the cache first when switch_decompress is set
+        if system.config.get("switch_decompress") in ("1", "keep"):
+            from generators.nszDecompress import prelaunch
+            rom = prelaunch(rom, system.config.get("switch_decompress"))
+
         commandArray = ["./"+emulator+".AppImage", "-f",  "-g", rom ]
 
         environment = { "DRI_PRIME":"1",
@@ -468,6 +310,12 @@ class EdenGenerator(Generator):
                         "USER":"root",
                         "LANG":"en_US.UTF-8",
         }
+        #same drivers as the detection, whether it probed, came from the cache or the daemon
+        #(only with the automatic pad configuration, a manual setup keeps its own drivers)
+        if not system.isOptSet('yuzu_auto_controller_config') or system.config["yuzu_auto_controller_config"] != "0":
+            environment.update(SDL_HIDAPI_ENVIRONMENT)
+
+        flush_switch_logs()
 
         return Command.Command(array=commandArray, env=environment)
 
@@ -505,296 +353,30 @@ class EdenGenerator(Generator):
              "rstick":    "joystick2"
         }
 
-        # ini file
-        yuzuConfig = CaseSensitiveRawConfigParser()
-        yuzuConfig.optionxform=str
-        yuzuoldConfig = CaseSensitiveRawConfigParser()
-        yuzuoldConfig.optionxform=str
-
-        if os.path.exists(yuzuConfigFile):
-            yuzuoldConfig.read(yuzuConfigFile)
-
-        if os.path.exists(yuzuConfigTemplateFile):
-            yuzuConfig.read(yuzuConfigTemplateFile)
-
+        # ini file, the template is parsed once and then loaded from its compiled cache
+        yuzuConfig = load_template(Path(yuzuConfigTemplateFile), SWITCH_CACHE / "qt-config.ini.template.cache")
 
-    # UI section
-        if not yuzuConfig.has_section("UI"):
-            yuzuConfig.add_section("UI")
-
-        if system.isOptSet('yuzu_enable_discord_presence'):
-            yuzuConfig.set("UI", "enable_discord_presence", system.config["yuzu_enable_discord_presence"])
-        else:
-            yuzuConfig.set("UI", "enable_discord_presence", "false")
-
-        yuzuConfig.set("UI", "enable_discord_presence\\default", "false")
-
-        yuzuConfig.set("UI", "check_for_updates_on_start", "false")
-        yuzuConfig.set("UI", "check_for_updates_on_start\\default", "false")
-
-        #citron shortcuts
-        yuzuConfig.set("UI", "Shortcuts\\shortcuts\\size", "1")#adjust to number of shortcut sets
-        #exit citron
-        yuzuConfig.set("UI", "Shortcuts\\shortcuts\\1\\name", "Exit citron")
-        yuzuConfig.set("UI", "Shortcuts\\shortcuts\\1\\group", "Main Window")
-        yuzuConfig.set("UI", "Shortcuts\\shortcuts\\1\\keyseq", "Ctrl+Q")
-        yuzuConfig.set("UI", "Shortcuts\\shortcuts\\1\\controller_keyseq", "Y+ZL")
-        yuzuConfig.set("UI", "Shortcuts\\shortcuts\\1\\context", "1")
-        yuzuConfig.set("UI", "Shortcuts\\shortcuts\\1\\repeat", "false")
-
-        # Interface language (citron)
-        if system.isOptSet('yuzu_intlanguage'):
-            yuzuConfig.set("UI", "Paths\\language", system.config["yuzu_intlanguage"])
-            yuzuConfig.set("UI", "Paths\\language\\default", "false")
-        else:
-            yuzuConfig.set("UI", "Paths\\language", "en")
-            yuzuConfig.set("UI", "Paths\\language\\default", "true")
-
-        # Single Window Mode
-        if system.isOptSet('single_window'):
-            yuzuConfig.set("UI", "singleWindowMode", system.config["single_window"])
-            yuzuConfig.set("UI", "singleWindowMode\\default", "false")
-        else:
-            yuzuConfig.set("UI", "singleWindowMode", "true")
-            yuzuConfig.set("UI", "singleWindowMode\\default", "true")
-
-        # User Profile select on boot
-        if system.isOptSet('user_profile'):
-            yuzuConfig.set("UI", "select_user_on_boot", system.config["user_profile"])
-            yuzuConfig.set("UI", "select_user_on_boot\\default", "false")
-        else:
-            yuzuConfig.set("UI", "select_user_on_boot", "true")
-            yuzuConfig.set("UI", "select_user_on_boot\\default", "true")
-
-
-    # Core section
-        if not yuzuConfig.has_section("Core"):
-            yuzuConfig.add_section("Core")
-
-        # Multicore
-        if system.isOptSet('multicore'):
-            yuzuConfig.set("Core", "use_multi_core", system.config["multicore"])
-            yuzuConfig.set("Core", "use_multi_core\\default", "false")
-        else:
-            yuzuConfig.set("Core", "use_multi_core", "true")
-            yuzuConfig.set("Core", "use_multi_core\\default", "true")
-
-        # Memory layout
-        if system.isOptSet('yuzu_memory_layout'):
-            yuzuConfig.set("Core", "memory_layout_mode", system.config["yuzu_memory_layout"])
-            yuzuConfig.set("Core", "memory_layout_mode\\default", "false")
-        else:
-            yuzuConfig.set("Core", "memory_layout_mode", "0")
-            yuzuConfig.set("Core", "memory_layout_mode\\default", "true")
-
-    # Renderer section
-        if not yuzuConfig.has_section("Renderer"):
-            yuzuConfig.add_section("Renderer")
-
-        # Aspect ratio
-        if system.isOptSet('yuzu_ratio'):
-            yuzuConfig.set("Renderer", "aspect_ratio", system.config["yuzu_ratio"])
-            yuzuConfig.set("Renderer", "aspect_ratio\\default", "false")
-        else:
-            yuzuConfig.set("Renderer", "aspect_ratio", "0")
-            yuzuConfig.set("Renderer", "aspect_ratio\\default", "true")
-
-        # Graphical backend
-        if system.isOptSet('yuzu_backend'):
-            yuzuConfig.set("Renderer", "backend", system.config["yuzu_backend"])
-            yuzuConfig.set("Renderer", "backend\\default", "false")
-        else:
-            yuzuConfig.set("Renderer", "backend", "1")
-            yuzuConfig.set("Renderer", "backend\\default", "true")
-
-        # Async Shader compilation
-        if system.isOptSet('async_shaders'):
-            yuzuConfig.set("Renderer", "use_asynchronous_shaders", system.config["async_shaders"])
-            yuzuConfig.set("Renderer", "use_asynchronous_shaders\\default", "false")
-        else:
-            yuzuConfig.set("Renderer", "use_asynchronous_shaders", "false")
-            yuzuConfig.set("Renderer", "use_asynchronous_shaders\\default", "true")
-
-        # Assembly shaders
-        if system.isOptSet('shaderbackend'):
-            yuzuConfig.set("Renderer", "shader_backend", system.config["shaderbackend"])
-            yuzuConfig.set("Renderer", "shader_backend\\default", "false")
-        else:
-            yuzuConfig.set("Renderer", "shader_backend", "0")
-            yuzuConfig.set("Renderer", "shader_backend\\default", "true")
-
-        # Async Gpu Emulation
-        if system.isOptSet('async_gpu'):
-            yuzuConfig.set("Renderer", "use_asynchronous_gpu_emulation", system.config["async_gpu"])
-            yuzuConfig.set("Renderer", "use_asynchronous_gpu_emulation\\default", "false")
-        else:
-            yuzuConfig.set("Renderer", "use_asynchronous_gpu_emulation", "true")
-            yuzuConfig.set("Renderer", "use_asynchronous_gpu_emulation\\default", "true")
-
-        # NVDEC Emulation
-        if system.isOptSet('nvdec_emu'):
-            yuzuConfig.set("Renderer", "nvdec_emulation", system.config["nvdec_emu"])
-            yuzuConfig.set("Renderer", "nvdec_emulation\\default", "false")
-        else:
-            yuzuConfig.set("Renderer", "nvdec_emulation", "2")
-            yuzuConfig.set("Renderer", "nvdec_emulation\\default", "true")
-
-        # Gpu Accuracy
-        if system.isOptSet('gpuaccuracy'):
-            yuzuConfig.set("Renderer", "gpu_accuracy", system.config["gpuaccuracy"])
-        else:
-            yuzuConfig.set("Renderer", "gpu_accuracy", "0")
-        yuzuConfig.set("Renderer", "gpu_accuracy\\default", "false")
-
-        # Vsync
-        if system.isOptSet('vsync'):
-            yuzuConfig.set("Renderer", "use_vsync", system.config["vsync"])
-            yuzuConfig.set("Renderer", "use_vsync\\default", "false")
-            if system.config["vsync"] == "2":
-                yuzuConfig.set("Renderer", "use_vsync\\default", "true")
-        else:
-            yuzuConfig.set("Renderer", "use_vsync", "1")
-            yuzuConfig.set("Renderer", "use_vsync\\default", "false")
-
-        # Gpu cache garbage collection
-        if system.isOptSet('gpu_cache_gc'):
-            yuzuConfig.set("Renderer", "use_caches_gc", system.config["gpu_cache_gc"])
-        else:
-            yuzuConfig.set("Renderer", "use_caches_gc", "false")
-        yuzuConfig.set("Renderer", "use_caches_gc\\default", "false")
-
-        # Max anisotropy
-        if system.isOptSet('anisotropy'):
-            yuzuConfig.set("Renderer", "max_anisotropy", system.config["anisotropy"])
-            yuzuConfig.set("Renderer", "max_anisotropy\\default", "false")
-        else:
-            yuzuConfig.set("Renderer", "max_anisotropy", "0")
-            yuzuConfig.set("Renderer", "max_anisotropy\\default", "true")
-
-        # Resolution scaler
-        if system.isOptSet('resolution_scale'):
-            yuzuConfig.set("Renderer", "resolution_setup", system.config["resolution_scale"])
-            yuzuConfig.set("Renderer", "resolution_setup\\default", "false")
-        else:
-            yuzuConfig.set("Renderer", "resolution_setup", "2")
-            yuzuConfig.set("Renderer", "resolution_setup\\default", "true")
-
-        # Scaling filter
-        if system.isOptSet('scale_filter'):
-            yuzuConfig.set("Renderer", "scaling_filter", system.config["scale_filter"])
-            yuzuConfig.set("Renderer", "scaling_filter\\default", "false")
-        else:
-            yuzuConfig.set("Renderer", "scaling_filter", "1")
-            yuzuConfig.set("Renderer", "scaling_filter\\default", "true")
-
-        # FSR Quality
-        if system.isOptSet('fsr_quality'):
-            yuzuConfig.set("Renderer", "fsr2_quality_mode", system.config["fsr_quality"])
-            yuzuConfig.set("Renderer", "fsr2_quality_mode\\default", "false")
-        else:
-            yuzuConfig.set("Renderer", "fsr2_quality_mode", "0")
-            yuzuConfig.set("Renderer", "fsr2_quality_mode\\default", "true")
-
-        # Anti aliasing method
-        if system.isOptSet('aliasing_method'):
-            yuzuConfig.set("Renderer", "anti_aliasing", system.config["aliasing_method"])
-            yuzuConfig.set("Renderer", "anti_aliasing\\default", "false")
-        else:
-            yuzuConfig.set("Renderer", "anti_aliasing", "0")
-            yuzuConfig.set("Renderer", "anti_aliasing\\default", "true")
-
-        #ASTC Decoding Method
-        if system.isOptSet('accelerate_astc'):
-            yuzuConfig.set("Renderer", "accelerate_astc", system.config["accelerate_astc"])
-            yuzuConfig.set("Renderer", "accelerate_astc\\default", "false")
-        else:
-            yuzuConfig.set("Renderer", "accelerate_astc", "1")
-            yuzuConfig.set("Renderer", "accelerate_astc\\default", "true")
-
-        # ASTC Texture Recompression
-        if system.isOptSet('astc_recompression'):
-
-            yuzuConfig.set("Renderer", "astc_recompression", system.config["astc_recompression"])
-            yuzuConfig.set("Renderer", "astc_recompression\\default", "false")
-            if system.config["astc_recompression"] == "0":
-                yuzuConfig.set("Renderer", "use_vsync\\default", "true")
-            yuzuConfig.set("Renderer", "async_astc", "false")
-            yuzuConfig.set("Renderer", "async_astc\\default", "true")
-        else:
-            yuzuConfig.set("Renderer", "astc_recompression", "0")
-            yuzuConfig.set("Renderer", "astc_recompression\\default", "true")
-            yuzuConfig.set("Renderer", "async_astc", "false")
-            yuzuConfig.set("Renderer", "async_astc\\default", "true")
-
-
-    # Cpu Section
-        if not yuzuConfig.has_section("Cpu"):
-            yuzuConfig.add_section("Cpu")
-
-        # Cpu Accuracy
-        if system.isOptSet('cpuaccuracy'):
-            yuzuConfig.set("Cpu", "cpu_accuracy", system.config["cpuaccuracy"])
-            yuzuConfig.set("Cpu", "cpu_accuracy\\default", "false")
-        else:
-            yuzuConfig.set("Cpu", "cpu_accuracy", "0")
-            yuzuConfig.set("Cpu", "cpu_accuracy\\default", "true")
-
-
-    # System section
-        if not yuzuConfig.has_section("System"):
-            yuzuConfig.add_section("System")
-
-        # Language
-        if system.isOptSet('language'):
-            yuzuConfig.set("System", "language_index", system.config["language"])
-            yuzuConfig.set("System", "language_index\\default", "false")
-        else:
-            yuzuConfig.set("System", "language_index", "1")
-            yuzuConfig.set("System", "language_index\\default", "true")
-
-        # Audio Mode
-        if system.isOptSet('audio_mode'):
-            yuzuConfig.set("System", "sound_index", system.config["audio_mode"])
-            yuzuConfig.set("System", "sound_index\\default", "false")
-        else:
-            yuzuConfig.set("System", "sound_index", "1")
-            yuzuConfig.set("System", "sound_index\\default", "true")
-
-        # Region
-        if system.isOptSet('region'):
-            yuzuConfig.set("System", "region_index", system.config["region"])
-            yuzuConfig.set("System", "region_index\\default", "false")
-        else:
-            yuzuConfig.set("System", "region_index", "1")
-            yuzuConfig.set("System", "region_index\\default", "true")
-
-        # Dock Mode
-        if system.isOptSet('dock_mode'):
-            if system.config["dock_mode"] == "1":
-                yuzuConfig.set("System", "use_docked_mode", "1")
-                yuzuConfig.set("System", "use_docked_mode\\default", "true")
-            elif system.config["dock_mode"] == "0":
-                yuzuConfig.set("System", "use_docked_mode", "0")
-                yuzuConfig.set("System", "use_docked_mode\\default", "false")
-        else:
-            yuzuConfig.set("System", "use_docked_mode", "1")
-            yuzuConfig.set("System", "use_docked_mode\\default", "true")
 
+    # UI / Core / Renderer / Cpu / System sections: the es options of generators/emulatorOptions.py, in one pass
+        apply_options(YUZU_OPTIONS, system, yuzuConfig)
 
     # controls section
         if not yuzuConfig.has_section("Controls"):
             yuzuConfig.add_section("Controls")
 
         if not system.isOptSet('yuzu_auto_controller_config') or system.config["yuzu_auto_controller_config"] != "0":
-            #get the evdev->hidraw mapping
-            evdev_hidraw = evdev_to_hidraw()
-            #get sdllib  hidapi/hidraw + evdev guid
-            sdl_gamepads = list_sdl_gamepads(sdlversion)
-
-            import pprint
-            # pprint.pprint(evdev_hidraw, stream=sys.stderr)
-            # pprint.pprint(sdl_gamepads, stream=sys.stderr)
-            # pprint.pprint(playersControllers, stream=sys.stderr)
+            #ask switch-padd first (if the service is running), it already knows the connected pads
+            detected = query_gamepads(sdlversion, Input)
+            if detected is not None:
+                evdev_hidraw, sdl_gamepads = detected
+            else:
+                #get the evdev->hidraw mapping
+                evdev_hidraw = hid_topology().evdev_hidraw
+                #get sdllib  hidapi/hidraw + evdev guid
+                sdl_gamepads = list_sdl_gamepads(sdlversion)
+
+            switchlog.debug("evdev_hidraw %s", evdev_hidraw)
+            switchlog.debug("sdl_gamepads %s", sdl_gamepads)
             nplayer = 0
             guid_port = {}
             for nplayer, pad in enumerate(playersControllers, start=0):
@@ -840,31 +422,22 @@ class EdenGenerator(Generator):
                 yuzuConfig.set("Controls", player_nb_str + "_vibration_enabled\\default", "false")
                 nplayer += 1
         else:
-            if yuzuoldConfig is not None:
+            # manual controller configuration, keep the controls of the current file
+            yuzuoldConfig = CaseSensitiveRawConfigParser()
+            yuzuoldConfig.optionxform=str
+            if os.path.exists(yuzuConfigFile):
+                yuzuoldConfig.read(yuzuConfigFile)
+            if yuzuoldConfig.has_section("Controls"):
                 old_controls = yuzuoldConfig.items("Controls")
                 for option, value in old_controls:
                     yuzuConfig.set("Controls", option, value)
 
 
-    # telemetry section
-        if not yuzuConfig.has_section("WebService"):
-            yuzuConfig.add_section("WebService") 
-        yuzuConfig.set("WebService", "enable_telemetry", "false")
-        yuzuConfig.set("WebService", "enable_telemetry\\default", "false") 
-
-
-    # Services section
-        if not yuzuConfig.has_section("Services"):
-            yuzuConfig.add_section("Services")
-        yuzuConfig.set("Services", "bcat_backend", "none")
-        yuzuConfig.set("Services", "bcat_backend\\default", "none") 
-
-        ### update the configuration file
-        if not os.path.exists(os.path.dirname(yuzuConfigFile)):
-            os.makedirs(os.path.dirname(yuzuConfigFile))
+    # telemetry / services sections
+        apply_options(YUZU_SERVICE_OPTIONS, system, yuzuConfig)
 
-        with open(yuzuConfigFile, 'w') as configfile:
-            yuzuConfig.write(configfile)
+        ### update the configuration file, only if something changed
+        write_if_changed(Path(yuzuConfigFile), yuzuConfig.render(), ini_diff)
 
     def is_xbox_controller(padGuid, padName=None):
         return (
@@ -900,15 +473,12 @@ class EdenGenerator(Generator):
         )
 
         if is_xbox:
-            log_stderr("[SETBUTTON] Xbox controller detected")
+            switchlog.debug("[SETBUTTON] Xbox controller detected")
 
         if input.type == "button":
             if is_xbox and key in XBOX_BUTTON_REMAP:
                 button_id = XBOX_BUTTON_REMAP[key]
-                log_stderr(
-                    f"[SETBUTTON][XBOX] remap key={key} "
-                    f"hid_id={input.id} -> sdl_id={button_id}"
-                )
+                switchlog.debug("[SETBUTTON][XBOX] remap key=%s hid_id=%s -> sdl_id=%s", key, input.id, button_id)
             else:
                 button_id = input.id
             mapping = (
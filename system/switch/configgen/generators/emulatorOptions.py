@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+from generators.optionTable import SKIP, Option, OptionTable
+
+# es options of the emulators, applied by generators.optionTable. A new setting
+# is one more Option here (and its es_features_switch.cfg entry); bump the
+# version of a table when it changes.
+
+###EDEN / CITRON (qt-config.ini)#######################################################################################
+def _vsync_default(value):
+    # fifo is the emulator default
+    return "true" if value == "2" else "false"
+
+def _docked(value):
+    return value if value in ("0", "1") else SKIP
+
+def _docked_default(value):
+    return "true" if value == "1" else "false"
+
+def _astc_vsync_default(value):
+    return "true" if value == "0" else SKIP
+
+YUZU_OPTIONS = OptionTable("yuzu", 1, (
+    # UI section
+    Option("yuzu_enable_discord_presence", "UI", "enable_discord_presence", "false", default_policy="false"),
+    Option(None, "UI", "check_for_updates_on_start", "false", default_policy="false"),
+    #citron shortcuts, size: adjust to number of shortcut sets
+    Option(None, "UI", "Shortcuts\\shortcuts\\size", "1", default_policy=None),
+    #exit citron
+    Option(None, "UI", "Shortcuts\\shortcuts\\1\\name", "Exit citron", default_policy=None),
+    Option(None, "UI", "Shortcuts\\shortcuts\\1\\group", "Main Window", default_policy=None),
+    Option(None, "UI", "Shortcuts\\shortcuts\\1\\keyseq", "Ctrl+Q", default_policy=None),
+    Option(None, "UI", "Shortcuts\\shortcuts\\1\\controller_keyseq", "Y+ZL", default_policy=None),
+    Option(None, "UI", "Shortcuts\\shortcuts\\1\\context", "1", default_policy=None),
+    Option(None, "UI", "Shortcuts\\shortcuts\\1\\repeat", "false", default_policy=None),
+    # Interface language (citron)
+    Option("yuzu_intlanguage", "UI", "Paths\\language", "en"),
+    Option("single_window", "UI", "singleWindowMode", "true"),
+    # User Profile select on boot
+    Option("user_profile", "UI", "select_user_on_boot", "true"),
+
+    # Core section
+    Option("multicore", "Core", "use_multi_core", "true"),
+    Option("yuzu_memory_layout", "Core", "memory_layout_mode", "0"),
+
+    # Renderer section
+    Option("yuzu_ratio", "Renderer", "aspect_ratio", "0"),
+    Option("yuzu_backend", "Renderer", "backend", "1"),
+    Option("async_shaders", "Renderer", "use_asynchronous_shaders", "false"),
+    Option("shaderbackend", "Renderer", "shader_backend", "0"),
+    Option("async_gpu", "Renderer", "use_asynchronous_gpu_emulation", "true"),
+    Option("nvdec_emu", "Renderer", "nvdec_emulation", "2"),
+    Option("gpuaccuracy", "Renderer", "gpu_accuracy", "0", default_policy="false"),
+    Option("vsync", "Renderer", "use_vsync", "1", default_policy=_vsync_default),
+    # Gpu cache garbage collection
+    Option("gpu_cache_gc", "Renderer", "use_caches_gc", "false", default_policy="false"),
+    Option("anisotropy", "Renderer", "max_anisotropy", "0"),
+    Option("resolution_scale", "Renderer", "resolution_setup", "2"),
+    Option("scale_filter", "Renderer", "scaling_filter", "1"),
+    Option("fsr_quality", "Renderer", "fsr2_quality_mode", "0"),
+    Option("aliasing_method", "Renderer", "anti_aliasing", "0"),
+    #ASTC Decoding Method
+    Option("accelerate_astc", "Renderer", "accelerate_astc", "1"),
+    # ASTC Texture Recompression, uncompressed also resets the vsync mode
+    Option("astc_recompression", "Renderer", "astc_recompression", "0"),
+    Option("astc_recompression", "Renderer", "use_vsync\\default", SKIP, _astc_vsync_default, default_policy=None),
+    Option(None, "Renderer", "async_astc", "false", default_policy="true"),
+
+    # Cpu section
+    Option("cpuaccuracy", "Cpu", "cpu_accuracy", "0"),
+
+    # System section
+    Option("language", "System", "language_index", "1"),
+    Option("audio_mode", "System", "sound_index", "1"),
+    Option("region", "System", "region_index", "1"),
+    Option("dock_mode", "System", "use_docked_mode", "1", _docked, default_policy=_docked_default),
+))
+
+# written after the controls section
+YUZU_SERVICE_OPTIONS = OptionTable("yuzu-services", 1, (
+    # telemetry
+    Option(None, "WebService", "enable_telemetry", "false", default_policy="false"),
+    Option(None, "Services", "bcat_backend", "none", default_policy="none"),
+))
+
+###RYUJINX (Config.json)###############################################################################################
+def _flag(value):
+    return bool(int(value))
+
+RYUJINX_SCALES = {'1.0', '2.0', '3.0', '4.0', 1.0, 2.0, 3.0, 4.0}
+
+def _scale_custom(value):
+    return 1 if value in RYUJINX_SCALES else float(value)
+
+def _scale(value):
+    return int(float(value)) if value in RYUJINX_SCALES else -1
+
+def _texture_recompression(value):
+    if value in {"true", "1", 1}:
+        return True
+    if value in {"false", "0", 0}:
+        return False
+    return SKIP
+
+RYUJINX_OPTIONS = OptionTable("ryujinx", 1, (
+    # res_scale is set again from ryu_resolution_scale, see RYUJINX_VIDEO_OPTIONS
+    Option("res_scale", None, "res_scale", 1, int, None),
+    Option("max_anisotropy", None, "max_anisotropy", -1, int, None),
+    Option("aspect_ratio", None, "aspect_ratio", "Fixed16x9", default_policy=None),
+    Option("system_language", None, "system_language", "AmericanEnglish", default_policy=None),
+    Option("system_region", None, "system_region", "USA", default_policy=None),
+    Option("ryu_docked_mode", None, "docked_mode", True, _flag, None),
+    Option("ryu_enable_discord_integration", None, "enable_discord_integration", True, _flag, None),
+    Option("ryu_vsync", None, "enable_vsync", True, _flag, None),
+), "json")
+
+# written after input_config
+RYUJINX_VIDEO_OPTIONS = OptionTable("ryujinx-video", 1, (
+    #Resolution Scale: 1x-4x, or a custom float scale (res_scale -1)
+    Option("ryu_resolution_scale", None, "res_scale_custom", 1, _scale_custom, None),
+    Option("ryu_resolution_scale", None, "res_scale", 1, _scale, None),
+    #Texture Recompression
+    Option("ryu_texture_recompression", None, "enable_texture_recompression", False, _texture_recompression, None),
+), "json")
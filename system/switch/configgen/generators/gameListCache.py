@@ -0,0 +1,95 @@
+from __future__ import annotations
+
+import json
+import logging
+import sqlite3
+import sys
+
+from pathlib import Path
+
+from generators.configWriter import atomic_write
+from generators.romIndex import RomEntry, RomIndex
+from generators.switchPaths import SWITCH_CACHE
+
+eslog = logging.getLogger(__name__)
+
+# shared by eden / citron, the cache dir of every emulator links there (see switchLayout.eden_layout)
+GAME_LIST_DIR = Path("/userdata/saves/yuzu/game_list")
+GAME_LIST_MANIFEST = SWITCH_CACHE / "game_list.json"
+
+def cache_files(cache_dir: Path, title_id: str) -> tuple[Path, Path]:
+    # same names as GetGameListCachedObject(): <program id %016X>.jpeg and .appname.txt
+    program_id = title_id.upper()
+    return cache_dir / f"{program_id}.jpeg", cache_dir / f"{program_id}.appname.txt"
+
+def cacheable(rom: RomEntry) -> bool:
+    # the emulator reads icon and name from the control nca, both have to be there as plain files
+    return (rom.error is None and rom.type == "base" and rom.title_id is not None
+            and rom.name_source == "nacp" and rom.icon_offset is not None and rom.icon_size)
+
+def write_entry(rom: RomEntry, cache_dir: Path) -> None:
+    icon_file, name_file = cache_files(cache_dir, rom.title_id)
+    with open(rom.path, "rb") as f:
+        f.seek(rom.icon_offset)
+        icon = f.read(rom.icon_size)
+    if len(icon) != rom.icon_size:
+        raise OSError(f"{rom.path}: truncated icon")
+    atomic_write(icon_file, icon)
+    atomic_write(name_file, rom.name.encode())
+
+def populate_game_list(index: RomIndex | None = None, cache_dir: Path = GAME_LIST_DIR, manifest_file: Path = GAME_LIST_MANIFEST) -> int:
+    """Write the emulator game_list cache for the indexed roms, returns the number of titles written.
+
+    A title is only written when its rom changed since the last run (the
+    manifest keeps the (path, size, mtime) it was written from) or when the
+    emulator cache files are gone.
+    """
+    try:
+        with open(manifest_file) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    own_index = index is None
+    index = index if index is not None else RomIndex()
+    try:
+        index.scan()
+        roms = [rom for rom in index.entries() if cacheable(rom)]
+    except (OSError, sqlite3.Error) as e:
+        eslog.warning(f"game list: rom index unavailable: {e}")
+        return 0
+    finally:
+        if own_index:
+            index.close()
+
+    written = 0
+    current = {}
+    for rom in roms:
+        key = [rom.path, rom.size, rom.mtime_ns]
+        if rom.title_id in current:
+            # several dumps of the same title, the first one wins like in the emulator
+            continue
+        current[rom.title_id] = key
+        if manifest.get(rom.title_id) == key and all(p.exists() for p in cache_files(cache_dir, rom.title_id)):
+            continue
+        try:
+            write_entry(rom, cache_dir)
+            written += 1
+        except OSError as e:
+            eslog.warning(f"game list: {rom.path}: {e}")
+            current.pop(rom.title_id)
+
+    if written or current != manifest:
+        try:
+            atomic_write(Path(manifest_file), json.dumps(current).encode())
+        except OSError as e:
+            eslog.warning(f"unable to write {manifest_file}: {e}")
+    if written:
+        eslog.info(f"game list: {written} title(s) written to {cache_dir}")
+    return written
+
+if __name__ == "__main__":
+    # python -m generators.gameListCache [cache dir]
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    cache_dir = Path(sys.argv[1]) if len(sys.argv) > 1 else GAME_LIST_DIR
+    print(f"{populate_game_list(cache_dir=cache_dir)} title(s) written")
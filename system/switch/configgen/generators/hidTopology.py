@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import functools
+import logging
+import os
+
+from dataclasses import dataclass
+
+eslog = logging.getLogger(__name__)
+
+NO_GUID = "00000000000000000000000000000000"
+
+@dataclass(frozen=True)
+class HidDevice:
+    hidraw: str                 # /dev/hidraw3
+    sysfs_path: str             # resolved /sys/devices/.../0005:057E:2009.0007
+    name: str                   # HID_NAME from uevent
+    bus: str                    # 0003 usb, 0005 bluetooth
+    guid: str                   # vid+pid guid, see _usb_guid
+    events: tuple[str, ...]     # /dev/input/eventN nodes of this device
+
+class HidTopology:
+    """hidraw <-> evdev index of /sys/class/hidraw, built in a single pass."""
+
+    def __init__(self, devices: list[HidDevice]):
+        self.devices = devices
+        self._by_hidraw = {d.hidraw: d for d in devices}
+        self.evdev_hidraw = {event: d.hidraw for d in devices for event in d.events}
+
+    @classmethod
+    def build(cls, sysfs: str = "/sys") -> HidTopology:
+        class_dir = os.path.join(sysfs, "class", "hidraw")
+        devices = []
+        usb_ids: dict[str, str] = {}
+        try:
+            entries = sorted((e.name for e in os.scandir(class_dir) if e.name.startswith("hidraw")), key=_node_number)
+        except OSError:
+            entries = []
+        for hid in entries:
+            devpath = os.path.realpath(os.path.join(class_dir, hid, "device"))
+            devices.append(HidDevice(
+                hidraw=f"/dev/{hid}",
+                sysfs_path=devpath,
+                name=_hid_name(devpath),
+                bus=os.path.basename(devpath).split(":")[0],
+                guid=_usb_guid(devpath, usb_ids),
+                events=tuple(f"/dev/input/{e}" for e in _event_nodes(devpath)),
+            ))
+        return cls(devices)
+
+    def device(self, hidraw: str) -> HidDevice | None:
+        return self._by_hidraw.get(hidraw)
+
+    def hidraw_to_evdev(self, hidraw: str) -> str | None:
+        device = self._by_hidraw.get(hidraw)
+        if device is None or not device.events:
+            return None
+        return device.events[-1]
+
+    def evdev_to_hidraw(self, evdev: str) -> str | None:
+        return self.evdev_hidraw.get(evdev)
+
+    def bus(self, hidraw: str) -> str | None:
+        device = self._by_hidraw.get(hidraw)
+        return device.bus if device is not None else None
+
+    def guid(self, hidraw: str) -> str:
+        device = self._by_hidraw.get(hidraw)
+        return device.guid if device is not None else NO_GUID
+
+    def name(self, hidraw: str) -> str | None:
+        device = self._by_hidraw.get(hidraw)
+        return device.name if device is not None else None
+
+def _node_number(name: str) -> tuple[int, str]:
+    digits = name.lstrip("abcdefghijklmnopqrstuvwxyz")
+    return (int(digits) if digits.isdigit() else -1, name)
+
+def _hid_name(devpath: str) -> str:
+    try:
+        with open(os.path.join(devpath, "uevent")) as f:
+            for line in f:
+                if line.startswith("HID_NAME="):
+                    return line.strip().split("=", 1)[1]
+    except OSError:
+        pass
+    return "unknown"
+
+def _usb_guid(devpath: str, usb_ids: dict[str, str]) -> str:
+    # closest ancestor with idVendor/idProduct (usb device), shared between the interfaces of one pad
+    p = devpath
+    visited = []
+    while p and p != "/":
+        if p in usb_ids:
+            guid = usb_ids[p]
+            break
+        visited.append(p)
+        try:
+            with open(os.path.join(p, "idVendor")) as f:
+                vid = f.read().strip()
+            with open(os.path.join(p, "idProduct")) as f:
+                pid = f.read().strip()
+            guid = f"{vid}{pid}000000000000000000000000" if vid and pid else NO_GUID
+            break
+        except OSError:
+            p = os.path.dirname(p)
+    else:
+        guid = NO_GUID
+    for path in visited:
+        usb_ids[path] = guid
+    return guid
+
+def _event_nodes(devpath: str) -> list[str]:
+    # eventN directories below .../input/inputM, symlinks are not followed
+    events = []
+    stack = [devpath]
+    while stack:
+        path = stack.pop()
+        try:
+            with os.scandir(path) as it:
+                for entry in it:
+                    if not entry.is_dir(follow_symlinks=False):
+                        continue
+                    if entry.name.startswith("event"):
+                        if "/input" in path:
+                            events.append(entry.name)
+                    else:
+                        stack.append(entry.path)
+        except OSError:
+            continue
+    return sorted(events, key=_node_number)
+
+@functools.cache
+def hid_topology() -> HidTopology:
+    # built once per process, every pad detection step uses the same index
+    return HidTopology.build()
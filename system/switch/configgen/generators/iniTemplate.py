@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import logging
+import os
+import pickle
+import tempfile
+
+from pathlib import Path
+
+eslog = logging.getLogger(__name__)
+
+# bump when the cached representation changes
+CACHE_VERSION = 1
+
+class IniDocument:
+    """Ordered ini sections, written like RawConfigParser.write() does.
+
+    Only the small part of the configparser api used by the generators is
+    provided: has_section/add_section/set/get/items/sections/write.
+    """
+
+    def __init__(self, sections: dict[str, dict[str, str]] | None = None):
+        self._sections = sections if sections is not None else {}
+
+    def sections(self) -> list[str]:
+        return list(self._sections)
+
+    def has_section(self, section: str) -> bool:
+        return section in self._sections
+
+    def add_section(self, section: str) -> None:
+        if section in self._sections:
+            raise ValueError(f"Section {section!r} already exists")
+        self._sections[section] = {}
+
+    def set(self, section: str, option: str, value) -> None:
+        self._sections[section][option] = value
+
+    def get(self, section: str, option: str, fallback=None):
+        return self._sections.get(section, {}).get(option, fallback)
+
+    def items(self, section: str) -> list[tuple[str, str]]:
+        return list(self._sections[section].items())
+
+    def write(self, fp) -> None:
+        fp.write(self.render())
+
+    def render(self) -> str:
+        out = []
+        for section, options in self._sections.items():
+            out.append(f"[{section}]\n")
+            for key, value in options.items():
+                if value is None:
+                    out.append(f"{key}\n")
+                else:
+                    value = str(value).replace("\n", "\n\t")
+                    out.append(f"{key} = {value}\n")
+            out.append("\n")
+        return "".join(out)
+
+def _template_key(template: Path) -> tuple:
+    st = template.stat()
+    return (CACHE_VERSION, str(template), st.st_size, st.st_mtime_ns)
+
+def compile_template(template: Path) -> dict[str, dict[str, str]]:
+    from configgen.utils.configparser import CaseSensitiveRawConfigParser
+
+    parser = CaseSensitiveRawConfigParser()
+    parser.optionxform = str
+    parser.read(template)
+    return {section: dict(parser.items(section, raw=True)) for section in parser.sections()}
+
+def load_template(template: Path, cache_file: Path) -> IniDocument:
+    """Return the parsed template, from the compiled cache when it is still valid.
+
+    The cache is keyed on the template size and mtime, it is rebuilt (one full
+    parse) only after the template has been updated.
+    """
+    template = Path(template)
+    if not template.exists():
+        return IniDocument()
+
+    key = _template_key(template)
+    try:
+        with open(cache_file, "rb") as f:
+            cached_key, sections = pickle.load(f)
+        if cached_key == key:
+            return IniDocument(sections)
+    except (OSError, EOFError, ValueError, TypeError, pickle.UnpicklingError):
+        pass
+
+    eslog.debug(f"compiling ini template {template}")
+    sections = compile_template(template)
+    tmp = None
+    try:
+        cache_file.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=cache_file.parent, prefix=cache_file.name + ".")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump((key, sections), f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, cache_file)
+    except (OSError, pickle.PicklingError) as e:
+        eslog.warning(f"unable to write the template cache {cache_file}: {e}")
+    finally:
+        # left behind only when the dump or the rename failed
+        if tmp is not None and os.path.lexists(tmp):
+            os.unlink(tmp)
+    return IniDocument(sections)
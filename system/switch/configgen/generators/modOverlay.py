@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import configparser
+import json
+import logging
+import os
+import shutil
+import sys
+
+from pathlib import Path
+
+from generators.configWriter import atomic_write
+from generators.switchLayout import overlay_enabled
+from generators.switchPaths import SWITCH_CACHE
+from generators.titleProfiles import base_title_id, rom_title_id
+
+eslog = logging.getLogger(__name__)
+
+# canonical stores, where mods are installed: <store>/<title id>/<mod name>/{exefs,romfs,cheats}
+MOD_STORES = {
+    "eden": Path("/userdata/saves/switch/eden_citron/mods"),
+    "ryujinx": Path("/userdata/saves/switch/ryujinx/mods/contents"),
+}
+# per-launch overlays the emulator mod dir links to (switchLayout, mod_overlay=True)
+MOD_OVERLAYS = {
+    "eden": SWITCH_CACHE / "mods" / "eden",
+    "ryujinx": SWITCH_CACHE / "mods" / "ryujinx",
+}
+# the part of the emulator mod dir the title directories live in
+OVERLAY_PREFIX = {"eden": "", "ryujinx": "contents"}
+# [<title id>] disabled = mod name, other mod name
+MOD_SETTINGS = Path("/userdata/system/configs/switch/mods.ini")
+OVERLAY_MANIFEST = "overlay.json"
+
+def mod_family(emulator: str) -> str:
+    return "ryujinx" if emulator == "ryujinx-emu" else "eden"
+
+def title_store(store: Path, title_id: str) -> Path | None:
+    # eden names the title directories in upper case, ryujinx in lower case, both are accepted
+    for name in (title_id.upper(), title_id.lower()):
+        if (store / name).is_dir():
+            return store / name
+    return None
+
+def disabled_mods(title_id: str, settings: Path = MOD_SETTINGS) -> set[str]:
+    if not settings.exists():
+        return set()
+    parser = configparser.RawConfigParser()
+    try:
+        parser.read(settings)
+    except configparser.Error as e:
+        eslog.warning(f"mods: {settings}: {e}")
+        return set()
+    for section in (title_id.lower(), title_id.upper()):
+        if parser.has_option(section, "disabled"):
+            return {name.strip() for name in parser.get(section, "disabled").split(",") if name.strip()}
+    return set()
+
+def _fingerprint(path: Path) -> list:
+    entries = []
+    for directory, dirs, names in os.walk(path):
+        dirs.sort()
+        for name in sorted(names):
+            st = os.stat(os.path.join(directory, name))
+            entries.append([os.path.relpath(os.path.join(directory, name), path), st.st_size, st.st_mtime_ns])
+    return entries
+
+def _link(src: Path, dst: Path) -> None:
+    # hardlink on the same filesystem, a symlink otherwise
+    try:
+        os.link(src, dst)
+    except OSError:
+        os.symlink(src, dst)
+
+def linked_files(manifest: dict) -> set[str]:
+    # paths (relative to the title directories root of the overlay) the last materialise linked from the store
+    source = manifest.get("source")
+    if not source or source == "None":
+        return set()
+    title = Path(source).name
+    return {f"{title}/{mod}/{name}" for mod, entries in manifest.get("files", []) for name, *_ in entries}
+
+def adopt_strays(overlay: Path, store: Path, prefix: str, linked: set[str]) -> int:
+    """Moves files created in the overlay (not in linked, the files of the last materialise) to the store before it is cleared.
+
+    Mods added from the emulator ui land in the overlay, they are kept. The
+    link count says nothing: a link whose store file was deleted is down to
+    one, and it must go with the overlay, not back to the store.
+    """
+    root = overlay / prefix if prefix else overlay
+    adopted = 0
+    for directory, _, names in os.walk(root):
+        for name in names:
+            path = Path(directory) / name
+            if path.is_symlink() or path.parent == overlay or path.relative_to(root).as_posix() in linked:
+                continue
+            target = store / path.relative_to(root)
+            if target.exists():
+                continue
+            target.parent.mkdir(parents=True, exist_ok=True)
+            shutil.move(path, target)
+            adopted += 1
+    return adopted
+
+def materialise(family: str, title_id: str, store: Path | None = None, overlay: Path | None = None,
+                settings: Path = MOD_SETTINGS) -> list[str]:
+    """Makes the overlay hold the enabled mods of title_id only, returns their names.
+
+    Nothing is touched when the overlay already matches (same title, same
+    enabled set, same files in the store).
+    """
+    store = store if store is not None else MOD_STORES[family]
+    overlay = overlay if overlay is not None else MOD_OVERLAYS[family]
+    prefix = OVERLAY_PREFIX[family]
+    source = title_store(store, title_id)
+    disabled = disabled_mods(title_id, settings)
+    mods = sorted(entry.name for entry in os.scandir(source) if entry.is_dir() and entry.name not in disabled) if source else []
+    state = {"title_id": title_id, "source": str(source), "mods": mods,
+             "files": [[mod, _fingerprint(source / mod)] for mod in mods]}
+
+    manifest_file = overlay / OVERLAY_MANIFEST
+    try:
+        with open(manifest_file) as f:
+            previous = json.load(f)
+    except (OSError, ValueError):
+        previous = {}
+    if previous == state:
+        return mods
+
+    if overlay.is_dir():
+        adopted = adopt_strays(overlay, store, prefix, linked_files(previous) if isinstance(previous, dict) else set())
+        if adopted:
+            eslog.info(f"mods: {adopted} file(s) added from the emulator moved to {store}")
+        for entry in os.scandir(overlay):
+            if entry.is_dir(follow_symlinks=False):
+                shutil.rmtree(entry.path)
+            else:
+                os.unlink(entry.path)
+    overlay.mkdir(parents=True, exist_ok=True)
+    if mods:
+        title_dir = (overlay / prefix if prefix else overlay) / source.name
+        for mod in mods:
+            for directory, _, names in os.walk(source / mod):
+                target = title_dir / Path(directory).relative_to(source)
+                target.mkdir(parents=True, exist_ok=True)
+                for name in names:
+                    _link(Path(directory) / name, target / name)
+    atomic_write(manifest_file, json.dumps(state).encode())
+    eslog.info(f"mods {family}/{title_id}: " + (", ".join(mods) if mods else "none"))
+    return mods
+
+def prepare_mods(emulator: str, rom: str, mode: str | None) -> list[str] | None:
+    """switch_mod_overlay es option: the mods of the launched title only, in the overlay."""
+    if not overlay_enabled(mode, rom):
+        return None
+    family = mod_family(emulator)
+    title_id = rom_title_id(rom)
+    try:
+        # a rom without title id (homebrew): empty overlay
+        return materialise(family, base_title_id(title_id) if title_id else "0" * 16)
+    except OSError as e:
+        eslog.error(f"mods: unable to build the overlay of {rom}: {e}")
+        return None
+
+if __name__ == "__main__":
+    # python -m generators.modOverlay [eden|ryujinx]: the mods per title of the store(s)
+    for family in sys.argv[1:] or list(MOD_STORES):
+        store = MOD_STORES[family]
+        titles = sorted(entry.name for entry in os.scandir(store) if entry.is_dir()) if store.is_dir() else []
+        print(f"{family}: {store} ({len(titles)} title(s))")
+        for title in titles:
+            disabled = disabled_mods(title)
+            mods = sorted(entry.name for entry in os.scandir(store / title) if entry.is_dir())
+            print(f"  {title}: " + ", ".join(mod + (" (disabled)" if mod in disabled else "") for mod in mods))
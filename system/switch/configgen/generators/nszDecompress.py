@@ -0,0 +1,390 @@
+from __future__ import annotations
+
+import collections
+import hashlib
+import json
+import logging
+import os
+import struct
+import sys
+import time
+
+from pathlib import Path
+from typing import TYPE_CHECKING, BinaryIO, Iterator
+
+from generators.configWriter import atomic_write
+from generators.switchContainers import (NCZ_SECTION_OFFSET, ContainerError, ContainerFile, Entry, NczHeader, NczSection,
+                                         read_hfs0, read_ncz_header, read_pfs0, read_xci, xci_root_offset)
+from generators.switchPaths import SWITCH_CACHE, SWITCH_ROMS
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
+
+eslog = logging.getLogger(__name__)
+
+# decompressed copies made before a launch, see prelaunch()
+DECOMPRESSED_DIR = SWITCH_CACHE / "decompressed"
+
+COPY_CHUNK = 4 << 20
+STREAM_CHUNK = 1 << 20
+HFS0_ALIGN = 0x200          # gamecard media unit
+CRYPTO_CTR = (3, 4)         # ctr and bktr sections are stored decrypted in the ncz
+
+class DecompressError(Exception):
+    pass
+
+###CRYPTO/ZSTD (optional modules)########################################################################################
+def _zstd():
+    try:
+        import zstandard
+    except ImportError:
+        raise DecompressError("the python zstandard module is required to decompress nsz/xcz files") from None
+    return zstandard
+
+def _ctr_encryptor(key: bytes, counter: bytes):
+    try:
+        from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+        return Cipher(algorithms.AES(key), modes.CTR(counter)).encryptor().update
+    except ImportError:
+        pass
+    try:
+        from Crypto.Cipher import AES
+        return AES.new(key, AES.MODE_CTR, nonce=b"", initial_value=counter).encrypt
+    except ImportError:
+        raise DecompressError("cryptography or pycryptodome is required to re-encrypt nca sections") from None
+
+def encrypt_range(data: bytes, nca_offset: int, sections: tuple[NczSection, ...]) -> bytes:
+    """Re-encrypt the parts of data (starting at nca_offset in the nca) that belong to ctr sections."""
+    end = nca_offset + len(data)
+    out = None
+    for section in sections:
+        if section.crypto_type not in CRYPTO_CTR:
+            continue
+        start, stop = max(nca_offset, section.offset), min(end, section.offset + section.size)
+        if start >= stop:
+            continue
+        if out is None:
+            out = bytearray(data)
+        # counter = section nonce (8 bytes) + big endian block number, keystream starts on a 16 byte boundary
+        aligned = start & ~0xF
+        counter = section.counter[:8] + struct.pack(">Q", aligned >> 4)
+        padding = start - aligned
+        chunk = bytes(padding) + bytes(out[start - nca_offset:stop - nca_offset])
+        out[start - nca_offset:stop - nca_offset] = _ctr_encryptor(section.key, counter)(chunk)[padding:]
+    return bytes(out) if out is not None else data
+
+def _decode_block(job: tuple[bytes, int, int, tuple[NczSection, ...]]) -> bytes:
+    # runs in the pool: zstd block -> plain nca bytes -> re-encrypted nca bytes
+    data, size, nca_offset, sections = job
+    if len(data) < size:
+        data = _zstd().ZstdDecompressor().decompress(data, max_output_size=size)
+    if len(data) != size:
+        raise DecompressError(f"block at 0x{nca_offset:x}: {len(data)} bytes instead of {size}")
+    return encrypt_range(data, nca_offset, sections)
+
+###NCZ -> NCA###########################################################################################################
+class _HashingWriter:
+    def __init__(self, f: BinaryIO):
+        self.f = f
+        self.sha = hashlib.sha256()
+        self.written = 0
+
+    def write(self, data: bytes) -> None:
+        self.f.write(data)
+        self.sha.update(data)
+        self.written += len(data)
+
+class _MappedReader:
+    # file-like window of the mapping for the zstd stream reader, pages are dropped once read
+    def __init__(self, container: ContainerFile, offset: int, size: int):
+        self.container = container
+        self.position = offset
+        self.end = offset + size
+
+    def read(self, size: int = -1) -> bytes:
+        size = self.end - self.position if size < 0 else min(size, self.end - self.position)
+        data = self.container.view(self.position, size).tobytes()
+        self.container.discard(self.position, size)
+        self.position += size
+        return data
+
+def _block_jobs(container: ContainerFile, header: NczHeader) -> Iterator[tuple[bytes, int, int, tuple[NczSection, ...]]]:
+    position = header.data_offset
+    remaining = header.nca_size - NCZ_SECTION_OFFSET
+    nca_offset = NCZ_SECTION_OFFSET
+    for compressed in header.block_sizes:
+        size = min(header.block_size, remaining)
+        # the only copy of the compressed data, it has to be pickled for the pool anyway
+        data = container.view(position, compressed).tobytes()
+        container.discard(position, compressed)
+        yield data, size, nca_offset, header.sections
+        position += compressed
+        nca_offset += size
+        remaining -= size
+
+def decompress_ncz(container: ContainerFile, entry: Entry, out: BinaryIO, pool: ProcessPoolExecutor | None = None, window: int = 8) -> str:
+    """Write the nca of an ncz entry to out, returns its sha256.
+
+    Blocks are decoded by the pool while at most window of them are in
+    flight, so memory stays around window * block size whatever the file
+    size. Solid (single frame) ncz are streamed in the calling process.
+    """
+    header = read_ncz_header(container, entry)
+    if header is None:
+        raise DecompressError(f"{entry.name}: no NCZ section header")
+    writer = _HashingWriter(out)
+    writer.write(container.view(entry.offset, NCZ_SECTION_OFFSET))
+
+    try:
+        if header.block_size is not None:
+            pending: collections.deque = collections.deque()
+            for job in _block_jobs(container, header):
+                pending.append(pool.submit(_decode_block, job) if pool is not None else job)
+                if len(pending) >= window:
+                    item = pending.popleft()
+                    writer.write(item.result() if pool is not None else _decode_block(item))
+            while pending:
+                item = pending.popleft()
+                writer.write(item.result() if pool is not None else _decode_block(item))
+        else:
+            source = _MappedReader(container, header.data_offset, entry.offset + entry.size - header.data_offset)
+            reader = _zstd().ZstdDecompressor().stream_reader(source, read_size=STREAM_CHUNK)
+            nca_offset = NCZ_SECTION_OFFSET
+            while nca_offset < header.nca_size:
+                data = reader.read(min(STREAM_CHUNK, header.nca_size - nca_offset))
+                if not data:
+                    raise DecompressError(f"{entry.name}: zstd stream ended at 0x{nca_offset:x}")
+                writer.write(encrypt_range(data, nca_offset, header.sections))
+                nca_offset += len(data)
+    except (DecompressError, OSError):
+        raise
+    except Exception as e:
+        # zstd errors of a corrupt block, a pool worker that died (BrokenProcessPool)...
+        raise DecompressError(f"{entry.name}: {type(e).__name__}: {e}") from e
+
+    if writer.written != header.nca_size:
+        raise DecompressError(f"{entry.name}: {writer.written} bytes written instead of {header.nca_size}")
+    return writer.sha.hexdigest()
+
+def _verify(entry: Entry, digest: str) -> None:
+    # the nca id is the first half of the sha256 of the whole nca
+    content_id = entry.name.split(".", 1)[0].lower()
+    if len(content_id) == 32 and digest[:32] != content_id:
+        raise DecompressError(f"{entry.name}: hash mismatch, got {digest[:32]}")
+
+###CONTAINERS###########################################################################################################
+def _nca_name(name: str) -> str:
+    return name[:-4] + ".nca" if name.lower().endswith(".ncz") else name
+
+def _copy(container: ContainerFile, offset: int, size: int, out: BinaryIO) -> None:
+    # straight from the mapping, no intermediate buffer
+    for position in range(offset, offset + size, COPY_CHUNK):
+        length = min(COPY_CHUNK, offset + size - position)
+        out.write(container.view(position, length))
+        container.discard(position, length)
+
+def _output_sizes(container: ContainerFile, entries: list[Entry]) -> list[int]:
+    sizes = []
+    for entry in entries:
+        header = read_ncz_header(container, entry, with_blocks=False) if entry.name.lower().endswith(".ncz") else None
+        sizes.append(header.nca_size if header is not None else entry.size)
+    return sizes
+
+def _fs_header(magic: bytes, entries: list[tuple[str, int, int, int, bytes]], entry_size: int, align: int) -> bytes:
+    # entries: (name, relative offset, size, hash size, hash), the string table is padded to align the header
+    strings = b""
+    name_offsets = []
+    for name, *_ in entries:
+        name_offsets.append(len(strings))
+        strings += name.encode() + b"\0"
+    table_size = 0x10 + len(entries) * entry_size + len(strings)
+    strings += bytes(-table_size % align)
+    table = b""
+    for (name, offset, size, hash_size, digest), name_offset in zip(entries, name_offsets):
+        if entry_size == 0x40:
+            table += struct.pack("<QQIIQ", offset, size, name_offset, hash_size, 0) + digest
+        else:
+            table += struct.pack("<QQII", offset, size, name_offset, 0)
+    return magic + struct.pack("<III", len(entries), len(strings), 0) + table + strings
+
+def _layout(sizes: list[int], align: int) -> list[int]:
+    offsets, position = [], 0
+    for size in sizes:
+        position += -position % align
+        offsets.append(position)
+        position += size
+    return offsets
+
+def _write_entries(container: ContainerFile, entries: list[Entry], offsets: list[int], data_start: int, out: BinaryIO, pool, window: int) -> None:
+    for entry, offset in zip(entries, offsets):
+        out.write(bytes(data_start + offset - out.tell()))
+        if entry.name.lower().endswith(".ncz"):
+            _verify(entry, decompress_ncz(container, entry, out, pool, window))
+        else:
+            _copy(container, entry.offset, entry.size, out)
+
+def _write_nsp(container: ContainerFile, out: BinaryIO, pool, window: int) -> None:
+    entries = read_pfs0(container)
+    sizes = _output_sizes(container, entries)
+    offsets = _layout(sizes, 1)
+    header = _fs_header(b"PFS0", [(_nca_name(e.name), o, s, 0, b"") for e, o, s in zip(entries, offsets, sizes)], 0x18, 0x10)
+    out.write(header)
+    _write_entries(container, entries, offsets, len(header), out, pool, window)
+
+def _write_xci(container: ContainerFile, out: BinaryIO, pool, window: int) -> None:
+    # gamecard header and certificate are copied, partitions holding ncz are rebuilt and their
+    # root entry hash (sha256 of the partition header) recomputed
+    root_offset = xci_root_offset(container)
+    partitions = read_xci(container)
+    roots = read_hfs0(container, root_offset)
+
+    rebuilt = {}
+    for root in roots:
+        entries = partitions.get(root.name, [])
+        if not any(e.name.lower().endswith(".ncz") for e in entries):
+            continue
+        sizes = _output_sizes(container, entries)
+        offsets = _layout(sizes, HFS0_ALIGN)
+        header = _fs_header(b"HFS0", [(_nca_name(e.name), o, s, e.hash_size, e.hash) for e, o, s in zip(entries, offsets, sizes)], 0x40, HFS0_ALIGN)
+        rebuilt[root.name] = (entries, offsets, header, offsets[-1] + sizes[-1] if entries else 0)
+
+    root_entries, sizes = [], []
+    for root in roots:
+        if root.name in rebuilt:
+            _, _, header, data_size = rebuilt[root.name]
+            size = len(header) + data_size
+            root_entries.append((root.name, 0, size, len(header), hashlib.sha256(header).digest()))
+        else:
+            size = root.size
+            root_entries.append((root.name, 0, size, root.hash_size, root.hash))
+        sizes.append(size)
+    offsets = _layout(sizes, HFS0_ALIGN)
+    root_entries = [(n, o, s, hs, h) for (n, _, s, hs, h), o in zip(root_entries, offsets)]
+    root_header = _fs_header(b"HFS0", root_entries, 0x40, HFS0_ALIGN)
+
+    _copy(container, 0, root_offset, out)
+    out.write(root_header)
+    data_start = root_offset + len(root_header)
+    for root, offset in zip(roots, offsets):
+        out.write(bytes(data_start + offset - out.tell()))
+        if root.name in rebuilt:
+            entries, entry_offsets, header, _ = rebuilt[root.name]
+            partition_start = out.tell()
+            out.write(header)
+            _write_entries(container, entries, entry_offsets, partition_start + len(header), out, pool, window)
+        else:
+            _copy(container, root.offset, root.size, out)
+
+def decompress(src: Path, dst: Path, workers: int | None = None, window: int | None = None) -> Path:
+    """nsz -> nsp or xcz -> xci, every nca hash is checked while it is written.
+
+    The output is written next to dst and renamed at the end, an error
+    never leaves a partial file behind.
+    """
+    extension = src.suffix.lower()
+    if extension not in (".nsz", ".xcz"):
+        raise DecompressError(f"{src}: not an nsz/xcz file")
+    import multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+
+    _zstd()
+    workers = workers or os.cpu_count() or 1
+    window = window or workers * 2
+    dst.parent.mkdir(parents=True, exist_ok=True)
+    tmp = dst.with_name("." + dst.name + ".part")
+    # no fork: generate() already runs threads (shader warm-up) that may hold the sqlite / logging locks
+    pool = ProcessPoolExecutor(workers, mp_context=multiprocessing.get_context("forkserver"))
+    try:
+        with ContainerFile(src, sequential=True) as container, open(tmp, "wb") as out, pool:
+            if extension == ".nsz":
+                _write_nsp(container, out, pool, window)
+            else:
+                _write_xci(container, out, pool, window)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp, dst)
+    except ContainerError as e:
+        raise DecompressError(f"{src}: {e}") from None
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return dst
+
+def output_name(src: Path) -> str:
+    return src.stem + (".nsp" if src.suffix.lower() == ".nsz" else ".xci")
+
+###PRE-LAUNCH###########################################################################################################
+def prelaunch(rom: str, mode: str | None, cache_dir: Path = DECOMPRESSED_DIR) -> str:
+    """Rom to give to the emulator: rom itself, or its decompressed copy when switch_decompress is set.
+
+    mode "1" keeps only the last decompressed title in cache_dir, "keep"
+    keeps all of them. A copy is reused while the source size/mtime match.
+    """
+    src = Path(rom)
+    if mode not in ("1", "keep") or src.suffix.lower() not in (".nsz", ".xcz"):
+        return rom
+    dst = cache_dir / output_name(src)
+    source_file = dst.with_name(dst.name + ".source")
+    try:
+        st = src.stat()
+        key = {"path": str(src), "size": st.st_size, "mtime": st.st_mtime_ns}
+        with open(source_file) as f:
+            if json.load(f) == key and dst.exists():
+                return str(dst)
+    except (OSError, ValueError):
+        pass
+
+    try:
+        if mode == "1" and cache_dir.exists():
+            # disk space: drop the previous titles before writing a new one
+            for old in cache_dir.iterdir():
+                if old.name not in (dst.name, source_file.name):
+                    old.unlink()
+        start = time.perf_counter()
+        decompress(src, dst)
+        atomic_write(source_file, json.dumps(key).encode())
+        eslog.info(f"decompressed {src.name} in {time.perf_counter() - start:.1f}s")
+        return str(dst)
+    except (DecompressError, OSError) as e:
+        eslog.error(f"unable to decompress {src}, launching it as is: {e}")
+        return rom
+
+###BATCH TOOL###########################################################################################################
+def main(argv: list[str]) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Decompress nsz/xcz files to nsp/xci")
+    parser.add_argument("paths", nargs="*", help=f"files or directories, default {SWITCH_ROMS}")
+    parser.add_argument("--out", help="output directory, default: next to each file")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--delete", action="store_true", help="remove the nsz/xcz once decompressed and verified")
+    args = parser.parse_args(argv)
+
+    sources = []
+    for path in map(Path, args.paths or [SWITCH_ROMS]):
+        if path.is_dir():
+            sources += sorted(p for p in path.rglob("*") if p.suffix.lower() in (".nsz", ".xcz") and not p.name.startswith("."))
+        else:
+            sources.append(path)
+
+    failed = 0
+    for src in sources:
+        dst = (Path(args.out) if args.out else src.parent) / output_name(src)
+        if dst.exists():
+            print(f"skip {src.name}: {dst} exists")
+            continue
+        start = time.perf_counter()
+        try:
+            decompress(src, dst, args.workers)
+        except (DecompressError, OSError) as e:
+            print(f"FAIL {src.name}: {e}")
+            failed += 1
+            continue
+        seconds = time.perf_counter() - start
+        print(f"ok   {src.name} -> {dst.name} ({dst.stat().st_size / seconds / (1 << 20):.0f} MiB/s)")
+        if args.delete:
+            src.unlink()
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,120 @@
+from __future__ import annotations
+
+import logging
+
+from dataclasses import dataclass
+from typing import Callable
+
+eslog = logging.getLogger(__name__)
+
+# "\default" policies of the qt-config.ini options:
+#   DEFAULT_IF_UNSET  "false" when the es option is set, "true" when the default is written
+#   "<string>"        always written as is
+#   callable          written value -> "\default" value
+#   None              no "\default" key (json options)
+DEFAULT_IF_UNSET = "if unset"
+
+# returned by a transform (or used as default): the key is left as the template has it
+SKIP = object()
+
+_POLICY_NONE, _POLICY_IF_UNSET, _POLICY_CONSTANT, _POLICY_CALL = range(4)
+
+@dataclass(frozen=True)
+class Option:
+    es_key: str | None              # None: the default is always written
+    section: str | None             # None for json options
+    key: str
+    default: object
+    transform: Callable | None = None   # es value -> written value
+    default_policy: object = DEFAULT_IF_UNSET
+
+@dataclass(frozen=True)
+class OptionTable:
+    name: str
+    # bump when the options change: the compiled setter is built again
+    version: int
+    options: tuple[Option, ...]
+    format: str = "ini"
+
+    def es_keys(self) -> list[str]:
+        return list(dict.fromkeys(option.es_key for option in self.options if option.es_key is not None))
+
+def _policy(option: Option) -> tuple[int, object]:
+    policy = option.default_policy
+    if policy is None:
+        return _POLICY_NONE, None
+    if policy is DEFAULT_IF_UNSET:
+        return _POLICY_IF_UNSET, None
+    if callable(policy):
+        return _POLICY_CALL, policy
+    return _POLICY_CONSTANT, policy
+
+def _ini_setter(table: OptionTable) -> Callable:
+    sections = tuple(dict.fromkeys(option.section for option in table.options))
+    # one flat tuple, everything the loop needs is precomputed
+    steps = tuple((option.es_key, option.section, option.key, option.key + "\\default", option.default, option.transform)
+                  + _policy(option) for option in table.options)
+
+    def apply(system, config) -> None:
+        isset, values, set_value = system.isOptSet, system.config, config.set
+        for section in sections:
+            if not config.has_section(section):
+                config.add_section(section)
+        for es_key, section, key, default_key, default, transform, policy, policy_value in steps:
+            if es_key is not None and isset(es_key):
+                value = values[es_key]
+                if transform is not None:
+                    value = transform(value)
+                user = True
+            else:
+                value, user = default, False
+            if value is SKIP:
+                continue
+            set_value(section, key, value)
+            if policy == _POLICY_IF_UNSET:
+                set_value(section, default_key, "false" if user else "true")
+            elif policy == _POLICY_CONSTANT:
+                set_value(section, default_key, policy_value)
+            elif policy == _POLICY_CALL:
+                set_value(section, default_key, policy_value(value))
+    return apply
+
+def _json_setter(table: OptionTable) -> Callable:
+    steps = tuple((option.es_key, option.key, option.default, option.transform) for option in table.options)
+
+    def apply(system, data: dict) -> None:
+        isset, values = system.isOptSet, system.config
+        for es_key, key, default, transform in steps:
+            if es_key is not None and isset(es_key):
+                value = values[es_key]
+                if transform is not None:
+                    value = transform(value)
+            else:
+                value = default
+            if value is not SKIP:
+                data[key] = value
+    return apply
+
+_compiled: dict[tuple[str, int], Callable] = {}
+
+def compile_table(table: OptionTable) -> Callable:
+    """Setter applying the whole table in one pass: setter(system, target).
+
+    target is the IniDocument (format "ini") or the dict (format "json") the
+    options are written to. Built once per table name and version.
+    """
+    cache_key = (table.name, table.version)
+    setter = _compiled.get(cache_key)
+    if setter is None:
+        if table.format == "ini":
+            setter = _ini_setter(table)
+        elif table.format == "json":
+            setter = _json_setter(table)
+        else:
+            raise ValueError(f"option table {table.name}: unknown format {table.format!r}")
+        _compiled[cache_key] = setter
+        eslog.debug(f"option table {table.name} v{table.version}: {len(table.options)} option(s) compiled")
+    return setter
+
+def apply_options(table: OptionTable, system, target) -> None:
+    compile_table(table)(system, target)
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import sys
+
+from pathlib import Path
+from typing import Any, Callable
+
+from generators.configWriter import atomic_write
+from generators.hidTopology import HidTopology, hid_topology
+from generators.switchPaths import SWITCH_CACHE, SWITCH_CONFIGGEN
+
+eslog = logging.getLogger(__name__)
+
+# bump when the probe or the stored format changes
+CACHE_VERSION = 1
+
+PAD_CACHE = SWITCH_CACHE / "sdl_gamepads.json"
+SDL_LIBRARY = SWITCH_CONFIGGEN / "sdl2" / "libSDL2-2.0.so.0"
+
+def _read(path: str) -> str:
+    try:
+        with open(path) as f:
+            return f.read().strip()
+    except OSError:
+        return ""
+
+def device_set(sysfs: str = "/sys", topology: HidTopology | None = None) -> list[list[str]]:
+    """(device path, vid/pid guid) of every hidraw and evdev node, read from sysfs only."""
+    topology = topology if topology is not None else hid_topology()
+    devices = [[d.hidraw, d.guid, d.name] for d in topology.devices]
+    input_dir = os.path.join(sysfs, "class", "input")
+    try:
+        events = sorted(e.name for e in os.scandir(input_dir) if e.name.startswith("event"))
+    except OSError:
+        events = []
+    for event in events:
+        ids = os.path.join(input_dir, event, "device", "id")
+        guid = _read(os.path.join(ids, "bustype")) + _read(os.path.join(ids, "vendor")) + _read(os.path.join(ids, "product")) + _read(os.path.join(ids, "version"))
+        devices.append([f"/dev/input/{event}", guid])
+    return devices
+
+def library_hash(library: Path, previous: dict | None) -> dict:
+    # the library is only re-hashed when its size/mtime changed
+    real = os.path.realpath(library)
+    try:
+        st = os.stat(real)
+    except OSError:
+        return {"path": real, "sha1": None}
+    state = {"path": real, "size": st.st_size, "mtime": st.st_mtime_ns}
+    if previous and all(previous.get(k) == v for k, v in state.items()) and previous.get("sha1"):
+        state["sha1"] = previous["sha1"]
+        return state
+    digest = hashlib.sha1()
+    with open(real, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    state["sha1"] = digest.hexdigest()
+    return state
+
+def encode_pads(pads: dict) -> dict:
+    return {
+        path: {
+            "guid": pad["guid"],
+            "platform": pad.get("platform", ""),
+            "inputs": {name: [i.type, i.id, i.value, i.code] for name, i in pad["inputs"].items()},
+        }
+        for path, pad in pads.items()
+    }
+
+def decode_pads(pads: dict, input_factory: Callable[..., Any]) -> dict:
+    return {
+        path: {
+            "guid": pad["guid"],
+            "platform": pad["platform"],
+            "inputs": {name: input_factory(name=name, type=t, id=i, value=v, code=c) for name, (t, i, v, c) in pad["inputs"].items()},
+        }
+        for path, pad in pads.items()
+    }
+
+def cached_gamepads(sdlversion: int, probe: Callable[[], dict], input_factory: Callable[..., Any], cache_file: Path = PAD_CACHE, library: Path = SDL_LIBRARY) -> dict:
+    """Return probe() results, from the cache while the connected devices did not change.
+
+    The key is the device set (path + vid/pid guid of every hidraw/evdev
+    node), the sdl version, the libSDL hash and SDL_GAMECONTROLLERCONFIG:
+    SDL only has to be initialised when one of them changed.
+    """
+    try:
+        with open(cache_file) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        cached = {}
+
+    lib = library_hash(library, cached.get("key", {}).get("library"))
+    key = {
+        "version": CACHE_VERSION,
+        "sdlversion": sdlversion,
+        "library": lib,
+        "devices": device_set(),
+        "mappings": hashlib.sha1(os.environ.get("SDL_GAMECONTROLLERCONFIG", "").encode()).hexdigest(),
+    }
+
+    if cached.get("key") == key:
+        try:
+            return decode_pads(cached["pads"], input_factory)
+        except (KeyError, TypeError, ValueError):
+            pass
+
+    eslog.debug("sdl gamepad cache miss, probing with SDL")
+    pads = probe()
+    try:
+        atomic_write(Path(cache_file), json.dumps({"key": key, "pads": encode_pads(pads)}).encode())
+    except OSError as e:
+        eslog.warning(f"unable to write {cache_file}: {e}")
+    return pads
+
+def invalidate(cache_file: Path = PAD_CACHE) -> bool:
+    try:
+        os.unlink(cache_file)
+        return True
+    except FileNotFoundError:
+        return False
+
+if __name__ == "__main__":
+    # python -m generators.padCache [--invalidate]
+    if "--invalidate" in sys.argv[1:]:
+        print("sdl gamepad cache removed" if invalidate() else "no sdl gamepad cache")
+        sys.exit(0)
+    try:
+        with open(PAD_CACHE) as f:
+            print(json.dumps(json.load(f), indent=2))
+    except OSError:
+        print("no sdl gamepad cache")
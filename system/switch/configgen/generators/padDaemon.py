@@ -0,0 +1,222 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import selectors
+import signal
+import socket
+import sys
+import time
+
+from typing import Any, Callable
+
+from generators.hidTopology import HidTopology, hid_topology
+from generators.padCache import decode_pads, encode_pads
+
+eslog = logging.getLogger(__name__)
+
+PADD_SOCKET = "/var/run/switch-padd.sock"
+NETLINK_KOBJECT_UEVENT = 15
+# hotplug events come in bursts (hid, hidraw, input, event...), wait for the bus to settle
+SETTLE_DELAY = 0.75
+WATCHED_SUBSYSTEMS = {"hidraw", "input"}
+
+def parse_uevent(data: bytes) -> dict[str, str]:
+    # kernel format: "add@/devices/...\0ACTION=add\0DEVPATH=...\0SUBSYSTEM=hidraw\0..."
+    fields = {}
+    for part in data.split(b"\0"):
+        if b"=" in part:
+            key, value = part.split(b"=", 1)
+            fields[key.decode(errors="replace")] = value.decode(errors="replace")
+    return fields
+
+def netlink_socket() -> socket.socket:
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+    sock.bind((os.getpid(), 1))  # group 1: kernel uevents
+    sock.setblocking(False)
+    return sock
+
+class PadState:
+    """Current evdev->hidraw map and SDL pads, recomputed after hotplug.
+
+    probe(sdlversion) and topology() are injectable so the state machine can
+    be driven with fake devices and fake events.
+    """
+
+    def __init__(self, probe: Callable[[int], dict], topology: Callable[[], HidTopology] = hid_topology, sdlversions=(2, 3)):
+        self.probe = probe
+        self.topology = topology
+        self.sdlversions = set(sdlversions)
+        self.generation = 0
+        self.dirty_since: float | None = None
+        self.evdev_hidraw: dict[str, str] = {}
+        self.sdl_gamepads: dict[int, dict] = {}
+
+    def uevent(self, fields: dict[str, str], now: float | None = None) -> bool:
+        if fields.get("SUBSYSTEM") not in WATCHED_SUBSYSTEMS or fields.get("ACTION") not in ("add", "remove", "change"):
+            return False
+        if self.dirty_since is None:
+            self.dirty_since = time.monotonic() if now is None else now
+        return True
+
+    def resync(self, now: float | None = None) -> None:
+        # events were lost (netlink overrun): probe everything again once the bus settled
+        if self.dirty_since is None:
+            self.dirty_since = time.monotonic() if now is None else now
+
+    def settle_timeout(self, now: float | None = None) -> float | None:
+        if self.dirty_since is None:
+            return None
+        now = time.monotonic() if now is None else now
+        return max(0.0, self.dirty_since + SETTLE_DELAY - now)
+
+    def refresh(self) -> None:
+        self.dirty_since = None
+        # hid_topology() is cached for the process: a new snapshot, shared with the probes (sdl3 bus of the guids)
+        hid_topology.cache_clear()
+        self.evdev_hidraw = dict(self.topology().evdev_hidraw)
+        self.sdl_gamepads = {version: encode_pads(self.probe(version)) for version in sorted(self.sdlversions)}
+        self.generation += 1
+        eslog.info(f"switch-padd: generation {self.generation}, {len(self.evdev_hidraw)} evdev nodes, "
+                   + ", ".join(f"sdl{v}: {len(p)} pads" for v, p in self.sdl_gamepads.items()))
+
+    def answer(self, request: dict) -> dict:
+        cmd = request.get("cmd")
+        if cmd == "ping":
+            return {"ok": True, "generation": self.generation}
+        if cmd == "refresh":
+            self.refresh()
+            return {"ok": True, "generation": self.generation}
+        if cmd == "gamepads":
+            if self.dirty_since is not None:
+                # a hotplug is being processed, the client uses its inline detection
+                return {"ok": False, "error": "settling"}
+            version = int(request.get("sdlversion", 2))
+            if version not in self.sdl_gamepads:
+                self.sdlversions.add(version)
+                self.sdl_gamepads[version] = encode_pads(self.probe(version))
+            return {"ok": True, "generation": self.generation, "evdev_hidraw": self.evdev_hidraw, "sdl_gamepads": self.sdl_gamepads[version]}
+        return {"ok": False, "error": f"unknown command {cmd!r}"}
+
+def _handle_client(conn: socket.socket, state: PadState) -> None:
+    conn.settimeout(1.0)
+    try:
+        data = b""
+        while not data.endswith(b"\n"):
+            chunk = conn.recv(4096)
+            if not chunk:
+                break
+            data += chunk
+        try:
+            reply = state.answer(json.loads(data or b"{}"))
+        except ValueError:
+            reply = {"ok": False, "error": "bad request"}
+        conn.sendall(json.dumps(reply).encode() + b"\n")
+    except OSError as e:
+        eslog.debug(f"switch-padd: client error {e}")
+    finally:
+        conn.close()
+
+def serve(state: PadState, socket_path: str = PADD_SOCKET, uevents: socket.socket | None = None) -> None:
+    if os.path.exists(socket_path):
+        os.unlink(socket_path)
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(socket_path)
+    server.listen(8)
+    server.setblocking(False)
+
+    uevents = uevents if uevents is not None else netlink_socket()
+    selector = selectors.DefaultSelector()
+    selector.register(server, selectors.EVENT_READ, "client")
+    selector.register(uevents, selectors.EVENT_READ, "uevent")
+
+    running = True
+    def stop(signum, frame):
+        nonlocal running
+        running = False
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    state.refresh()
+    try:
+        while running:
+            for key, _ in selector.select(state.settle_timeout() if state.dirty_since is not None else 1.0):
+                if key.data == "uevent":
+                    try:
+                        while True:
+                            state.uevent(parse_uevent(uevents.recv(16384)))
+                    except BlockingIOError:
+                        pass
+                    except OSError as e:
+                        # ENOBUFS on a uevent burst: some events are gone, the daemon keeps serving
+                        eslog.warning(f"switch-padd: uevent socket error {e}, resyncing")
+                        state.resync()
+                else:
+                    try:
+                        conn, _ = server.accept()
+                    except OSError as e:
+                        eslog.debug(f"switch-padd: accept failed {e}")
+                        continue
+                    _handle_client(conn, state)
+            if state.dirty_since is not None and state.settle_timeout() == 0:
+                state.refresh()
+    finally:
+        selector.close()
+        server.close()
+        uevents.close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
+
+def request(payload: dict, socket_path: str = PADD_SOCKET, timeout: float = 0.1) -> dict | None:
+    if not os.path.exists(socket_path):
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+            sock.settimeout(timeout)
+            sock.connect(socket_path)
+            sock.sendall(json.dumps(payload).encode() + b"\n")
+            data = b""
+            while not data.endswith(b"\n"):
+                chunk = sock.recv(65536)
+                if not chunk:
+                    break
+                data += chunk
+        return json.loads(data)
+    except (OSError, ValueError) as e:
+        eslog.debug(f"switch-padd not answering: {e}")
+        return None
+
+def query_gamepads(sdlversion: int, input_factory: Callable[..., Any], socket_path: str = PADD_SOCKET, timeout: float = 0.1) -> tuple[dict, dict] | None:
+    """(evdev_hidraw, sdl_gamepads) from the daemon, or None if it is not running or busy."""
+    reply = request({"cmd": "gamepads", "sdlversion": sdlversion}, socket_path, timeout)
+    if not reply or not reply.get("ok"):
+        return None
+    try:
+        return reply["evdev_hidraw"], decode_pads(reply["sdl_gamepads"], input_factory)
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def main(argv: list[str]) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Switch controller detection daemon")
+    parser.add_argument("--socket", default=PADD_SOCKET)
+    parser.add_argument("--query", type=int, metavar="SDLVERSION", help="query a running daemon and print the answer")
+    parser.add_argument("--refresh", action="store_true", help="ask a running daemon to probe again")
+    args = parser.parse_args(argv)
+
+    if args.query is not None or args.refresh:
+        payload = {"cmd": "refresh"} if args.refresh else {"cmd": "gamepads", "sdlversion": args.query}
+        print(json.dumps(request(payload, args.socket, timeout=5.0), indent=2))
+        return 0
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    from generators.edenGenerator import SDL_HIDAPI_ENVIRONMENT, probe_sdl_gamepads
+    # the pads are probed with the drivers the emulators run with (see edenGenerator)
+    os.environ.update(SDL_HIDAPI_ENVIRONMENT)
+    serve(PadState(probe_sdl_gamepads), args.socket)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import logging
+import os
+import sqlite3
+import sys
+import time
+
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from generators.switchContainers import ContainerError, read_container
+from generators.switchPaths import SWITCH_CACHE, SWITCH_ROMS
+
+eslog = logging.getLogger(__name__)
+
+# bump when the parser or the table change, the index is rebuilt
+SCHEMA_VERSION = 2
+
+LIBRARY_DB = SWITCH_CACHE / "library.sqlite"
+# same list as es_systems_switch.cfg
+ROM_EXTENSIONS = (".nro", ".xci", ".xcz", ".nsp", ".nsz")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS roms (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    kind TEXT,
+    title_id TEXT,
+    version INTEGER,
+    type TEXT,
+    name TEXT,
+    name_source TEXT,
+    icon_offset INTEGER,
+    icon_size INTEGER,
+    compressed INTEGER NOT NULL DEFAULT 0,
+    content_size INTEGER NOT NULL DEFAULT 0,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS roms_title_id ON roms (title_id);
+"""
+
+@dataclass(frozen=True)
+class RomEntry:
+    path: str
+    size: int
+    mtime_ns: int
+    kind: str | None
+    title_id: str | None
+    version: int | None
+    type: str | None
+    name: str | None
+    name_source: str | None
+    icon_offset: int | None
+    icon_size: int | None
+    compressed: bool
+    content_size: int
+    error: str | None
+
+@dataclass
+class ScanReport:
+    added: list[str] = field(default_factory=list)
+    updated: list[str] = field(default_factory=list)
+    removed: list[str] = field(default_factory=list)
+    unchanged: int = 0
+    errors: int = 0
+    seconds: float = 0.0
+
+    @property
+    def changed(self) -> bool:
+        return bool(self.added or self.updated or self.removed)
+
+def walk_roms(root: Path) -> dict[str, tuple[int, int]]:
+    """path -> (size, mtime_ns) of every rom below root, from the scandir entries only."""
+    found = {}
+    seen_dirs = set()
+    stack = [str(root)]
+    while stack:
+        directory = stack.pop()
+        try:
+            real = os.path.realpath(directory)
+            if real in seen_dirs:
+                continue
+            seen_dirs.add(real)
+            with os.scandir(directory) as it:
+                for entry in it:
+                    if entry.name.startswith("."):
+                        continue
+                    try:
+                        if entry.is_dir():
+                            stack.append(entry.path)
+                        elif entry.name.lower().endswith(ROM_EXTENSIONS):
+                            st = entry.stat()
+                            found[entry.path] = (st.st_size, st.st_mtime_ns)
+                    except OSError:
+                        continue
+        except OSError as e:
+            eslog.debug(f"rom index: cannot list {directory}: {e}")
+    return found
+
+class RomIndex:
+    """Title metadata of /userdata/roms/switch, kept in sqlite.
+
+    Rows are keyed by (path, size, mtime): a scan lists the directories and
+    only opens the files that are new or changed since the previous scan.
+    """
+
+    def __init__(self, db_path: Path = LIBRARY_DB, roms: Path = SWITCH_ROMS):
+        self.db_path = Path(db_path)
+        self.roms = Path(roms)
+        self._db: sqlite3.Connection | None = None
+
+    @property
+    def db(self) -> sqlite3.Connection:
+        if self._db is None:
+            self.db_path.parent.mkdir(parents=True, exist_ok=True)
+            self._db = sqlite3.connect(self.db_path, timeout=10)
+            if self._db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+                self._db.execute("DROP TABLE IF EXISTS roms")
+                self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            self._db.executescript(_SCHEMA)
+        return self._db
+
+    def close(self) -> None:
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def __enter__(self) -> RomIndex:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def scan(self, force: bool = False) -> ScanReport:
+        start = time.perf_counter()
+        report = ScanReport()
+        found = walk_roms(self.roms)
+        prefix = str(self.roms).rstrip("/") + "/"
+        known = {path: (size, mtime) for path, size, mtime in self.db.execute(
+            "SELECT path, size, mtime_ns FROM roms WHERE substr(path, 1, ?) = ?", (len(prefix), prefix))}
+
+        with self.db:
+            for path, (size, mtime) in found.items():
+                previous = known.pop(path, None)
+                if previous == (size, mtime) and not force:
+                    report.unchanged += 1
+                    continue
+                row = self._parse(path, size, mtime)
+                if row[-1] is not None:
+                    report.errors += 1
+                self.db.execute("INSERT OR REPLACE INTO roms VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", row)
+                (report.added if previous is None else report.updated).append(path)
+            for path in known:
+                report.removed.append(path)
+            self.db.executemany("DELETE FROM roms WHERE path = ?", ((path,) for path in report.removed))
+
+        report.seconds = time.perf_counter() - start
+        if report.changed:
+            eslog.info(f"rom index: {len(report.added)} added, {len(report.updated)} updated, "
+                       f"{len(report.removed)} removed, {report.unchanged} unchanged in {report.seconds:.2f}s")
+        return report
+
+    @staticmethod
+    def _parse(path: str, size: int, mtime: int) -> tuple:
+        try:
+            info = read_container(path)
+        except (OSError, ContainerError, ValueError) as e:
+            # kept in the index so a broken file is not re-read until it changes
+            return (path, size, mtime, None, None, None, None, None, None, None, None, 0, 0, str(e))
+        icon = info.icon
+        return (path, size, mtime, info.kind, info.title_id, info.version, info.type, info.name, info.name_source,
+                icon.offset if icon else None, icon.size if icon else None, int(info.compressed), info.content_size, None)
+
+    def _rows(self, query: str, args: tuple = ()) -> list[RomEntry]:
+        return [RomEntry(*r[:11], compressed=bool(r[11]), content_size=r[12], error=r[13])
+                for r in self.db.execute(query, args)]
+
+    def entries(self) -> list[RomEntry]:
+        return self._rows("SELECT * FROM roms ORDER BY path")
+
+    def get(self, path: str) -> RomEntry | None:
+        rows = self._rows("SELECT * FROM roms WHERE path = ?", (path,))
+        return rows[0] if rows else None
+
+    def by_title(self, title_id: str) -> list[RomEntry]:
+        return self._rows("SELECT * FROM roms WHERE title_id = ? ORDER BY version", (title_id.lower(),))
+
+def main(argv: list[str]) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Index the switch rom library")
+    parser.add_argument("--db", default=str(LIBRARY_DB))
+    parser.add_argument("--roms", default=str(SWITCH_ROMS))
+    parser.add_argument("--force", action="store_true", help="parse every file again")
+    parser.add_argument("--list", action="store_true", help="print the index after the scan")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    with RomIndex(Path(args.db), Path(args.roms)) as index:
+        report = index.scan(force=args.force)
+        print(f"{len(report.added)} added, {len(report.updated)} updated, {len(report.removed)} removed, "
+              f"{report.unchanged} unchanged, {report.errors} errors in {report.seconds:.2f}s")
+        if args.list:
+            for rom in index.entries():
+                print(f"{rom.title_id or '-':<16} {rom.type or '-':<8} v{rom.version if rom.version is not None else '-':<8} "
+                      f"{rom.name or '-'}  [{rom.error or os.path.basename(rom.path)}]")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -1,6 +1,7 @@
 from __future__ import annotations
 
 import filecmp
+import functools
 import logging
 import os
 import re
@@ -17,21 +18,56 @@ from typing import TYPE_CHECKING
 from configgen import Command as Command
 from configgen.batoceraPaths import CONFIGS, HOME, ROMS, SAVES, CACHE, mkdir_if_not_exists
 from configgen.controller import generate_sdl_game_controller_config
+from configgen.exceptions import BatoceraException
 from configgen.generators.Generator import Generator
 from configgen.utils.configparser import CaseSensitiveRawConfigParser
+from generators.biosCheck import RYUJINX_BIOS_MANIFEST, RYUJINX_FIRMWARE_DIR, BiosError, check_bios
+from generators.configWriter import json_diff, write_if_changed
+from generators.drmDiscovery import discover_card
+from generators.emulatorOptions import RYUJINX_OPTIONS, RYUJINX_VIDEO_OPTIONS
+from generators.optionTable import apply_options
+from generators.ryujinxInput import input_entry, player_pad_type
+from generators.sdlConfig import sdl_controller_config
+from generators.shaderCache import manage_shader_cache, warm_shader_cache
+from generators.switchLayout import overlay_enabled, reconcile, ryujinx_layout
+from generators.switchLog import configure_switch_logging, flush_switch_logs, get_switch_logger
+from generators.titleProfiles import apply_title_profile
 
 eslog = logging.getLogger(__name__)
+# buffered, written to /tmp/debugryujinx.txt once at the end of generate()
+switchlog = get_switch_logger("ryujinx", "/tmp/debugryujinx.txt")
 
 if TYPE_CHECKING:
     from configgen.types import HotkeysContext
 
-subprocess.run(["batocera-mouse", "show"], check=False)
-
-def getCurrentCard() -> str | None:
-    proc = subprocess.Popen(["/userdata/system/switch/configgen/generators/detectvideo.sh"], stdout=subprocess.PIPE, shell=True)
-    (out, err) = proc.communicate()
-    for val in out.decode().splitlines():
-        return val # return the first line
+# environment of the appimage, SDL_GAMECONTROLLERCONFIG is added per launch
+RYUJINX_ENVIRONMENT = {
+    "DRI_PRIME": "1",
+    "AMD_VULKAN_ICD": "RADV",
+    "DISABLE_LAYER_AMD_SWITCHABLE_GRAPHICS_1": "1",
+    "XDG_MENU_PREFIX": "batocera-",
+    "XDG_CONFIG_DIRS": "/etc/xdg",
+    "XDG_CURRENT_DESKTOP": "XFCE",
+    "DESKTOP_SESSION": "XFCE",
+    "QT_FONT_DPI": "96",
+    "QT_SCALE_FACTOR": "1",
+    "GDK_SCALE": "1",
+    "DOTNET_EnableAlternateStackCheck": "1",
+    "XDG_CONFIG_HOME": "/userdata/system/configs",
+    "XDG_CACHE_HOME": "/userdata/system/.cache",
+    "SDL_JOYSTICK_HIDAPI": "1",
+    "SDL_JOYSTICK_HIDAPI_XBOX": "0",
+    "SDL_JOYSTICK_HIDAPI_XBOX_ONE": "0",
+    "SDL_JOYSTICK_HIDAPI_STEAMDECK": "0",
+    "SDL_JOYSTICK_HIDAPI_PS4": "0",
+    "SDL_JOYSTICK_HIDAPI_PS5": "0",
+    "SDL_JOYSTICK_HIDAPI_SWITCH": "0",
+}
+
+@functools.cache
+def show_mouse() -> None:
+    # only once per process, and only when ryujinx is really the one launched
+    subprocess.run(["batocera-mouse", "show"], check=False)
 
 class RyujinxGenerator(Generator):
 
@@ -44,135 +80,83 @@ class RyujinxGenerator(Generator):
 
     def generate(self, system, rom, playersControllers, metadata, guns, wheels, gameResolution):
 
+        configure_switch_logging(system.config.get("switch_log_level"))
+        show_mouse()
+
         st = os.stat("/userdata/system/switch/appimages/ryujinx-emu.AppImage")
         os.chmod("/userdata/system/switch/appimages/ryujinx-emu.AppImage", st.st_mode | stat.S_IEXEC)
-        st = os.stat("/userdata/system/switch/configgen/generators/detectvideo.sh")
-        os.chmod("/userdata/system/switch/configgen/generators/detectvideo.sh", st.st_mode | stat.S_IEXEC)
 
-        mkdir_if_not_exists(Path("/userdata/system/configs/Ryujinx"))
-        # mkdir_if_not_exists(Path("/userdata/system/configs/Ryujinx/system"))
+        #Ryujinx keys/save/mods folders and links
+        mod_overlay = overlay_enabled(system.config.get("switch_mod_overlay"), rom)
+        reconcile("ryujinx-emu", ryujinx_layout(mod_overlay))
+        #only the enabled mods of this title in mods/ when switch_mod_overlay is set
+        #(optional features are imported only when their es option is on)
+        if mod_overlay:
+            from generators.modOverlay import prepare_mods
+            prepare_mods("ryujinx-emu", rom, system.config.get("switch_mod_overlay"))
+
+        #keys and installed firmware checked before the appimage boots, not in config mode (that is where they get installed) nor for homebrew
+        if rom != 'config':
+            try:
+                check_bios(system.config.get("switch_bios_check"), rom, RYUJINX_FIRMWARE_DIR, RYUJINX_BIOS_MANIFEST)
+            except BiosError as e:
+                raise BatoceraException(f"ryujinx-emu: {e}") from e
 
         template = Path("/userdata/system/switch/configgen/Config.json.template")
         target = CONFIGS / "Ryujinx" / "Config.json.template"
-        copyfile(template, target) 
-
-    #Create Folder
-        mkdir_if_not_exists(Path("/userdata/system/configs/Ryujinx/mods"))
-        mkdir_if_not_exists(Path("/userdata/system/configs/Ryujinx/bis"))
-        mkdir_if_not_exists(Path("/userdata/system/configs/Ryujinx/bis/system"))
-        mkdir_if_not_exists(Path("/userdata/system/configs/Ryujinx/bis/system/save"))
-        mkdir_if_not_exists(Path("/userdata/system/configs/Ryujinx/bis/system/Contents"))
-        mkdir_if_not_exists(Path("/userdata/system/configs/Ryujinx/bis/user"))
-        mkdir_if_not_exists(Path("/userdata/saves/switch"))
-        mkdir_if_not_exists(Path("/userdata/saves/switch/ryujinx"))
-        mkdir_if_not_exists(Path("/userdata/saves/switch/ryujinx/save"))
-        mkdir_if_not_exists(Path("/userdata/saves/switch/ryujinx/save/save_user"))
-        mkdir_if_not_exists(Path("/userdata/saves/switch/ryujinx/save/save_system"))
-        mkdir_if_not_exists(Path("/userdata/saves/switch/ryujinx/mods"))
-
-    #Link Ryujinx key folder
-        #KEY-------
-        if os.path.exists("/userdata/system/configs/Ryujinx/system"):
-            if not os.path.islink("/userdata/system/configs/Ryujinx/system"):
-                shutil.rmtree("/userdata/system/configs/Ryujinx/system")
-                os.symlink("/userdata/bios/switch/keys", "/userdata/system/configs/Ryujinx/system")
-            else:
-                current_target = os.readlink("/userdata/system/configs/Ryujinx/system")
-                if current_target != "/userdata/bios/switch/keys":
-                    os.unlink("/userdata/bios/switch/keys")
-                    os.symlink("/userdata/bios/switch/keys", "/userdata/system/configs/Ryujinx/system")
-        else:
-            os.symlink("/userdata/bios/switch/keys", "/userdata/system/configs/Ryujinx/system")
-
-    #Link Ryujinx User save/mods folder (bis/user)/(bis/system/save)
-        # #USER SAVE (bis/user)-------
-        if os.path.exists("/userdata/system/configs/Ryujinx/bis/user"):
-            if not os.path.islink("/userdata/system/configs/Ryujinx/bis/user"):
-                shutil.rmtree("/userdata/system/configs/Ryujinx/bis/user")
-                os.symlink("/userdata/saves/switch/ryujinx/save/save_user", "/userdata/system/configs/Ryujinx/bis/user")
-            else:
-                current_target = os.readlink("/userdata/system/configs/Ryujinx/bis/user")
-                if current_target != "/userdata/saves/switch/ryujinx/save/save_user":
-                    os.unlink("/userdata/saves/switch/ryujinx/save/save_user")
-                    os.symlink("/userdata/saves/switch/ryujinx/save/save_user", "/userdata/system/configs/Ryujinx/bis/user")
-        else:
-            os.symlink("/userdata/saves/switch/ryujinx/save/save_user", "/userdata/system/configs/Ryujinx/bis/user")
-
-        # #USER SAVE (bis/system/save)-------
-        if os.path.exists("/userdata/system/configs/Ryujinx/bis/system/save"):
-            if not os.path.islink("/userdata/system/configs/Ryujinx/bis/system/save"):
-                shutil.rmtree("/userdata/system/configs/Ryujinx/bis/system/save")
-                os.symlink("/userdata/saves/switch/ryujinx/save/save_system", "/userdata/system/configs/Ryujinx/bis/system/save")
-            else:
-                current_target = os.readlink("/userdata/system/configs/Ryujinx/bis/system/save")
-                if current_target != "/userdata/saves/switch/ryujinx/save/save_system":
-                    os.unlink("/userdata/saves/switch/ryujinx/save/save_system")
-                    os.symlink("/userdata/saves/switch/ryujinx/save/save_system", "/userdata/system/configs/Ryujinx/bis/system/save")
-        else:
-            os.symlink("/userdata/saves/switch/ryujinx/save/save_system", "/userdata/system/configs/Ryujinx/bis/system/save")
-
-        # #USER MODS (Ryujinx/mods)-------
-        if os.path.exists("/userdata/system/configs/Ryujinx/mods"):
-            if not os.path.islink("/userdata/system/configs/Ryujinx/mods"):
-                shutil.rmtree("/userdata/system/configs/Ryujinx/mods")
-                os.symlink("/userdata/saves/switch/ryujinx/mods", "/userdata/system/configs/Ryujinx/mods")
-            else:
-                current_target = os.readlink("/userdata/system/configs/Ryujinx/mods")
-                if current_target != "/userdata/saves/switch/ryujinx/mods":
-                    os.unlink("/userdata/saves/switch/ryujinx/mods")
-                    os.symlink("/userdata/saves/switch/ryujinx/mods", "/userdata/system/configs/Ryujinx/mods")
-        else:
-            os.symlink("/userdata/saves/switch/ryujinx/mods", "/userdata/system/configs/Ryujinx/mods")
+        write_if_changed(target, template.read_bytes())
 
         RyujinxConfig = Path('/userdata/system/configs/Ryujinx/Config.json')
         RyujinxConfigTemplate = str(CONFIGS) + '/Ryujinx/Config.json.template'
         RyujinxHome = CONFIGS
 
-        RyujinxConfigFileBefore = str(CONFIGS) + '/Ryujinx/Config.json.before'
+        #replaced by Config.json.sha256 + Config.json.diff.json
+        RyujinxConfigFileBefore = Path(str(CONFIGS) + '/Ryujinx/Config.json.before')
+        if RyujinxConfigFileBefore.exists():
+            RyujinxConfigFileBefore.unlink()
 
         RyujinxRegisteredBios = Path('/userdata/system/configs/Ryujinx/bis/system/Contents/registered')
 
+        #per title options (title-profiles.ini) for what is not set in ES
+        apply_title_profile(system, rom)
+
         #Configuration update
-        RyujinxGenerator.writeRyujinxConfig(str(CONFIGS) + '/Ryujinx/Config.json', RyujinxConfigFileBefore, RyujinxConfigTemplate, system, playersControllers)
-
-        environment = {
-            "SDL_GAMECONTROLLERCONFIG": generate_sdl_game_controller_config(playersControllers),
-            "DRI_PRIME": "1",
-            "AMD_VULKAN_ICD": "RADV",
-            "DISABLE_LAYER_AMD_SWITCHABLE_GRAPHICS_1": "1",
-            "XDG_MENU_PREFIX": "batocera-",
-            "XDG_CONFIG_DIRS": "/etc/xdg",
-            "XDG_CURRENT_DESKTOP": "XFCE",
-            "DESKTOP_SESSION": "XFCE",
-            "QT_FONT_DPI": "96",
-            "QT_SCALE_FACTOR": "1",
-            "GDK_SCALE": "1",
-            "DOTNET_EnableAlternateStackCheck": "1",
-            "XDG_CONFIG_HOME": "/userdata/system/configs",
-            "XDG_CACHE_HOME": "/userdata/system/.cache",
-        }
+        RyujinxGenerator.writeRyujinxConfig(str(CONFIGS) + '/Ryujinx/Config.json', RyujinxConfigTemplate, system, playersControllers)
 
-        environment["SDL_JOYSTICK_HIDAPI"] = "1"
-        environment["SDL_JOYSTICK_HIDAPI_XBOX"] = "0"
-        environment["SDL_JOYSTICK_HIDAPI_XBOX_ONE"] = "0"
-        environment["SDL_JOYSTICK_HIDAPI_STEAMDECK"] = "0"
-        environment["SDL_JOYSTICK_HIDAPI_PS4"] = "0"
-        environment["SDL_JOYSTICK_HIDAPI_PS5"] = "0"
-        environment["SDL_JOYSTICK_HIDAPI_SWITCH"] = "0"
+        #SDL_GAMECONTROLLERCONFIG generated once per set of pads, cached in SWITCH_CACHE
+        sdl_config = sdl_controller_config(playersControllers, generate_sdl_game_controller_config)
+        environment = {"SDL_GAMECONTROLLERCONFIG": sdl_config, **RYUJINX_ENVIRONMENT}
 
         if rom == 'config':
             commandArray = ["/userdata/system/switch/appimages/ryujinx-emu.AppImage"]
         else:
+            #shader caches: last use of this title, least recently played ones trimmed to the budget
+            manage_shader_cache("ryujinx-emu", rom, system.config.get("switch_shader_cache_budget"))
+            #prefetch of its shader cache in the background while the appimage mounts
+            warm_shader_cache("ryujinx-emu", rom, system.config.get("switch_shader_warmup"))
+            #save snapshots before the session and after the emulator exits
+            if system.config.get("switch_save_backup") == "1":
+                from generators.saveBackup import backup_around_launch
+                backup_around_launch("ryujinx", system.config.get("switch_save_backup"))
+            #save of this title from eden/citron when it was played there last
+            if system.config.get("switch_save_sync") == "1":
+                from generators.saveSync import sync_saves
+                sync_saves(rom, system.config.get("switch_save_sync"))
+            #nsz/xcz decompressed to the cache first when switch_decompress is set
+            if system.config.get("switch_decompress") in ("1", "keep"):
+                from generators.nszDecompress import prelaunch
+                rom = prelaunch(rom, system.config.get("switch_decompress"))
             commandArray = ["/userdata/system/switch/appimages/ryujinx-emu.AppImage" , rom]
 
-        writelog("Controller Config before Playing: {}".format(generate_sdl_game_controller_config(playersControllers)))
+        switchlog.info("Controller Config before Playing: %s", sdl_config)
+        flush_switch_logs()
 
         return Command.Command(array=commandArray, env=environment)
 
 
-    def writeRyujinxConfig(RyujinxConfigFile, RyujinxConfigFileBefore, RyujinxConfigTemplateFile, system, playersControllers):
+    def writeRyujinxConfig(RyujinxConfigFile, RyujinxConfigTemplateFile, system, playersControllers):
 
-        writelog(RyujinxConfigTemplateFile)
+        switchlog.debug("template %s", RyujinxConfigTemplateFile)
 
         data = {}
 
@@ -187,358 +171,46 @@ class RyujinxGenerator(Generator):
                     current_data = json.load(read_file)
                     data['input_config'] = current_data['input_config']
 
-        if system.isOptSet('res_scale'):
-            data['res_scale'] = int(system.config["res_scale"])
-        else:
-            data['res_scale'] = 1
-
-        if system.isOptSet('max_anisotropy'):
-            data['max_anisotropy'] = int(system.config["max_anisotropy"])
-        else:
-            data['max_anisotropy'] = -1 
-
-        if system.isOptSet('aspect_ratio'):
-            data['aspect_ratio'] = system.config["aspect_ratio"]
-        else:
-            data['aspect_ratio'] = 'Fixed16x9'
-
-        if system.isOptSet('system_language'):
-            data['system_language'] = system.config["system_language"]
-        else:
-            data['system_language'] = 'AmericanEnglish'
-
-        if system.isOptSet('system_region'):
-            data['system_region'] = system.config["system_region"]
-        else:
-            data['system_region'] = 'USA'
-
-        if system.isOptSet('ryu_docked_mode'):
-            data['docked_mode'] = bool(int(system.config["ryu_docked_mode"]))
-        else:
-            data['docked_mode'] = bool(1)
-
-        if system.isOptSet('ryu_enable_discord_integration'):
-            data['enable_discord_integration'] = bool(int(system.config["ryu_enable_discord_integration"]))
-        else:
-            data['enable_discord_integration'] = bool(1)
-
-        #V-Sync
-        if system.isOptSet('ryu_vsync'):
-            data['enable_vsync'] = bool(int(system.config["ryu_vsync"]))
-        else:
-            data['enable_vsync'] = bool(1)
+        # es options of generators/emulatorOptions.py, in one pass
+        apply_options(RYUJINX_OPTIONS, system, data)
 
         data['language_code'] = str(getLangFromEnvironment())
         data['game_dirs'] = ["/userdata/roms/switch"]
 
         if not system.isOptSet('ryu_auto_controller_config') or system.config["ryu_auto_controller_config"] != "0":
-            debugcontrollers = True
-
-            if debugcontrollers:
-                writelog("=====================================================Start Bato Controller Debug Info=========================================================")
+            if switchlog.isEnabledFor(logging.DEBUG):
+                switchlog.debug("=====================================================Start Bato Controller Debug Info=========================================================")
                 for index, controller in enumerate(playersControllers, start=0):
-                    writelog("Controller configName: {}".format(controller.name))
-                    writelog("Controller index: {}".format(controller.index))
-                    writelog("Controller real_name: {}".format(controller.real_name))
-                    writelog("Controller device_path: {}".format(controller.device_path))
-                    writelog("Controller player: {}".format(controller.player_number))
-                    writelog("Controller GUID: {}".format(controller.guid))
-                    writelog("")
-                writelog("=====================================================End Bato Controller Debug Info===========================================================")
-                writelog("")
+                    switchlog.debug("Controller configName: %s", controller.name)
+                    switchlog.debug("Controller index: %s", controller.index)
+                    switchlog.debug("Controller real_name: %s", controller.real_name)
+                    switchlog.debug("Controller device_path: %s", controller.device_path)
+                    switchlog.debug("Controller player: %s", controller.player_number)
+                    switchlog.debug("Controller GUID: %s", controller.guid)
+                switchlog.debug("=====================================================End Bato Controller Debug Info===========================================================")
 
             input_config = []
-            index_of_convuuid = {}
-            for index, controller in enumerate(playersControllers, start=0):
-                    NINTENDO_GUIDS = {
-                        "050000007e0500000620000001800000",
-                        "050000007e0500000720000001800000",
-                        "050000007e0500000920000001800000",
-                    }
-
-                    invert_buttons = controller.guid in NINTENDO_GUIDS
-
-                    myid = uuid.UUID(controller.guid)
-                    myid.bytes_le
-                    convuuid = uuid.UUID(bytes=myid.bytes_le)
-                    if myid in index_of_convuuid:
-                        index_of_convuuid[myid] = index_of_convuuid[myid] + 1
-                    else:
-                        index_of_convuuid[myid] = 0
-
-                    controllernumber = str(controller.index)
-                    #Map Keys and GUIDs
-                    cvalue = {}
-
-                    motion = {}
-                    motion['motion_backend'] = "GamepadDriver"
-                    motion['sensitivity'] = 100
-                    motion['gyro_deadzone'] = 1
-                    motion['enable_motion'] = bool(1)
-
-                    rumble = {}
-                    rumble['strong_rumble'] = 1
-                    rumble['weak_rumble'] = 1
-                    rumble['enable_rumble'] = bool(1)
-
-                    which_pad = "p" + str(int(controller.player_number)) + "_pad"
-                    if ((system.isOptSet(which_pad) and ((system.config[which_pad] == "ProController") or (system.config[which_pad] == "JoyconPair")) ) or not system.isOptSet(which_pad)):
-                        left_joycon_stick = {}
-                        left_joycon_stick['joystick'] = "Left"
-                        left_joycon_stick['rotate90_cw'] = bool(0)
-                        left_joycon_stick['invert_stick_x'] = bool(0)
-                        left_joycon_stick['invert_stick_y'] = bool(0)
-                        left_joycon_stick['stick_button'] = "LeftStick"
-
-                        right_joycon_stick = {}
-                        right_joycon_stick['joystick'] = "Right"
-                        right_joycon_stick['rotate90_cw'] = bool(0)
-                        right_joycon_stick['invert_stick_x'] = bool(0)
-                        right_joycon_stick['invert_stick_y'] = bool(0)
-                        right_joycon_stick['stick_button'] = "RightStick" 
-
-                        left_joycon = {}
-                        left_joycon['button_minus'] = "Back"
-                        left_joycon['button_l'] = "LeftShoulder"
-                        left_joycon['button_zl'] = "LeftTrigger"
-                        left_joycon['button_sl'] = "Unbound"
-                        left_joycon['button_sr'] = "Unbound"
-                        left_joycon['dpad_up'] = "DpadUp"
-                        left_joycon['dpad_down'] = "DpadDown"
-                        left_joycon['dpad_left'] = "DpadLeft"
-                        left_joycon['dpad_right'] = "DpadRight"
-
-                        right_joycon = {}
-                        right_joycon['button_plus'] = "Start"
-                        right_joycon['button_r'] = "RightShoulder"
-                        right_joycon['button_zr'] = "RightTrigger"
-                        right_joycon['button_sl'] = "Unbound"
-                        right_joycon['button_sr'] = "Unbound"
-
-                        if invert_buttons:
-                            right_joycon['button_x'] = "X"
-                            right_joycon['button_b'] = "B"
-                            right_joycon['button_y'] = "Y"
-                            right_joycon['button_a'] = "A" 
-                        else:
-                            right_joycon['button_x'] = "Y"
-                            right_joycon['button_b'] = "A"
-                            right_joycon['button_y'] = "X"
-                            right_joycon['button_a'] = "B" 
-
-                        if system.isOptSet(which_pad):
-                            cvalue['controller_type'] = system.config["p1_pad"]
-                        else: 
-                            cvalue['controller_type'] = "ProController"
-                    elif (system.isOptSet(which_pad) and (system.config[which_pad] == "JoyconLeft")):
-                        left_joycon_stick = {}
-                        left_joycon_stick['joystick'] = "Left"
-                        left_joycon_stick['rotate90_cw'] = bool(0)
-                        left_joycon_stick['invert_stick_x'] = bool(0)
-                        left_joycon_stick['invert_stick_y'] = bool(0)
-                        left_joycon_stick['stick_button'] = "LeftStick"            
-
-                        right_joycon_stick = {}
-                        right_joycon_stick['joystick'] = "Unbound"
-                        right_joycon_stick['rotate90_cw'] = bool(0)
-                        right_joycon_stick['invert_stick_x'] = bool(0)
-                        right_joycon_stick['invert_stick_y'] = bool(0)
-                        right_joycon_stick['stick_button'] = "Unbound"
-
-                        left_joycon = {}
-                        left_joycon['button_minus'] = "Back"
-                        left_joycon['button_l'] = "LeftShoulder"
-                        left_joycon['button_zl'] = "LeftTrigger"
-                        left_joycon['button_sl'] = "LeftShoulder"
-                        left_joycon['button_sr'] = "RightShoulder"
-
-                        left_joycon['dpad_up'] = "Y"
-                        left_joycon['dpad_down'] = "A"
-                        left_joycon['dpad_left'] = "X"
-                        left_joycon['dpad_right'] = "B"                        
-
-                        right_joycon = {}
-                        right_joycon['button_plus'] = "Start"
-                        right_joycon['button_r'] = "RightShoulder"
-                        right_joycon['button_zr'] = "RightTrigger"
-                        right_joycon['button_sl'] = "Unbound"
-                        right_joycon['button_sr'] = "Unbound"
-
-                        if invert_buttons:
-                            right_joycon['button_x'] = "X"
-                            right_joycon['button_b'] = "B"
-                            right_joycon['button_y'] = "Y"
-                            right_joycon['button_a'] = "A"                         
-                        else:
-                            right_joycon['button_x'] = "Y"
-                            right_joycon['button_b'] = "A"
-                            right_joycon['button_y'] = "X"
-                            right_joycon['button_a'] = "B" 
-
-                        cvalue['controller_type'] = "JoyconLeft"
-                        
-                    elif (system.isOptSet(which_pad) and (system.config[which_pad] == "JoyconRight")):
-                        left_joycon_stick = {}
-                        left_joycon_stick['joystick'] = "Unbound"
-                        left_joycon_stick['rotate90_cw'] = bool(1)
-                        left_joycon_stick['invert_stick_x'] = bool(1)
-                        left_joycon_stick['invert_stick_y'] = bool(1)
-                        left_joycon_stick['stick_button'] = "Unbound"           
-
-                        right_joycon_stick = {}
-                        right_joycon_stick['joystick'] = "Left"
-                        right_joycon_stick['rotate90_cw'] = bool(0)
-                        right_joycon_stick['invert_stick_x'] = bool(0)
-                        right_joycon_stick['invert_stick_y'] = bool(0)
-                        right_joycon_stick['stick_button'] = "LeftStick" 
-
-                        left_joycon = {}
-                        left_joycon['button_minus'] = "Back"
-                        left_joycon['button_l'] = "LeftShoulder"
-                        left_joycon['button_zl'] = "LeftTrigger"
-                        left_joycon['button_sl'] = "Unbound"
-                        left_joycon['button_sr'] = "Unbound"
-
-                        left_joycon['dpad_up'] = "DpadUp"
-                        left_joycon['dpad_down'] = "DpadDown"
-                        left_joycon['dpad_left'] = "DpadLeft"
-                        left_joycon['dpad_right'] = "DpadRight"
-
-                        right_joycon = {}
-                        right_joycon['button_plus'] = "Start"
-                        right_joycon['button_r'] = "RightShoulder"
-                        right_joycon['button_zr'] = "RightTrigger"
-                        right_joycon['button_sl'] = "LeftShoulder"
-                        right_joycon['button_sr'] = "RightShoulder"
-
-                        if invert_buttons:
-                            right_joycon['button_x'] = "A"
-                            right_joycon['button_b'] = "Y"
-                            right_joycon['button_y'] = "X"
-                            right_joycon['button_a'] = "B" 
-                        else:
-                            right_joycon['button_x'] = "B"
-                            right_joycon['button_b'] = "X"
-                            right_joycon['button_y'] = "Y"
-                            right_joycon['button_a'] = "A"                         
-                        cvalue['controller_type'] = "JoyconRight"
-                    else:
-                        #Handle old settings that don't match above
-                        left_joycon_stick = {}
-                        left_joycon_stick['joystick'] = "Left"
-                        left_joycon_stick['rotate90_cw'] = bool(0)
-                        left_joycon_stick['invert_stick_x'] = bool(0)
-                        left_joycon_stick['invert_stick_y'] = bool(0)
-                        left_joycon_stick['stick_button'] = "LeftStick"            
-
-                        right_joycon_stick = {}
-                        right_joycon_stick['joystick'] = "Right"
-                        right_joycon_stick['rotate90_cw'] = bool(0)
-                        right_joycon_stick['invert_stick_x'] = bool(0)
-                        right_joycon_stick['invert_stick_y'] = bool(0)
-                        right_joycon_stick['stick_button'] = "RightStick" 
-
-                        left_joycon = {}
-                        left_joycon['button_minus'] = "Back"
-                        left_joycon['button_l'] = "LeftShoulder"
-                        left_joycon['button_zl'] = "LeftTrigger"
-                        left_joycon['button_sl'] = "Unbound"
-                        left_joycon['button_sr'] = "Unbound"
-                        left_joycon['dpad_up'] = "DpadUp"
-                        left_joycon['dpad_down'] = "DpadDown"
-                        left_joycon['dpad_left'] = "DpadLeft"
-                        left_joycon['dpad_right'] = "DpadRight"
-
-                        right_joycon = {}
-                        right_joycon['button_plus'] = "Start"
-                        right_joycon['button_r'] = "RightShoulder"
-                        right_joycon['button_zr'] = "RightTrigger"
-                        right_joycon['button_sl'] = "Unbound"
-                        right_joycon['button_sr'] = "Unbound"
-
-                        if invert_buttons:
-                            right_joycon['button_x'] = "X"
-                            right_joycon['button_b'] = "B"
-                            right_joycon['button_y'] = "Y"
-                            right_joycon['button_a'] = "A" 
-                        else:
-                            right_joycon['button_x'] = "Y"
-                            right_joycon['button_b'] = "A"
-                            right_joycon['button_y'] = "X"
-                            right_joycon['button_a'] = "B" 
-
-                        cvalue['controller_type'] = "ProController"
-
-                    cvalue['left_joycon_stick'] = left_joycon_stick          
-                    cvalue['right_joycon_stick'] = right_joycon_stick
-                    cvalue['deadzone_left'] = 0.1           
-                    cvalue['deadzone_right'] = 0.1 
-                    cvalue['range_left'] = 1          
-                    cvalue['range_right'] = 1 
-                    cvalue['trigger_threshold'] = 0.5  
-                    cvalue['motion'] = motion
-                    cvalue['rumble'] = rumble
-                    cvalue['led'] = {}
-                    cvalue['led']['enable_led'] = False
-                    cvalue['led']['turn_off_led'] = False
-                    cvalue['led']['use_rainbow'] = False
-                    cvalue['led']['led_color'] = 0
-                    cvalue['left_joycon'] = left_joycon
-                    cvalue['right_joycon'] = right_joycon
-
-                    cvalue['version'] = 1
-                    cvalue['backend'] = "GamepadSDL2"
-                    cvalue['id'] = str(index_of_convuuid[myid]) + '-' + str(convuuid)
-              
-                    cvalue['player_index'] = "Player" +  str(int(controller.player_number))
-                    input_config.append(cvalue)
-            
-            data['input_config'] = input_config
-
-        #Resolution Scale
-        if system.isOptSet('ryu_resolution_scale'):
-            if system.config["ryu_resolution_scale"] in {'1.0', '2.0', '3.0', '4.0', 1.0, 2.0, 3.0, 4.0}:
-                data['res_scale_custom'] = 1
-                if system.config["ryu_resolution_scale"] in {'1.0', 1.0}:
-                    data['res_scale'] = 1
-                if system.config["ryu_resolution_scale"] in {'2.0', 2.0}:
-                    data['res_scale'] = 2
-                if system.config["ryu_resolution_scale"] in {'3.0', 3.0}:
-                    data['res_scale'] = 3
-                if system.config["ryu_resolution_scale"] in {'4.0', 4.0}:
-                    data['res_scale'] = 4
-            else:
-                data['res_scale_custom'] = float(system.config["ryu_resolution_scale"])
-                data['res_scale'] = -1
-        else:
-            data['res_scale_custom'] = 1
-            data['res_scale'] = 1
-
-        #Texture Recompression
-        if system.isOptSet('ryu_texture_recompression'):
-            if system.config["ryu_texture_recompression"] in {"true", "1", 1}:
-                data['enable_texture_recompression'] = True
-            elif system.config["ryu_texture_recompression"] in {"false", "0", 0}:
-                data['enable_texture_recompression'] = False
-        else:
-            data['enable_texture_recompression'] = False
+            port_of_guid = {}
+            for controller in playersControllers:
+                #port index is by guid
+                myid = uuid.UUID(controller.guid)
+                port_of_guid[myid] = port_of_guid[myid] + 1 if myid in port_of_guid else 0
+                #precomputed entry of the pad type of this player (generators/ryujinxInput.py)
+                pad_type = player_pad_type(system, controller.player_number)
+                input_config.append(input_entry(pad_type, controller.guid, port_of_guid[myid], controller.player_number))
 
-        dri_path = getCurrentCard()
-
-        with open(dri_path + '/device/vendor', "r") as vendor_file:
-            vendor_id = vendor_file.read().strip().upper().replace("0X","0x")
-
-        with open(dri_path + '/device/device', "r") as device_file:
-            device_id = device_file.read().strip().upper().replace("0X","0x")
+            data['input_config'] = input_config
 
-        data['preferred_gpu'] = vendor_id + '_' + device_id
+        #Resolution Scale, Texture Recompression
+        apply_options(RYUJINX_VIDEO_OPTIONS, system, data)
 
-        with open(RyujinxConfigFile, "w") as outfile:
-            outfile.write(json.dumps(data, indent=2))
+        #GPU driving the preferred/first connected display, read from /sys/class/drm
+        card = discover_card()
+        if card is not None:
+            data['preferred_gpu'] = card.preferred_gpu
 
-        #just to be able to do diff to be sure than the emu is not changing values
-        with open(RyujinxConfigFileBefore, "w") as outfile:
-            outfile.write(json.dumps(data, indent=2))
+        #only rewritten when the content changes, a diff is kept in Config.json.diff.json if the emu changed values
+        write_if_changed(Path(RyujinxConfigFile), json.dumps(data, indent=2), json_diff)
 
 def getLangFromEnvironment():
     lang = os.environ['LANG'][:5]
@@ -547,9 +219,3 @@ def getLangFromEnvironment():
         return lang
     else:
         return "en_US"
-
-def writelog(log):
-#    return
-    f = open("/tmp/debugryujinx.txt", "a")
-    f.write(log+"\n")
-    f.close()
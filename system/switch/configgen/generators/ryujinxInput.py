@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import uuid
+
+# pads with the nintendo face button layout (a/b and x/y swapped)
+NINTENDO_GUIDS = frozenset({
+    "050000007e0500000620000001800000",
+    "050000007e0500000720000001800000",
+    "050000007e0500000920000001800000",
+})
+# values of the pN_pad es option for ryujinx, anything else is played as a pro controller
+PAD_TYPES = ("ProController", "JoyconPair", "JoyconLeft", "JoyconRight")
+
+def _stick(joystick: str, stick_button: str, flipped: bool = False) -> dict:
+    return {"joystick": joystick, "rotate90_cw": flipped, "invert_stick_x": flipped,
+            "invert_stick_y": flipped, "stick_button": stick_button}
+
+def _left_joycon(pad_type: str) -> dict:
+    buttons = {"button_minus": "Back", "button_l": "LeftShoulder", "button_zl": "LeftTrigger"}
+    if pad_type == "JoyconLeft":
+        # sideways: sl/sr are the shoulders, the dpad the face buttons
+        buttons.update(button_sl="LeftShoulder", button_sr="RightShoulder",
+                       dpad_up="Y", dpad_down="A", dpad_left="X", dpad_right="B")
+    else:
+        buttons.update(button_sl="Unbound", button_sr="Unbound",
+                       dpad_up="DpadUp", dpad_down="DpadDown", dpad_left="DpadLeft", dpad_right="DpadRight")
+    return buttons
+
+def _right_joycon(pad_type: str, nintendo: bool) -> dict:
+    buttons = {"button_plus": "Start", "button_r": "RightShoulder", "button_zr": "RightTrigger"}
+    if pad_type == "JoyconRight":
+        buttons.update(button_sl="LeftShoulder", button_sr="RightShoulder")
+        face = ("A", "Y", "X", "B") if nintendo else ("B", "X", "Y", "A")
+    else:
+        buttons.update(button_sl="Unbound", button_sr="Unbound")
+        face = ("X", "B", "Y", "A") if nintendo else ("Y", "A", "X", "B")
+    buttons.update(zip(("button_x", "button_b", "button_y", "button_a"), face))
+    return buttons
+
+def _template(pad_type: str, nintendo: bool) -> dict:
+    if pad_type == "JoyconLeft":
+        sticks = _stick("Left", "LeftStick"), _stick("Unbound", "Unbound")
+    elif pad_type == "JoyconRight":
+        sticks = _stick("Unbound", "Unbound", flipped=True), _stick("Left", "LeftStick")
+    else:
+        sticks = _stick("Left", "LeftStick"), _stick("Right", "RightStick")
+    return {
+        "controller_type": pad_type,
+        "left_joycon_stick": sticks[0],
+        "right_joycon_stick": sticks[1],
+        "deadzone_left": 0.1,
+        "deadzone_right": 0.1,
+        "range_left": 1,
+        "range_right": 1,
+        "trigger_threshold": 0.5,
+        "motion": {"motion_backend": "GamepadDriver", "sensitivity": 100, "gyro_deadzone": 1, "enable_motion": True},
+        "rumble": {"strong_rumble": 1, "weak_rumble": 1, "enable_rumble": True},
+        "led": {"enable_led": False, "turn_off_led": False, "use_rainbow": False, "led_color": 0},
+        "left_joycon": _left_joycon(pad_type),
+        "right_joycon": _right_joycon(pad_type, nintendo),
+        "version": 1,
+        "backend": "GamepadSDL2",
+    }
+
+# (pad type, nintendo layout) -> input_config entry without the player part. The
+# entries share the nested dicts of their template: they are only serialized.
+INPUT_TEMPLATES = {(pad_type, nintendo): _template(pad_type, nintendo) for pad_type in PAD_TYPES for nintendo in (False, True)}
+
+def player_pad_type(system, player_number) -> str:
+    which_pad = f"p{int(player_number)}_pad"
+    if system.isOptSet(which_pad) and system.config[which_pad] in PAD_TYPES:
+        return system.config[which_pad]
+    #unset, or old settings that don't match the ryujinx values
+    return "ProController"
+
+def input_entry(pad_type: str, guid: str, port: int, player_number) -> dict:
+    """input_config entry of one player: its template + the sdl id (port-uuid) and the player index."""
+    convuuid = uuid.UUID(bytes=uuid.UUID(guid).bytes_le)
+    return {**INPUT_TEMPLATES[(pad_type, guid in NINTENDO_GUIDS)],
+            "id": f"{port}-{convuuid}", "player_index": f"Player{int(player_number)}"}
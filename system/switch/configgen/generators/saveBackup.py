@@ -0,0 +1,335 @@
+from __future__ import annotations
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import stat
+import sys
+import time
+import zlib
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Iterator
+
+from generators.configWriter import atomic_write
+
+eslog = logging.getLogger(__name__)
+
+# save trees the generators redirect the emulator nand saves to (see switchLayout)
+SAVE_TREES = {
+    "eden_citron": Path("/userdata/saves/switch/eden_citron/save"),
+    "ryujinx": Path("/userdata/saves/switch/ryujinx/save"),
+}
+# chunks/<sha256[:2]>/<sha256> (zlib) shared by every tree, snapshots/<tree>/<id>.json
+BACKUP_DIR = Path("/userdata/saves/switch/.backup")
+
+# content defined chunking (gear rolling hash): a change in a save file only
+# changes the chunks around it, the others keep their boundaries and their hash
+CHUNK_MIN = 2 << 10
+CHUNK_MAX = 64 << 10
+CHUNK_AVG_BITS = 13   # 8 KiB on average
+# boundary on the high bits, the ones that depend on the whole 32 byte window
+CHUNK_MASK = ((1 << CHUNK_AVG_BITS) - 1) << (32 - CHUNK_AVG_BITS)
+# fixed table: boundaries have to be the same from one run to the next
+GEAR = tuple(int.from_bytes(hashlib.sha256(bytes([i])).digest()[:4], "little") for i in range(256))
+
+class BackupError(Exception):
+    pass
+
+@dataclass(frozen=True)
+class Retention:
+    last: int = 10     # most recent snapshots
+    daily: int = 14    # newest snapshot of each of the last N days with one
+    weekly: int = 8    # newest snapshot of each of the last N weeks with one
+
+###CHUNK STORE##########################################################################################################
+def chunk_boundaries(data: bytes) -> Iterator[tuple[int, int]]:
+    size = len(data)
+    start = 0
+    gear, mask = GEAR, CHUNK_MASK
+    while start < size:
+        end = min(start + CHUNK_MAX, size)
+        # nothing before CHUNK_MIN can be a boundary: the hash starts there
+        h = 0
+        for i in range(start + CHUNK_MIN, end):
+            h = ((h << 1) + gear[data[i]]) & 0xFFFFFFFF
+            if not h & mask:
+                end = i + 1
+                break
+        yield start, end
+        start = end
+
+def fixed_boundaries(data: bytes) -> Iterator[tuple[int, int]]:
+    # first snapshot of a tree: no chunk to share yet, hashing + compressing is all it costs
+    for start in range(0, len(data), CHUNK_MAX):
+        yield start, min(start + CHUNK_MAX, len(data))
+
+class ChunkStore:
+    def __init__(self, root: Path = BACKUP_DIR):
+        self.root = Path(root)
+        self.chunks = self.root / "chunks"
+        self.snapshots = self.root / "snapshots"
+
+    def chunk_path(self, digest: str) -> Path:
+        return self.chunks / digest[:2] / digest
+
+    def put(self, data: bytes) -> tuple[str, bool]:
+        # returns the digest and whether the chunk was new
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.chunk_path(digest)
+        if path.exists():
+            return digest, False
+        atomic_write(path, zlib.compress(data, 3))
+        return digest, True
+
+    def get(self, digest: str) -> bytes:
+        try:
+            with open(self.chunk_path(digest), "rb") as f:
+                data = zlib.decompress(f.read())
+        except (OSError, zlib.error) as e:
+            raise BackupError(f"chunk {digest}: {e}")
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise BackupError(f"chunk {digest}: corrupted")
+        return data
+
+    def snapshot_ids(self, tree: str) -> list[str]:
+        # ids sort by time
+        directory = self.snapshots / tree
+        if not directory.is_dir():
+            return []
+        return sorted(entry.name[:-5] for entry in os.scandir(directory) if entry.name.endswith(".json"))
+
+    def load(self, tree: str, snapshot_id: str) -> dict:
+        try:
+            with open(self.snapshots / tree / f"{snapshot_id}.json") as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            raise BackupError(f"snapshot {tree}/{snapshot_id}: {e}")
+
+    def save(self, tree: str, snapshot: dict) -> str:
+        now = snapshot["time"]
+        snapshot_id = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(now))}.{int(now * 1000) % 1000:03d}-{snapshot['tag']}"
+        atomic_write(self.snapshots / tree / f"{snapshot_id}.json", json.dumps(snapshot, separators=(",", ":")).encode())
+        return snapshot_id
+
+###SNAPSHOTS############################################################################################################
+def _walk(root: Path) -> Iterator[tuple[str, os.stat_result]]:
+    for directory, dirs, names in os.walk(root):
+        dirs.sort()
+        for name in sorted(names):
+            path = os.path.join(directory, name)
+            st = os.lstat(path)
+            if stat.S_ISREG(st.st_mode):
+                yield os.path.relpath(path, root), st
+
+def snapshot(tree: str, tag: str = "manual", store: ChunkStore | None = None, root: Path | None = None) -> str | None:
+    """Snapshots a save tree, returns the snapshot id (None when nothing changed since the last one).
+
+    A file with the size/mtime of the previous snapshot costs a stat; a
+    changed one is chunked and only the chunks not in the store are written.
+    The first snapshot of a tree uses fixed size chunks, the rolling hash
+    (pure python, a few MB/s) is only worth it for the files that change.
+    """
+    store = store if store is not None else ChunkStore()
+    root = root if root is not None else SAVE_TREES[tree]
+    ids = store.snapshot_ids(tree)
+    previous = store.load(tree, ids[-1])["files"] if ids else {}
+    boundaries = chunk_boundaries if ids else fixed_boundaries
+
+    start = time.perf_counter()
+    files, changed, new_chunks, new_bytes = {}, 0, 0, 0
+    for name, st in _walk(root):
+        known = previous.get(name)
+        if known is not None and known[0] == st.st_size and known[1] == st.st_mtime_ns:
+            files[name] = [st.st_size, st.st_mtime_ns, st.st_mode & 0o7777, known[3]]
+            continue
+        with open(root / name, "rb") as f:
+            data = f.read()
+        chunks = []
+        for begin, end in boundaries(data):
+            digest, new = store.put(data[begin:end])
+            chunks.append(digest)
+            if new:
+                new_chunks += 1
+                new_bytes += end - begin
+        files[name] = [st.st_size, st.st_mtime_ns, st.st_mode & 0o7777, chunks]
+        changed += 1
+
+    if ids and files == previous:
+        eslog.debug(f"save backup {tree}: unchanged ({len(files)} file(s), {time.perf_counter() - start:.3f}s)")
+        return None
+    snapshot_id = store.save(tree, {"tree": tree, "root": str(root), "time": time.time(), "tag": tag, "files": files})
+    eslog.info(f"save backup {tree}: {snapshot_id}, {changed} changed file(s), {new_chunks} new chunk(s) "
+               f"({new_bytes >> 10} KiB) in {time.perf_counter() - start:.2f}s")
+    return snapshot_id
+
+def _snapshot_time(snapshot_id: str) -> time.struct_time:
+    return time.strptime(snapshot_id.split(".", 1)[0], "%Y%m%d-%H%M%S")
+
+def kept_snapshots(ids: list[str], retention: Retention) -> set[str]:
+    kept = set(ids[-retention.last:]) if retention.last > 0 else set()
+    for period, count in ((lambda t: time.strftime("%Y%m%d", t), retention.daily),
+                          (lambda t: time.strftime("%G%V", t), retention.weekly)):
+        seen = set()
+        for snapshot_id in reversed(ids):
+            key = period(_snapshot_time(snapshot_id))
+            if key in seen:
+                continue
+            if len(seen) >= count:
+                break
+            seen.add(key)
+            kept.add(snapshot_id)
+    return kept
+
+def prune(retention: Retention = Retention(), store: ChunkStore | None = None) -> tuple[int, int]:
+    """Drops the snapshots out of retention in every tree, then the chunks no snapshot uses.
+
+    Returns (snapshots removed, chunks removed).
+    """
+    store = store if store is not None else ChunkStore()
+    trees = [entry.name for entry in os.scandir(store.snapshots) if entry.is_dir()] if store.snapshots.is_dir() else []
+    removed = 0
+    for tree in trees:
+        ids = store.snapshot_ids(tree)
+        kept = kept_snapshots(ids, retention)
+        for snapshot_id in ids:
+            if snapshot_id not in kept:
+                (store.snapshots / tree / f"{snapshot_id}.json").unlink()
+                removed += 1
+    if not removed:
+        return 0, 0
+
+    used = set()
+    for tree in trees:
+        for snapshot_id in store.snapshot_ids(tree):
+            for entry in store.load(tree, snapshot_id)["files"].values():
+                used.update(entry[3])
+    chunks_removed = 0
+    for directory in store.chunks.iterdir() if store.chunks.is_dir() else []:
+        for chunk in directory.iterdir():
+            if chunk.name not in used:
+                chunk.unlink()
+                chunks_removed += 1
+    return removed, chunks_removed
+
+def restore(tree: str, snapshot_id: str, subpath: str | None = None, target: Path | None = None,
+            store: ChunkStore | None = None) -> int:
+    """Puts the files of a snapshot (all, or only under subpath) back, returns the number of files written.
+
+    Restoring into the tree itself first snapshots its current state, and
+    files under subpath that are not in the snapshot are removed.
+    """
+    store = store if store is not None else ChunkStore()
+    files = store.load(tree, snapshot_id)["files"]
+    in_place = target is None
+    target = Path(target) if target is not None else SAVE_TREES[tree]
+    prefix = subpath.strip("/") + "/" if subpath else ""
+    selected = {name: entry for name, entry in files.items() if name.startswith(prefix) or name == prefix.rstrip("/")}
+    if not selected:
+        raise BackupError(f"nothing under {subpath!r} in {tree}/{snapshot_id}")
+
+    if in_place:
+        snapshot(tree, "restore", store, target)
+    written = 0
+    for name, (size, mtime_ns, mode, chunks) in selected.items():
+        path = target / name
+        current = path.stat() if path.exists() else None
+        if current is not None and current.st_size == size and current.st_mtime_ns == mtime_ns:
+            continue
+        atomic_write(path, b"".join(store.get(digest) for digest in chunks), mode)
+        # same stat as in the snapshot: the next snapshot sees the file as unchanged
+        os.utime(path, ns=(mtime_ns, mtime_ns))
+        written += 1
+    if in_place:
+        scope = target / prefix if prefix else target
+        for name, _ in list(_walk(scope)) if scope.is_dir() else []:
+            if prefix + name not in selected:
+                (scope / name).unlink()
+    return written
+
+###LAUNCH HOOK##########################################################################################################
+def _after_launch(tree: str, retention: Retention) -> None:
+    try:
+        snapshot(tree, "post")
+        removed, chunks = prune(retention)
+        if removed:
+            eslog.info(f"save backup: pruned {removed} snapshot(s), {chunks} chunk(s)")
+    except (OSError, BackupError) as e:
+        eslog.error(f"save backup {tree} after the session failed: {e}")
+
+def backup_around_launch(tree: str, mode: str | None) -> None:
+    """switch_save_backup es option: snapshot before the session, and after it once the emulator exited.
+
+    The second snapshot runs when the launcher process exits (atexit), the
+    emulatorlauncher returns once the emulator is closed. The first snapshot
+    of a tree reads every save: it is the one after the session, not one on
+    the launch path.
+    """
+    if mode != "1":
+        return
+    if not ChunkStore().snapshot_ids(tree):
+        eslog.info(f"save backup {tree}: no snapshot yet, the first one is taken after the session")
+    else:
+        try:
+            snapshot(tree, "pre")
+        except (OSError, BackupError) as e:
+            eslog.error(f"save backup {tree} before the session failed: {e}")
+            return
+    atexit.register(_after_launch, tree, Retention())
+
+def main(argv: list[str]) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Snapshots of the switch save trees")
+    commands = parser.add_subparsers(dest="command", required=True)
+    snapshot_parser = commands.add_parser("snapshot")
+    snapshot_parser.add_argument("trees", nargs="*", default=list(SAVE_TREES), help=", ".join(SAVE_TREES))
+    list_parser = commands.add_parser("list")
+    list_parser.add_argument("trees", nargs="*", default=list(SAVE_TREES))
+    list_parser.add_argument("--files", action="store_true")
+    restore_parser = commands.add_parser("restore")
+    restore_parser.add_argument("tree", choices=list(SAVE_TREES))
+    restore_parser.add_argument("snapshot", help="snapshot id (see list), or 'last'")
+    restore_parser.add_argument("--path", help="only this file or directory of the tree (e.g. a save folder)")
+    restore_parser.add_argument("--to", help="restore there instead of over the tree")
+    prune_parser = commands.add_parser("prune")
+    prune_parser.add_argument("--last", type=int, default=Retention.last)
+    prune_parser.add_argument("--daily", type=int, default=Retention.daily)
+    prune_parser.add_argument("--weekly", type=int, default=Retention.weekly)
+    args = parser.parse_args(argv)
+    for tree in getattr(args, "trees", []):
+        if tree not in SAVE_TREES:
+            parser.error(f"unknown tree {tree}, one of {', '.join(SAVE_TREES)}")
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    store = ChunkStore()
+    try:
+        if args.command == "snapshot":
+            for tree in args.trees:
+                print(f"{tree}: {snapshot(tree, 'manual', store) or 'unchanged'}")
+        elif args.command == "list":
+            for tree in args.trees:
+                for snapshot_id in store.snapshot_ids(tree):
+                    files = store.load(tree, snapshot_id)["files"]
+                    print(f"{tree:<12} {snapshot_id:<30} {len(files):>5} file(s) {sum(f[0] for f in files.values()) / (1 << 20):>8.1f} MiB")
+                    if args.files:
+                        for name, entry in files.items():
+                            print(f"    {name} ({entry[0]} bytes)")
+        elif args.command == "restore":
+            ids = store.snapshot_ids(args.tree)
+            snapshot_id = ids[-1] if args.snapshot == "last" and ids else args.snapshot
+            written = restore(args.tree, snapshot_id, args.path, Path(args.to) if args.to else None, store)
+            print(f"{written} file(s) restored from {args.tree}/{snapshot_id}")
+        else:
+            removed, chunks = prune(Retention(args.last, args.daily, args.weekly), store)
+            print(f"{removed} snapshot(s), {chunks} chunk(s) removed")
+    except (BackupError, OSError) as e:
+        print(f"error: {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,247 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import struct
+import sys
+import tempfile
+
+from pathlib import Path
+
+from generators.configWriter import atomic_write
+from generators.switchPaths import SWITCH_CACHE
+from generators.titleProfiles import base_title_id, rom_title_id
+
+eslog = logging.getLogger(__name__)
+
+# eden / citron: nand/user/save -> save_user/0000000000000000/<user id>/<TITLE ID>/
+EDEN_SAVES = Path("/userdata/saves/switch/eden_citron/save/save_user/0000000000000000")
+# ryujinx: bis/user -> save_user/save/<save data id>/0/ (0 is the committed copy, 1 the working one)
+RYUJINX_SAVES = Path("/userdata/saves/switch/ryujinx/save/save_user/save")
+# ryujinx save data indexer: which save data id belongs to which title
+RYUJINX_INDEX = Path("/userdata/saves/switch/ryujinx/save/save_system/8000000000000000/0/imkvdb.arc")
+SAVE_SYNC_MANIFEST = SWITCH_CACHE / "save_sync.json"
+
+HEX16 = re.compile(r"[0-9a-fA-F]{16}")
+HEX32 = re.compile(r"[0-9a-fA-F]{32}")
+SAVE_TYPE_ACCOUNT = 1
+
+class SaveSyncError(Exception):
+    pass
+
+###SAVE DIRECTORIES#####################################################################################################
+def read_imkvdb(path: Path) -> dict[str, str]:
+    """Account saves of a ryujinx/libhac imkvdb.arc: title id -> save data id (both 16 hex)."""
+    data = path.read_bytes()
+    if data[:4] != b"IMKV":
+        raise SaveSyncError(f"{path}: not an imkvdb")
+    count, = struct.unpack_from("<I", data, 8)
+    offset = 0xC
+    saves = {}
+    for _ in range(count):
+        if data[offset:offset + 4] != b"IMEN":
+            raise SaveSyncError(f"{path}: bad entry at {offset:#x}")
+        key_size, value_size = struct.unpack_from("<II", data, offset + 4)
+        key = data[offset + 0xC:offset + 0xC + key_size]
+        value = data[offset + 0xC + key_size:offset + 0xC + key_size + value_size]
+        offset += 0xC + key_size + value_size
+        # SaveDataAttribute: program id @0, type @0x20 / SaveDataIndexerValue: save data id @0
+        if len(key) < 0x21 or len(value) < 8 or key[0x20] != SAVE_TYPE_ACCOUNT:
+            continue
+        program_id, = struct.unpack_from("<Q", key, 0)
+        save_id, = struct.unpack_from("<Q", value, 0)
+        saves.setdefault(f"{program_id:016x}", f"{save_id:016x}")
+    return saves
+
+def eden_save_dirs(saves: Path = EDEN_SAVES) -> dict[str, Path]:
+    dirs: dict[str, Path] = {}
+    try:
+        users = sorted(entry.name for entry in os.scandir(saves) if entry.is_dir() and HEX32.fullmatch(entry.name))
+    except OSError:
+        return dirs
+    for user in users:
+        for entry in os.scandir(saves / user):
+            if entry.is_dir() and HEX16.fullmatch(entry.name):
+                # several profiles: the first one is synced
+                dirs.setdefault(entry.name.lower(), Path(entry.path))
+    return dirs
+
+def eden_new_save_dir(title_id: str, saves: Path = EDEN_SAVES) -> Path | None:
+    # only when there is a single profile, no guess about which one plays
+    try:
+        users = [entry.name for entry in os.scandir(saves) if entry.is_dir() and HEX32.fullmatch(entry.name)]
+    except OSError:
+        return None
+    return saves / users[0] / title_id.upper() if len(users) == 1 else None
+
+###FINGERPRINTS#########################################################################################################
+def _files(path: Path) -> dict[str, os.stat_result]:
+    files = {}
+    for directory, _, names in os.walk(path):
+        for name in names:
+            file = os.path.join(directory, name)
+            files[os.path.relpath(file, path)] = os.stat(file)
+    return files
+
+def stat_fingerprint(path: Path) -> list:
+    # the hot path: a stat per file, compared with the manifest
+    return sorted([name, st.st_size, st.st_mtime_ns] for name, st in _files(path).items())
+
+def content_hash(path: Path) -> str:
+    digest = hashlib.sha256()
+    for name in sorted(_files(path)):
+        digest.update(name.encode() + b"\0")
+        with open(path / name, "rb") as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+def newest_mtime(fingerprint: list) -> int:
+    return max((mtime for _, _, mtime in fingerprint), default=0)
+
+def mirror(src: Path, dst: Path) -> int:
+    """Makes dst a copy of src, writing only the files that differ. Returns the number of files written."""
+    src_files, dst_files = _files(src), _files(dst) if dst.is_dir() else {}
+    written = 0
+    for name, st in src_files.items():
+        target = dst / name
+        if name in dst_files and dst_files[name].st_size == st.st_size:
+            with open(src / name, "rb") as a, open(target, "rb") as b:
+                if a.read() == b.read():
+                    continue
+        target.parent.mkdir(parents=True, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=target.parent, prefix="." + target.name + ".")
+        os.close(fd)
+        try:
+            shutil.copy2(src / name, tmp)
+            os.replace(tmp, target)
+        except BaseException:
+            if os.path.lexists(tmp):
+                os.unlink(tmp)
+            raise
+        written += 1
+    for name in set(dst_files) - set(src_files):
+        (dst / name).unlink()
+    return written
+
+###SYNC#################################################################################################################
+class SaveSync:
+    def __init__(self, manifest_file: Path = SAVE_SYNC_MANIFEST, eden_saves: Path = EDEN_SAVES,
+                 ryujinx_saves: Path = RYUJINX_SAVES, ryujinx_index: Path = RYUJINX_INDEX):
+        self.manifest_file = manifest_file
+        self.eden_saves = eden_saves
+        self.ryujinx_saves = ryujinx_saves
+        self.ryujinx_index = ryujinx_index
+        try:
+            with open(manifest_file) as f:
+                self.manifest = json.load(f)
+        except (OSError, ValueError):
+            self.manifest = {}
+        self.dirty = False
+
+    def ryujinx_save_dirs(self) -> dict[str, Path]:
+        # the indexer is only parsed again when it changed
+        try:
+            st = self.ryujinx_index.stat()
+        except OSError:
+            return {}
+        key = [st.st_size, st.st_mtime_ns]
+        cached = self.manifest.get("ryujinx_index", {})
+        if cached.get("key") != key:
+            try:
+                cached = {"key": key, "titles": read_imkvdb(self.ryujinx_index)}
+            except (OSError, SaveSyncError) as e:
+                eslog.warning(f"save sync: {e}")
+                return {}
+            self.manifest["ryujinx_index"] = cached
+            self.dirty = True
+        return {title_id: self.ryujinx_saves / save_id / "0" for title_id, save_id in cached["titles"].items()}
+
+    def sync_title(self, title_id: str, eden: Path | None, ryujinx: Path | None) -> str:
+        """Brings the older side of a title up to date, returns what was done."""
+        if ryujinx is None or not ryujinx.is_dir():
+            # a ryujinx save only exists once the game created it (indexer entry)
+            return "no ryujinx save"
+        if eden is None:
+            eden = eden_new_save_dir(title_id, self.eden_saves)
+            if eden is None:
+                return "no eden save"
+        titles = self.manifest.setdefault("titles", {})
+        known = titles.get(title_id, {})
+        eden_fp = stat_fingerprint(eden) if eden.is_dir() else []
+        ryujinx_fp = stat_fingerprint(ryujinx)
+        if known.get("eden") == eden_fp and known.get("ryujinx") == ryujinx_fp:
+            return "unchanged"
+
+        eden_hash = content_hash(eden) if eden_fp else None
+        ryujinx_hash = content_hash(ryujinx)
+        last = known.get("content")
+        if eden_hash == ryujinx_hash:
+            result = "in sync"
+        else:
+            eden_changed = eden_hash is not None and eden_hash != last
+            ryujinx_changed = ryujinx_hash != last
+            if eden_changed and ryujinx_changed and last is not None:
+                eslog.warning(f"save sync {title_id}: both sides changed, keeping the newest")
+            # one side changed since the last sync: it wins; both or first sync: the newest files win
+            if eden_changed and (not ryujinx_changed or newest_mtime(eden_fp) > newest_mtime(ryujinx_fp)):
+                written = mirror(eden, ryujinx)
+                result = f"eden -> ryujinx ({written} file(s))"
+            else:
+                written = mirror(ryujinx, eden)
+                result = f"ryujinx -> eden ({written} file(s))"
+            eden_fp, ryujinx_fp = stat_fingerprint(eden), stat_fingerprint(ryujinx)
+            eden_hash = ryujinx_hash = content_hash(eden)
+        titles[title_id] = {"eden": eden_fp, "ryujinx": ryujinx_fp, "content": eden_hash}
+        self.dirty = True
+        return result
+
+    def sync(self, title_ids: list[str] | None = None) -> dict[str, str]:
+        eden_dirs = eden_save_dirs(self.eden_saves)
+        ryujinx_dirs = self.ryujinx_save_dirs()
+        if title_ids is None:
+            # a title needs a ryujinx save to be synced, see sync_title
+            title_ids = sorted(ryujinx_dirs)
+        results = {}
+        for title_id in title_ids:
+            try:
+                results[title_id] = self.sync_title(title_id, eden_dirs.get(title_id), ryujinx_dirs.get(title_id))
+            except OSError as e:
+                results[title_id] = f"failed: {e}"
+                eslog.error(f"save sync {title_id}: {e}")
+        return results
+
+    def save(self) -> None:
+        if not self.dirty:
+            return
+        try:
+            atomic_write(self.manifest_file, json.dumps(self.manifest, separators=(",", ":")).encode())
+        except OSError as e:
+            eslog.warning(f"unable to write {self.manifest_file}: {e}")
+        self.dirty = False
+
+def sync_saves(rom: str, mode: str | None) -> str | None:
+    """switch_save_sync es option: the save of the launched title, from whichever emulator played it last."""
+    if mode != "1" or rom == "config":
+        return None
+    title_id = rom_title_id(rom)
+    if title_id is None:
+        return None
+    title_id = base_title_id(title_id)
+    engine = SaveSync()
+    result = engine.sync([title_id])[title_id]
+    engine.save()
+    if result not in ("unchanged", "in sync", "no ryujinx save", "no eden save"):
+        eslog.info(f"save sync {title_id}: {result}")
+    return result
+
+if __name__ == "__main__":
+    # python -m generators.saveSync [title id...]
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    engine = SaveSync()
+    for title_id, result in engine.sync([base_title_id(t) for t in sys.argv[1:]] or None).items():
+        print(f"{title_id} {result}")
+    engine.save()
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import sys
+
+from pathlib import Path
+from typing import Callable
+
+from generators.configWriter import atomic_write
+from generators.switchPaths import SWITCH_CACHE
+
+eslog = logging.getLogger(__name__)
+
+# bump when the key or the stored format changes
+CACHE_VERSION = 1
+
+SDL_CONFIG_CACHE = SWITCH_CACHE / "sdl_controller_config.json"
+# pad sets kept on disk, the least recently generated ones go first
+MAX_ENTRIES = 32
+
+_memo: dict[str, str] = {}
+
+def controllers_key(controllers) -> str:
+    """guid, name and mapping (es inputs) of the connected pads, in player order."""
+    pads = [[c.guid, c.real_name, sorted([name, i.type, str(i.id), str(i.value), str(i.code)] for name, i in c.inputs.items())]
+            for c in controllers]
+    return hashlib.sha1(json.dumps(pads).encode()).hexdigest()
+
+def builder_stamp(builder: Callable) -> list:
+    # a batocera update changing the builder drops every cached config
+    source = getattr(getattr(builder, "__code__", None), "co_filename", None)
+    try:
+        st = os.stat(source)
+        return [CACHE_VERSION, source, st.st_size, st.st_mtime_ns]
+    except (OSError, TypeError):
+        return [CACHE_VERSION, source]
+
+def sdl_controller_config(controllers, builder: Callable, cache_file: Path = SDL_CONFIG_CACHE) -> str:
+    """SDL_GAMECONTROLLERCONFIG of controllers, builder(controllers) only when this pad set was never seen."""
+    key = controllers_key(controllers)
+    if key in _memo:
+        return _memo[key]
+
+    stamp = builder_stamp(builder)
+    try:
+        with open(cache_file) as f:
+            cached = json.load(f)
+    except (OSError, ValueError):
+        cached = {}
+    entries = cached.get("entries", {}) if cached.get("stamp") == stamp else {}
+
+    config = entries.get(key)
+    if config is None:
+        config = builder(controllers)
+        entries.pop(key, None)
+        entries[key] = config
+        while len(entries) > MAX_ENTRIES:
+            del entries[next(iter(entries))]
+        try:
+            atomic_write(Path(cache_file), json.dumps({"stamp": stamp, "entries": entries}).encode())
+        except OSError as e:
+            eslog.warning(f"unable to write {cache_file}: {e}")
+    _memo[key] = config
+    return config
+
+if __name__ == "__main__":
+    # python -m generators.sdlConfig [--invalidate]
+    if "--invalidate" in sys.argv[1:]:
+        try:
+            os.unlink(SDL_CONFIG_CACHE)
+            print("sdl controller config cache removed")
+        except FileNotFoundError:
+            print("no sdl controller config cache")
+        sys.exit(0)
+    try:
+        with open(SDL_CONFIG_CACHE) as f:
+            cache = json.load(f)
+        print(f"{len(cache.get('entries', {}))} pad set(s), builder {cache.get('stamp')}")
+    except (OSError, ValueError):
+        print("no sdl controller config cache")
@@ -0,0 +1,254 @@
+from __future__ import annotations
+
+import hashlib
+import io
+import json
+import logging
+import os
+import sys
+import tarfile
+import tempfile
+
+from pathlib import Path
+
+from generators.configWriter import atomic_write
+from generators.shaderCache import SHADER_ROOTS, TITLE_ID, shader_family, title_cache_dir
+from generators.switchPaths import SWITCH_APPIMAGES, SWITCH_CACHE
+
+eslog = logging.getLogger(__name__)
+
+# a bundle is a plain tar: objects/<sha256> (every distinct file once, whatever
+# the number of titles using it) followed by manifest.json
+BUNDLE_FORMAT = 1
+MANIFEST = "manifest.json"
+IDENTITY_CACHE = SWITCH_CACHE / "appimage_identity.json"
+
+class BundleError(Exception):
+    pass
+
+def _sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def appimage_identity(emulator: str, appimages: Path = SWITCH_APPIMAGES, cache_file: Path = IDENTITY_CACHE) -> dict[str, str]:
+    """Emulator name + build of the installed AppImage (sha256, cached on size/mtime)."""
+    appimage = appimages / f"{emulator}.AppImage"
+    st = appimage.stat()
+    key = [str(appimage), st.st_size, st.st_mtime_ns]
+    try:
+        with open(cache_file) as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        cache = {}
+    cached = cache.get(emulator) or {}
+    if cached.get("key") == key:
+        return {"name": emulator, "build": cached["build"]}
+    build = _sha256(appimage)
+    cache[emulator] = {"key": key, "build": build}
+    try:
+        atomic_write(cache_file, json.dumps(cache).encode())
+    except OSError as e:
+        eslog.warning(f"unable to write {cache_file}: {e}")
+    return {"name": emulator, "build": build}
+
+def title_files(path: Path) -> dict[str, Path]:
+    # relative path -> file, for one title cache
+    files = {}
+    for directory, _, names in os.walk(path):
+        for name in names:
+            file = Path(directory) / name
+            files[file.relative_to(path).as_posix()] = file
+    return files
+
+###PACK#################################################################################################################
+def pack(emulator: str, bundle: Path, title_ids: list[str] | None = None, roots: dict[str, Path] = SHADER_ROOTS,
+         appimages: Path = SWITCH_APPIMAGES) -> dict:
+    """Writes the shader caches of emulator (all titles or title_ids) to bundle, returns the manifest."""
+    family = shader_family(emulator)
+    root = roots[family]
+    if title_ids is None:
+        title_ids = sorted(entry.name for entry in os.scandir(root) if entry.is_dir() and TITLE_ID.fullmatch(entry.name)) if root.is_dir() else []
+    manifest = {"format": BUNDLE_FORMAT, "family": family, "emulator": appimage_identity(emulator, appimages), "titles": {}, "objects": {}}
+
+    tmp = bundle.with_name(bundle.name + ".part")
+    try:
+        with tarfile.open(tmp, "w", format=tarfile.PAX_FORMAT) as tar:
+            for title_id in title_ids:
+                files = title_files(title_cache_dir(family, root, title_id.lower()))
+                if not files:
+                    continue
+                entries = manifest["titles"][title_id.lower()] = {}
+                for name, file in sorted(files.items()):
+                    sha = _sha256(file)
+                    entries[name] = sha
+                    if sha not in manifest["objects"]:
+                        manifest["objects"][sha] = file.stat().st_size
+                        tar.add(file, arcname=f"objects/{sha}", recursive=False)
+            data = json.dumps(manifest, indent=1).encode()
+            info = tarfile.TarInfo(MANIFEST)
+            info.size = len(data)
+            tar.addfile(info, io.BytesIO(data))
+        os.replace(tmp, bundle)
+    finally:
+        if tmp.exists():
+            tmp.unlink()
+    return manifest
+
+###UNPACK###############################################################################################################
+def read_manifest(tar: tarfile.TarFile) -> dict:
+    try:
+        manifest = json.load(tar.extractfile(MANIFEST))
+    except (KeyError, ValueError) as e:
+        raise BundleError(f"not a shader bundle: {e}")
+    if not isinstance(manifest, dict) or manifest.get("format") != BUNDLE_FORMAT:
+        raise BundleError(f"unsupported bundle format {manifest.get('format') if isinstance(manifest, dict) else None}")
+    # everything unpack and info index, checked before anything is read or written
+    emulator, titles, objects = manifest.get("emulator"), manifest.get("titles"), manifest.get("objects")
+    if not isinstance(emulator, dict) or not {"name", "build"} <= emulator.keys():
+        raise BundleError("invalid manifest: no emulator name / build")
+    if not isinstance(titles, dict) or not isinstance(objects, dict):
+        raise BundleError("invalid manifest: no titles / objects")
+    for title_id, entries in titles.items():
+        if not TITLE_ID.fullmatch(title_id) or not isinstance(entries, dict):
+            raise BundleError(f"invalid entry for {title_id}")
+        for name, sha in entries.items():
+            if Path(name).is_absolute() or ".." in Path(name).parts:
+                raise BundleError(f"invalid entry for {title_id}: {name}")
+            if not isinstance(objects.get(sha), int):
+                raise BundleError(f"{title_id}/{name}: object {sha} missing from the manifest")
+    return manifest
+
+def check_identity(manifest: dict, appimages: Path = SWITCH_APPIMAGES) -> None:
+    # caches of another build are thrown away by the emulator: refuse them before touching anything
+    bundled = manifest["emulator"]
+    try:
+        installed = appimage_identity(bundled["name"], appimages)
+    except OSError as e:
+        raise BundleError(f"{bundled['name']} is not installed: {e}")
+    if installed["build"] != bundled["build"]:
+        raise BundleError(f"bundle built with another {bundled['name']} build "
+                          f"({bundled['build'][:12]}, installed {installed['build'][:12]})")
+
+def _title_size(files: dict[str, Path]) -> int:
+    return sum(file.stat().st_size for file in files.values())
+
+def _extract_object(tar: tarfile.TarFile, sha: str, file: Path) -> str | None:
+    # objects/<sha> to a temp file next to file, hashed while copied: None (and no file) when it does not match its name
+    fd, tmp = tempfile.mkstemp(dir=file.parent, prefix="." + file.name + ".")
+    digest = hashlib.sha256()
+    try:
+        source = tar.extractfile(f"objects/{sha}")
+        with os.fdopen(fd, "wb") as out:
+            while chunk := source.read(1 << 20):
+                digest.update(chunk)
+                out.write(chunk)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+    if digest.hexdigest() != sha:
+        os.unlink(tmp)
+        return None
+    return tmp
+
+def unpack(bundle: Path, roots: dict[str, Path] = SHADER_ROOTS, appimages: Path = SWITCH_APPIMAGES, force: bool = False) -> dict[str, str]:
+    """Merges the bundle into the local shader caches, returns title id -> what was done.
+
+    A title is taken from the bundle when it has no local cache or when the
+    bundled one is bigger (more shaders); a title's files go together, toc
+    and data have to match. Files already identical on disk are not written.
+    Objects are hashed while extracted: a title with one that does not match
+    its sha256 is skipped, its local cache left as it was.
+    """
+    with tarfile.open(bundle, "r") as tar:
+        manifest = read_manifest(tar)
+        if not force:
+            check_identity(manifest, appimages)
+        family = manifest.get("family")
+        if family not in roots:
+            raise BundleError(f"unknown shader cache family {family!r}")
+        stored = set(tar.getnames())
+        missing = [sha for entries in manifest["titles"].values() for sha in entries.values() if f"objects/{sha}" not in stored]
+        if missing:
+            raise BundleError(f"{len(missing)} object(s) missing from the bundle ({missing[0]}...)")
+        root = roots[family]
+        results = {}
+        for title_id, entries in manifest["titles"].items():
+            target = title_cache_dir(family, root, title_id)
+            local = title_files(target)
+            bundled_size = sum(manifest["objects"][sha] for sha in entries.values())
+            if local and _title_size(local) >= bundled_size:
+                results[title_id] = "kept (local cache as big)"
+                continue
+            # every file of the title is extracted and checked before the first one replaces the local cache
+            staged, corrupted = [], None
+            try:
+                for name, sha in entries.items():
+                    file = target / name
+                    if name in local and local[name].stat().st_size == manifest["objects"][sha] and _sha256(local[name]) == sha:
+                        continue
+                    file.parent.mkdir(parents=True, exist_ok=True)
+                    tmp = _extract_object(tar, sha, file)
+                    if tmp is None:
+                        corrupted = sha
+                        break
+                    staged.append((tmp, file))
+                written = len(staged)
+                if corrupted is None:
+                    for tmp, file in staged:
+                        os.replace(tmp, file)
+                    staged = []
+            finally:
+                for tmp, _ in staged:
+                    if os.path.lexists(tmp):
+                        os.unlink(tmp)
+            if corrupted is not None:
+                eslog.error(f"{bundle}: object {corrupted} does not match its sha256, {title_id} not imported")
+                results[title_id] = f"skipped (object {corrupted[:12]} corrupted)"
+                continue
+            # leftovers of the replaced cache would not match the new toc
+            for name in set(local) - set(entries):
+                local[name].unlink()
+            results[title_id] = f"{'merged' if local else 'added'} ({written} file(s) written)"
+    return results
+
+def main(argv: list[str]) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export / import shader cache bundles")
+    commands = parser.add_subparsers(dest="command", required=True)
+    pack_parser = commands.add_parser("pack", help="write the shader caches of an emulator to a bundle")
+    pack_parser.add_argument("emulator", help="eden-emu, eden-pgo, citron-emu or ryujinx-emu")
+    pack_parser.add_argument("bundle")
+    pack_parser.add_argument("titles", nargs="*", help="title ids, default all")
+    unpack_parser = commands.add_parser("unpack", help="merge a bundle into the local shader caches")
+    unpack_parser.add_argument("bundle")
+    unpack_parser.add_argument("--force", action="store_true", help="skip the emulator build check")
+    info_parser = commands.add_parser("info", help="show what a bundle holds")
+    info_parser.add_argument("bundle")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.command == "pack":
+            manifest = pack(args.emulator, Path(args.bundle), args.titles or None)
+            print(f"{len(manifest['titles'])} title(s), {len(manifest['objects'])} object(s), "
+                  f"{sum(manifest['objects'].values()) / (1 << 20):.1f} MiB")
+        elif args.command == "unpack":
+            for title_id, result in unpack(Path(args.bundle), force=args.force).items():
+                print(f"{title_id} {result}")
+        else:
+            with tarfile.open(args.bundle, "r") as tar:
+                manifest = read_manifest(tar)
+            emulator = manifest["emulator"]
+            print(f"{emulator['name']} build {emulator['build'][:12]}, {len(manifest['objects'])} object(s)")
+            for title_id, entries in manifest["titles"].items():
+                print(f"  {title_id} {len(entries)} file(s) {sum(manifest['objects'][s] for s in entries.values()) / (1 << 20):.1f} MiB")
+    except (BundleError, OSError, tarfile.TarError) as e:
+        print(f"error: {e}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
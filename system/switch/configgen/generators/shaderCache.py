@@ -0,0 +1,279 @@
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+
+from dataclasses import dataclass
+from pathlib import Path
+
+from generators.configWriter import atomic_write
+from generators.switchPaths import SWITCH_CACHE
+from generators.titleProfiles import base_title_id, rom_title_id
+
+eslog = logging.getLogger(__name__)
+
+# emulator family -> directory holding one shader/pipeline cache per title
+SHADER_ROOTS = {
+    # eden / citron (data dir linked to configs/yuzu): shader/<title id>/vulkan.bin, vulkan_pipelines.bin, opengl*.bin
+    "eden": Path("/userdata/system/configs/yuzu/shader"),
+    # ryujinx: games/<title id>/cache/shader/ (guest/shared toc+data, host caches)
+    "ryujinx": Path("/userdata/system/configs/Ryujinx/games"),
+}
+SHADER_CACHE_STATE = SWITCH_CACHE / "shader_cache.json"
+SHADER_WARMUP_STATE = SWITCH_CACHE / "shader_warmup.json"
+
+TITLE_ID = re.compile(r"[0-9a-f]{16}")
+GIB = 1 << 30
+# fadvise range per call, the time budget is checked between two of them
+WARMUP_CHUNK = 16 << 20
+
+@dataclass(frozen=True)
+class ShaderCache:
+    family: str
+    title_id: str
+    path: Path
+    size: int          # bytes on disk
+    last_used: float   # last launch from configgen or last write by the emulator
+
+def shader_family(emulator: str) -> str:
+    return "ryujinx" if emulator == "ryujinx-emu" else "eden"
+
+def title_cache_dir(family: str, root: Path, title_id: str) -> Path:
+    if family == "ryujinx":
+        # the rest of games/<title id> (cpu cache, mod cache) is left alone
+        return root / title_id / "cache" / "shader"
+    return root / title_id
+
+def parse_budget(value: str | None) -> int | None:
+    # es option in GiB, unset / 0 / garbage: no eviction
+    try:
+        budget = float(value) if value is not None else 0
+    except ValueError:
+        eslog.warning(f"shader cache: invalid budget {value!r}")
+        return None
+    return int(budget * GIB) if budget > 0 else None
+
+def _usage(path: Path) -> tuple[int, float]:
+    # bytes on disk and newest mtime under path, symlinks are not followed
+    size, newest = 0, 0.0
+    stack = [path]
+    while stack:
+        try:
+            with os.scandir(stack.pop()) as it:
+                for entry in it:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        st = entry.stat(follow_symlinks=False)
+                        size += st.st_blocks * 512
+                        newest = max(newest, st.st_mtime)
+        except OSError:
+            pass
+    return size, newest
+
+def load_state(state_file: Path = SHADER_CACHE_STATE) -> dict[str, dict[str, float]]:
+    try:
+        with open(state_file) as f:
+            state = json.load(f)
+        return state if isinstance(state, dict) else {}
+    except (OSError, ValueError):
+        return {}
+
+def save_state(state: dict[str, dict[str, float]], state_file: Path = SHADER_CACHE_STATE) -> None:
+    try:
+        atomic_write(state_file, json.dumps(state, sort_keys=True).encode())
+    except OSError as e:
+        eslog.warning(f"unable to write {state_file}: {e}")
+
+def scan(roots: dict[str, Path] = SHADER_ROOTS, state: dict[str, dict[str, float]] | None = None) -> list[ShaderCache]:
+    """Every per-title shader cache found under roots, with its size and last use."""
+    state = state if state is not None else {}
+    caches = []
+    for family, root in roots.items():
+        try:
+            titles = [entry.name for entry in os.scandir(root) if entry.is_dir() and TITLE_ID.fullmatch(entry.name)]
+        except OSError:
+            continue
+        used = state.get(family, {})
+        for title_id in sorted(titles):
+            path = title_cache_dir(family, root, title_id)
+            if not path.is_dir():
+                continue
+            size, newest = _usage(path)
+            caches.append(ShaderCache(family, title_id, path, size, max(newest, used.get(title_id, 0.0))))
+    return caches
+
+def evict(caches: list[ShaderCache], budget: int, keep: set[str], dry_run: bool = False) -> list[ShaderCache]:
+    """Removes the least recently played caches until the total fits in budget.
+
+    Titles in keep (the one being launched) are never removed, even if the
+    budget cannot be met without them. Returns the caches removed.
+    """
+    total = sum(cache.size for cache in caches)
+    evicted = []
+    for cache in sorted(caches, key=lambda cache: cache.last_used):
+        if total <= budget:
+            break
+        if cache.title_id in keep:
+            continue
+        if not dry_run:
+            try:
+                shutil.rmtree(cache.path)
+            except OSError as e:
+                eslog.warning(f"shader cache: unable to remove {cache.path}: {e}")
+                continue
+        total -= cache.size
+        evicted.append(cache)
+    return evicted
+
+def _launched_title(rom: str) -> str | None:
+    # the caches are per base game: a container whose cnmt / ticket gives the update id uses the base one
+    title_id = rom_title_id(rom) if rom != "config" else None
+    return base_title_id(title_id) if title_id is not None else None
+
+def manage_shader_cache(emulator: str, rom: str, budget_value: str | None,
+                        roots: dict[str, Path] = SHADER_ROOTS, state_file: Path = SHADER_CACHE_STATE) -> list[ShaderCache]:
+    """Records the launch of rom and trims the shader caches to the switch_shader_cache_budget es option.
+
+    Returns the caches evicted.
+    """
+    family = shader_family(emulator)
+    title_id = _launched_title(rom)
+    budget = parse_budget(budget_value)
+    if title_id is None and budget is None:
+        return []
+
+    state = load_state(state_file)
+    if title_id is not None:
+        state.setdefault(family, {})[title_id] = time.time()
+    evicted = []
+    if budget is not None:
+        evicted = evict(scan(roots, state), budget, {title_id} if title_id else set())
+        for cache in evicted:
+            state.get(cache.family, {}).pop(cache.title_id, None)
+        if evicted:
+            eslog.info(f"shader cache: evicted {len(evicted)} title(s), {sum(c.size for c in evicted) / GIB:.2f} GiB: "
+                       + ", ".join(f"{c.family}/{c.title_id}" for c in evicted))
+    save_state(state, state_file)
+    return evicted
+
+###WARM-UP##############################################################################################################
+def _warm(files: list[Path], deadline: float, chunk: int) -> tuple[int, int, bool]:
+    # WILLNEED queues the readahead and returns, the page cache fills while the appimage mounts
+    warmed, done = 0, 0
+    for path in files:
+        try:
+            fd = os.open(path, os.O_RDONLY)
+        except OSError:
+            continue
+        try:
+            size = os.fstat(fd).st_size
+            for offset in range(0, size, chunk):
+                if time.monotonic() >= deadline:
+                    return warmed, done, False
+                length = min(chunk, size - offset)
+                os.posix_fadvise(fd, offset, length, os.POSIX_FADV_WILLNEED)
+                warmed += length
+            done += 1
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+    return warmed, done, True
+
+def _cache_files(path: Path) -> list[Path]:
+    files = []
+    for directory, _, names in os.walk(path):
+        for name in names:
+            try:
+                files.append((os.stat(os.path.join(directory, name)).st_size, Path(directory) / name))
+            except OSError:
+                pass
+    # small files first: the toc / pipeline files are read before the big blobs
+    return [path for _, path in sorted(files)]
+
+def _warmup_run(family: str, title_id: str, path: Path, seconds: float, state_file: Path, chunk: int) -> None:
+    start = time.monotonic()
+    files = _cache_files(path)
+    warmed, done, complete = _warm(files, start + seconds, chunk)
+    elapsed = time.monotonic() - start
+    eslog.debug(f"shader warm-up {family}/{title_id}: {warmed >> 20} MiB, {done}/{len(files)} file(s) in {elapsed:.2f}s")
+    # kept per title for tuning the budget: how much got queued and whether it ran out of time
+    state = load_state(state_file)
+    state.setdefault(family, {})[title_id] = {"bytes": warmed, "files": done, "total_files": len(files),
+                                              "seconds": round(elapsed, 3), "complete": complete, "time": time.time()}
+    save_state(state, state_file)
+
+def warm_shader_cache(emulator: str, rom: str, seconds_value: str | None, roots: dict[str, Path] = SHADER_ROOTS,
+                      state_file: Path = SHADER_WARMUP_STATE, chunk: int = WARMUP_CHUNK) -> threading.Thread | None:
+    """Prefetches the shader cache of the launched title into the page cache, switch_shader_warmup es option.
+
+    Runs in a daemon thread and gives up after seconds_value seconds: the
+    generator never waits for it. Returns the thread (None when off or there
+    is no cache for the title yet).
+    """
+    try:
+        seconds = float(seconds_value) if seconds_value is not None else 0
+    except ValueError:
+        seconds = 0
+    title_id = _launched_title(rom) if seconds > 0 else None
+    if title_id is None:
+        return None
+    family = shader_family(emulator)
+    path = title_cache_dir(family, roots[family], title_id)
+    if not path.is_dir():
+        return None
+    thread = threading.Thread(target=_warmup_run, args=(family, title_id, path, seconds, state_file, chunk),
+                              name="shader-warmup", daemon=True)
+    thread.start()
+    return thread
+
+###REPORT###############################################################################################################
+def _names() -> dict[str, str]:
+    # title names from the rom index when there is one, the report works without
+    try:
+        import sqlite3
+        from generators.romIndex import LIBRARY_DB
+        if not LIBRARY_DB.exists():
+            return {}
+        with sqlite3.connect(f"file:{LIBRARY_DB}?mode=ro", uri=True) as db:
+            return {tid: name for tid, name in db.execute("SELECT title_id, name FROM roms WHERE type = 'base' AND name IS NOT NULL")}
+    except Exception:
+        return {}
+
+def main(argv: list[str]) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Report (and trim) the per-title shader caches")
+    parser.add_argument("--budget", help="budget in GiB, shows what would be evicted")
+    parser.add_argument("--evict", action="store_true", help="remove the caches over --budget")
+    parser.add_argument("--keep", action="append", default=[], help="title id never evicted")
+    args = parser.parse_args(argv)
+
+    state = load_state()
+    caches = scan(state=state)
+    names = _names()
+    total = sum(cache.size for cache in caches)
+    budget = parse_budget(args.budget)
+    evicted = evict(caches, budget, {tid.lower() for tid in args.keep}, dry_run=not args.evict) if budget is not None else []
+
+    for cache in sorted(caches, key=lambda cache: cache.last_used, reverse=True):
+        used = time.strftime("%Y-%m-%d %H:%M", time.localtime(cache.last_used)) if cache.last_used else "-"
+        mark = "  [evicted]" if cache in evicted and args.evict else "  [over budget]" if cache in evicted else ""
+        print(f"{cache.family:<8} {cache.title_id} {cache.size / (1 << 20):>9.1f} MiB  {used:<16}  {names.get(cache.title_id, '-')}{mark}")
+    print(f"{len(caches)} cache(s), {total / GIB:.2f} GiB" + (f", budget {budget / GIB:.2f} GiB" if budget is not None else ""))
+
+    if args.evict and evicted:
+        for cache in evicted:
+            state.get(cache.family, {}).pop(cache.title_id, None)
+        save_state(state)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,322 @@
+from __future__ import annotations
+
+import mmap
+import os
+import re
+import struct
+import xml.etree.ElementTree as ET
+
+from dataclasses import dataclass
+from typing import Iterator
+
+# container headers, see switchbrew PFS0 / HFS0 / XCI / NRO and the nsz NCZ format
+PFS0_MAGIC = b"PFS0"
+HFS0_MAGIC = b"HFS0"
+XCI_MAGIC = b"HEAD"
+NRO_MAGIC = b"NRO0"
+ASET_MAGIC = b"ASET"
+NCZ_MAGIC = b"NCZSECTN"
+NCZ_BLOCK_MAGIC = b"NCZBLOCK"
+
+XCI_HEADER_OFFSET = 0x100
+NCZ_SECTION_OFFSET = 0x4000     # the first 0x4000 bytes of an ncz are the plain nca header
+NACP_NAME_SIZE = 0x200
+NACP_TITLE_SIZE = 0x300
+NACP_VERSION_OFFSET = 0x3060
+
+# nothing is read past this for the small metadata entries (cnmt.xml, nacp.xml)
+MAX_XML_SIZE = 1 << 20
+
+TITLE_TYPES = {"Application": "base", "Patch": "update", "AddOnContent": "dlc"}
+
+class ContainerError(ValueError):
+    pass
+
+@dataclass(frozen=True)
+class Entry:
+    name: str
+    offset: int             # absolute offset in the file
+    size: int
+    hash_size: int = 0      # HFS0 only: sha256 of the first hash_size bytes
+    hash: bytes = b""
+
+@dataclass(frozen=True)
+class NczSection:
+    offset: int             # absolute offset in the nca
+    size: int
+    crypto_type: int        # 1 none, 3 ctr, 4 bktr (ctr)
+    key: bytes
+    counter: bytes
+
+@dataclass(frozen=True)
+class NczHeader:
+    sections: tuple[NczSection, ...]
+    data_offset: int                    # absolute offset of the zstd data in the file
+    nca_size: int                       # size of the nca once decompressed
+    block_size: int | None = None       # None: a single zstd frame
+    block_sizes: tuple[int, ...] = ()   # compressed size of every block
+
+@dataclass(frozen=True)
+class ContainerInfo:
+    kind: str                   # nsp, xci, nro
+    title_id: str | None        # 0100000000010000
+    version: int | None
+    type: str | None            # base, update, dlc, homebrew
+    name: str | None
+    name_source: str | None     # nacp, filename
+    icon: Entry | None          # plain jpeg shipped next to the control nca
+    compressed: bool            # contains ncz (nsz / xcz)
+    content_size: int           # size of the contents once decompressed
+    entries: int
+
+class ContainerFile:
+    """Read-only mmap of a container file.
+
+    Headers are parsed in place through memoryviews: only the pages holding
+    the tables that are looked at are faulted in, whatever the file size.
+    MADV_RANDOM keeps the kernel from reading ahead around each of them,
+    sequential=True asks for the opposite when the whole file is streamed.
+    """
+
+    def __init__(self, path: str | os.PathLike, sequential: bool = False):
+        with open(path, "rb") as f:
+            self.size = os.fstat(f.fileno()).st_size
+            if self.size == 0:
+                raise ContainerError("empty file")
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        advice = getattr(mmap, "MADV_SEQUENTIAL" if sequential else "MADV_RANDOM", None)
+        if advice is not None:
+            self.mm.madvise(advice)
+        self.buf = memoryview(self.mm)
+
+    def view(self, offset: int, size: int) -> memoryview:
+        if offset < 0 or size < 0 or offset + size > self.size:
+            raise ContainerError(f"truncated file at 0x{offset:x}")
+        return self.buf[offset:offset + size]
+
+    def discard(self, offset: int, size: int) -> None:
+        # drop already consumed pages from the mapping (they stay in the page cache), keeps RSS flat when streaming
+        if hasattr(mmap, "MADV_DONTNEED"):
+            start = offset - offset % mmap.PAGESIZE
+            self.mm.madvise(mmap.MADV_DONTNEED, start, min(offset + size, self.size) - start)
+
+    def cstring(self, offset: int, end: int) -> str:
+        # NUL terminated name in [offset, end)
+        stop = self.mm.find(b"\0", offset, end)
+        return self.view(offset, (stop if stop >= 0 else end) - offset).tobytes().decode("utf-8", errors="replace")
+
+    def close(self) -> None:
+        try:
+            self.buf.release()
+            self.mm.close()
+        except BufferError:
+            # views still referenced (by an exception traceback), unmapped when they are collected
+            pass
+
+    def __enter__(self) -> ContainerFile:
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+def iter_entries(container: ContainerFile, base: int, magic: bytes, entry_size: int) -> Iterator[Entry]:
+    # PFS0 and HFS0 share the layout: magic, count, string table size, reserved, entries, strings
+    header = container.view(base, 0x10)
+    if header[:4] != magic:
+        raise ContainerError(f"no {magic.decode()} header at 0x{base:x}")
+    count, strings_size = struct.unpack_from("<II", header, 4)
+    if count > 0x10000:
+        raise ContainerError(f"{magic.decode()} with {count} entries")
+    table = container.view(base + 0x10, count * entry_size + strings_size)
+    strings = base + 0x10 + count * entry_size
+    data_start = base + 0x10 + len(table)
+    for i in range(count):
+        offset, size, name_offset, hash_size = struct.unpack_from("<QQII", table, i * entry_size)
+        name = container.cstring(strings + name_offset, data_start) if name_offset < strings_size else ""
+        if entry_size == 0x40:
+            yield Entry(name, data_start + offset, size, hash_size, table[i * entry_size + 0x20:i * entry_size + 0x40].tobytes())
+        else:
+            yield Entry(name, data_start + offset, size)
+
+def iter_pfs0(container: ContainerFile, base: int = 0) -> Iterator[Entry]:
+    return iter_entries(container, base, PFS0_MAGIC, 0x18)
+
+def iter_hfs0(container: ContainerFile, base: int) -> Iterator[Entry]:
+    return iter_entries(container, base, HFS0_MAGIC, 0x40)
+
+def read_pfs0(container: ContainerFile, base: int = 0) -> list[Entry]:
+    return list(iter_pfs0(container, base))
+
+def read_hfs0(container: ContainerFile, base: int) -> list[Entry]:
+    return list(iter_hfs0(container, base))
+
+def xci_root_offset(container: ContainerFile) -> int:
+    header = container.view(XCI_HEADER_OFFSET, 0x40)
+    if header[:4] != XCI_MAGIC:
+        raise ContainerError("no XCI header")
+    return struct.unpack_from("<Q", header, 0x30)[0]
+
+def read_xci(container: ContainerFile) -> dict[str, list[Entry]]:
+    """Entries of every partition (update, normal, secure, logo) of a gamecard image."""
+    partitions = {}
+    for partition in iter_hfs0(container, xci_root_offset(container)):
+        try:
+            partitions[partition.name] = read_hfs0(container, partition.offset)
+        except ContainerError:
+            # some trimmed dumps have an empty update partition
+            partitions[partition.name] = []
+    return partitions
+
+def read_ncz_header(container: ContainerFile, entry: Entry, with_blocks: bool = True) -> NczHeader | None:
+    """Section and block tables of an ncz entry, None if it has no NCZ section header.
+
+    with_blocks=False skips the compressed block size list (4 bytes per block).
+    """
+    head = container.view(entry.offset + NCZ_SECTION_OFFSET, 0x10)
+    if head[:8] != NCZ_MAGIC:
+        return None
+    (count,) = struct.unpack_from("<Q", head, 8)
+    if count > 0x100:
+        raise ContainerError(f"ncz with {count} sections")
+    table = container.view(entry.offset + NCZ_SECTION_OFFSET + 0x10, count * 0x40)
+    sections = []
+    for i in range(count):
+        offset, size, crypto_type = struct.unpack_from("<QQQ", table, i * 0x40)
+        sections.append(NczSection(offset, size, crypto_type, table[i * 0x40 + 0x20:i * 0x40 + 0x30].tobytes(), table[i * 0x40 + 0x30:i * 0x40 + 0x40].tobytes()))
+    sections_end = max((s.offset + s.size for s in sections), default=NCZ_SECTION_OFFSET)
+
+    data_offset = entry.offset + NCZ_SECTION_OFFSET + 0x10 + len(table)
+    block = container.view(data_offset, 0x18) if data_offset + 0x18 <= entry.offset + entry.size else b""
+    if block[:8] != NCZ_BLOCK_MAGIC:
+        return NczHeader(tuple(sections), data_offset, max(NCZ_SECTION_OFFSET, sections_end))
+    # magic, version, type, unused, block size exponent, block count, decompressed size, compressed sizes
+    exponent = block[11]
+    blocks, decompressed = struct.unpack_from("<IQ", block, 12)
+    if not 14 <= exponent <= 32 or blocks > 0x1000000:
+        raise ContainerError(f"ncz block header with 2^{exponent} bytes x {blocks} blocks")
+    sizes = struct.unpack(f"<{blocks}I", container.view(data_offset + 0x18, blocks * 4)) if with_blocks else ()
+    return NczHeader(tuple(sections), data_offset + 0x18 + blocks * 4, NCZ_SECTION_OFFSET + decompressed, 1 << exponent, sizes)
+
+def ncz_content_size(container: ContainerFile, entry: Entry) -> int | None:
+    """Size of the nca once decompressed, None if the entry has no NCZ section header."""
+    header = read_ncz_header(container, entry, with_blocks=False)
+    return header.nca_size if header is not None else None
+
+def title_type(title_id: str) -> str:
+    # base ids end with 000, updates with 800, dlc are base + 0x1000 + index
+    low = int(title_id, 16) & 0xFFF
+    if low == 0:
+        return "base"
+    if low == 0x800:
+        return "update"
+    return "dlc"
+
+def _xml(container: ContainerFile, entry: Entry) -> ET.Element:
+    return ET.fromstring(container.view(entry.offset, min(entry.size, MAX_XML_SIZE)).tobytes())
+
+def _cnmt(container: ContainerFile, entry: Entry) -> tuple[str | None, int | None, str | None]:
+    root = _xml(container, entry)
+    title_id = (root.findtext("Id") or "").lower().removeprefix("0x") or None
+    version = root.findtext("Version")
+    return title_id, int(version) if version and version.isdigit() else None, TITLE_TYPES.get(root.findtext("Type") or "")
+
+def _nacp_xml_name(container: ContainerFile, entry: Entry) -> str | None:
+    root = _xml(container, entry)
+    names = {title.findtext("Language"): title.findtext("Name") for title in root.iter("Title")}
+    return names.get("AmericanEnglish") or names.get("BritishEnglish") or next((n for n in names.values() if n), None)
+
+_FILENAME_TITLE_ID = re.compile(r"\[(01[0-9a-fA-F]{14})\]")
+_FILENAME_VERSION = re.compile(r"\[v(\d+)\]")
+_FILENAME_TAGS = re.compile(r"\s*[\[(][^\])]*[\])]")
+# <rights id>.tik, the rights id starts with the title id
+_TICKET_NAME = re.compile(r"([0-9a-f]{16})[0-9a-f]{16}\.tik")
+
+def filename_metadata(filename: str) -> tuple[str | None, int | None, str]:
+    """(title id, version, display name) from the usual "Name [0100...][v0].nsp" naming."""
+    stem = filename.rsplit(".", 1)[0]
+    title_id = _FILENAME_TITLE_ID.search(stem)
+    version = _FILENAME_VERSION.search(stem)
+    name = _FILENAME_TAGS.sub("", stem).replace("_", " ").strip() or stem
+    return (title_id.group(1).lower() if title_id else None, int(version.group(1)) if version else None, name)
+
+def _from_entries(container: ContainerFile, filename: str, kind: str, entries: Iterator[Entry]) -> ContainerInfo:
+    # nca contents are encrypted, the metadata comes from the plain files next to them:
+    # cnmt.xml / nacp.xml when the dump has them, the ticket rights id, then the file name
+    title_id = version = ttype = name = icon = None
+    tickets = []
+    compressed = False
+    content_size = count = 0
+    for entry in entries:
+        count += 1
+        lower = entry.name.lower()
+        if lower.endswith(".cnmt.xml") and title_id is None:
+            try:
+                title_id, version, ttype = _cnmt(container, entry)
+            except ET.ParseError:
+                pass
+        elif lower.endswith(".nacp.xml") and name is None:
+            try:
+                name = _nacp_xml_name(container, entry)
+            except ET.ParseError:
+                pass
+        elif lower.endswith(".jpg") and (icon is None or lower.endswith(".americanenglish.jpg")):
+            # <control nca id>.nx.<language>.jpg
+            icon = entry
+        elif lower.endswith(".tik") and (ticket := _TICKET_NAME.fullmatch(lower)):
+            tickets.append(ticket.group(1))
+        if lower.endswith(".ncz"):
+            compressed = True
+            content_size += ncz_content_size(container, entry) or entry.size
+        elif lower.endswith(".nca"):
+            content_size += entry.size
+
+    name_id, name_version, name_stem = filename_metadata(filename)
+    if title_id is None and tickets:
+        # multi-content dumps: the base game ticket first, then the update, then dlc
+        title_id = min(tickets, key=lambda t: ("base", "update", "dlc").index(title_type(t)))
+    if title_id is None:
+        title_id = name_id
+    if version is None:
+        version = name_version
+    if ttype is None and title_id is not None:
+        ttype = title_type(title_id)
+    return ContainerInfo(kind=kind, title_id=title_id, version=version, type=ttype, name=name or name_stem,
+                         name_source="nacp" if name else "filename", icon=icon, compressed=compressed, content_size=content_size, entries=count)
+
+def read_nro(container: ContainerFile, filename: str) -> ContainerInfo:
+    header = container.view(0x10, 0x0C)
+    if header[:4] != NRO_MAGIC:
+        raise ContainerError("no NRO header")
+    (nro_size,) = struct.unpack_from("<I", header, 8)
+    name = version = None
+    asset = container.view(nro_size, 0x38) if nro_size + 0x38 <= container.size else b""
+    if asset[:4] == ASET_MAGIC:
+        nacp_offset, nacp_size = struct.unpack_from("<QQ", asset, 0x18)
+        if nacp_size >= NACP_VERSION_OFFSET + 0x10:
+            nacp = nro_size + nacp_offset
+            container.view(nacp, NACP_VERSION_OFFSET + 0x10)
+            for i in range(16):
+                title = container.cstring(nacp + i * NACP_TITLE_SIZE, nacp + i * NACP_TITLE_SIZE + NACP_NAME_SIZE)
+                if title:
+                    name = title
+                    break
+            version = container.cstring(nacp + NACP_VERSION_OFFSET, nacp + NACP_VERSION_OFFSET + 0x10) or None
+    # homebrew has no title id, the display version string is kept in the name
+    display = name or filename_metadata(filename)[2]
+    if version:
+        display += f" ({version})"
+    return ContainerInfo(kind="nro", title_id=None, version=None, type="homebrew", name=display,
+                         name_source="nacp" if name else "filename", icon=None, compressed=False, content_size=nro_size, entries=0)
+
+def read_container(path: str) -> ContainerInfo:
+    """Metadata of a .nsp/.nsz/.xci/.xcz/.nro file, only the header pages are touched."""
+    filename = path.rsplit("/", 1)[-1]
+    extension = filename.rsplit(".", 1)[-1].lower()
+    if extension not in ("nsp", "nsz", "xci", "xcz", "nro"):
+        raise ContainerError(f"unsupported extension .{extension}")
+    with ContainerFile(path) as container:
+        if extension in ("nsp", "nsz"):
+            return _from_entries(container, filename, "nsp", iter_pfs0(container))
+        if extension in ("xci", "xcz"):
+            return _from_entries(container, filename, "xci", iter(read_xci(container).get("secure", [])))
+        return read_nro(container, filename)
@@ -0,0 +1,198 @@
+from __future__ import annotations
+
+import logging
+import os
+import shutil
+import stat
+import sys
+
+from dataclasses import dataclass, field
+
+eslog = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class Dir:
+    path: str
+
+@dataclass(frozen=True)
+class Link:
+    path: str
+    target: str
+
+@dataclass(frozen=True)
+class LayoutAction:
+    action: str   # mkdir / symlink / relink / replace
+    path: str
+    target: str | None = None
+
+    def __str__(self):
+        if self.target is None:
+            return f"{self.action:<8} {self.path}"
+        return f"{self.action:<8} {self.path} -> {self.target}"
+
+@dataclass
+class LayoutReport:
+    name: str
+    actions: list[LayoutAction] = field(default_factory=list)
+    dry_run: bool = False
+
+    def __str__(self):
+        if not self.actions:
+            return f"[{self.name}] layout up to date"
+        header = f"[{self.name}] {len(self.actions)} change(s)" + (" (dry run)" if self.dry_run else "")
+        return "\n".join([header] + [f"  {action}" for action in self.actions])
+
+###LAYOUT SPECS#########################################################################################################
+def overlay_enabled(mode: str | None, rom: str) -> bool:
+    # switch_mod_overlay es option, the emulator ui (config mode) keeps the whole store
+    return mode == "1" and rom != "config"
+
+def eden_layout(emudir: str, mod_overlay: bool = False) -> list[Dir | Link]:
+    # shared by eden-emu / eden-pgo / citron-emu, emudir is the folder name the appimage expects
+    # mod_overlay: load/ points to the per-launch overlay of modOverlay instead of the whole mod store
+    spec: list[Dir | Link] = [
+        Dir("/userdata/bios/switch"),
+        Dir("/userdata/bios/switch/keys"),
+        Dir("/userdata/bios/switch/firmware"),
+        Dir("/userdata/system/configs/yuzu"),
+        Dir("/userdata/system/configs/yuzu/nand"),
+        Dir("/userdata/system/configs/yuzu/nand/system"),
+        Dir("/userdata/system/configs/yuzu/nand/system/Contents"),
+        Link("/userdata/system/configs/yuzu/keys", "/userdata/bios/switch/keys"),
+        Link("/userdata/system/configs/yuzu/nand/system/Contents/registered", "/userdata/bios/switch/firmware"),
+        # app and config directories point to /system/configs/yuzu
+        Dir("/userdata/system/.local"),
+        Dir("/userdata/system/.local/share"),
+        Link("/userdata/system/.local/share/" + emudir, "/userdata/system/configs/yuzu"),
+        Dir("/userdata/system/.config"),
+        Link("/userdata/system/.config/" + emudir, "/userdata/system/configs/yuzu"),
+        Link("/userdata/system/configs/" + emudir, "/userdata/system/configs/yuzu"),
+        # game_list cache lives in /userdata/saves/yuzu
+        Dir("/userdata/system/.cache"),
+        Dir("/userdata/system/.cache/" + emudir),
+        Dir("/userdata/saves/yuzu"),
+        Dir("/userdata/saves/yuzu/game_list"),
+        Link("/userdata/system/.cache/" + emudir + "/game_list", "/userdata/saves/yuzu/game_list"),
+        # yuzu_config.sh runs with XDG_CACHE_HOME=/userdata/system/configs
+        Link("/userdata/system/configs/yuzu/game_list", "/userdata/saves/yuzu/game_list"),
+        # saves and mods
+        Dir("/userdata/system/configs/yuzu/nand/user"),
+        Dir("/userdata/saves/switch"),
+        Dir("/userdata/saves/switch/eden_citron"),
+        Dir("/userdata/saves/switch/eden_citron/save"),
+        Dir("/userdata/saves/switch/eden_citron/save/save_user"),
+        Dir("/userdata/saves/switch/eden_citron/save/save_system"),
+        Dir("/userdata/saves/switch/eden_citron/mods"),
+        Link("/userdata/system/configs/yuzu/nand/user/save", "/userdata/saves/switch/eden_citron/save/save_user"),
+        Link("/userdata/system/configs/yuzu/nand/system/save", "/userdata/saves/switch/eden_citron/save/save_system"),
+        Link("/userdata/system/configs/yuzu/load", "/userdata/saves/switch/eden_citron/mods"),
+    ]
+    if mod_overlay:
+        spec[-1:] = [
+            Dir("/userdata/system/.cache/switch"),
+            Dir("/userdata/system/.cache/switch/mods"),
+            Dir("/userdata/system/.cache/switch/mods/eden"),
+            Link("/userdata/system/configs/yuzu/load", "/userdata/system/.cache/switch/mods/eden"),
+        ]
+    if emudir == "yuzu":
+        spec.remove(Link("/userdata/system/configs/yuzu", "/userdata/system/configs/yuzu"))
+    return spec
+
+def ryujinx_layout(mod_overlay: bool = False) -> list[Dir | Link]:
+    spec = [
+        Dir("/userdata/bios/switch"),
+        Dir("/userdata/bios/switch/keys"),
+        Dir("/userdata/system/configs/Ryujinx"),
+        Dir("/userdata/system/configs/Ryujinx/bis"),
+        Dir("/userdata/system/configs/Ryujinx/bis/system"),
+        Dir("/userdata/system/configs/Ryujinx/bis/system/Contents"),
+        Dir("/userdata/saves/switch"),
+        Dir("/userdata/saves/switch/ryujinx"),
+        Dir("/userdata/saves/switch/ryujinx/save"),
+        Dir("/userdata/saves/switch/ryujinx/save/save_user"),
+        Dir("/userdata/saves/switch/ryujinx/save/save_system"),
+        Dir("/userdata/saves/switch/ryujinx/mods"),
+        Link("/userdata/system/configs/Ryujinx/system", "/userdata/bios/switch/keys"),
+        Link("/userdata/system/configs/Ryujinx/bis/user", "/userdata/saves/switch/ryujinx/save/save_user"),
+        Link("/userdata/system/configs/Ryujinx/bis/system/save", "/userdata/saves/switch/ryujinx/save/save_system"),
+        Link("/userdata/system/configs/Ryujinx/mods", "/userdata/saves/switch/ryujinx/mods"),
+    ]
+    if mod_overlay:
+        spec[-1:] = [
+            Dir("/userdata/system/.cache/switch"),
+            Dir("/userdata/system/.cache/switch/mods"),
+            Dir("/userdata/system/.cache/switch/mods/ryujinx"),
+            Link("/userdata/system/configs/Ryujinx/mods", "/userdata/system/.cache/switch/mods/ryujinx"),
+        ]
+    return spec
+
+###RECONCILER###########################################################################################################
+def plan_layout(spec: list[Dir | Link]) -> list[LayoutAction]:
+    # one lstat per path (plus a readlink for existing links), nothing is modified
+    actions = []
+    for entry in spec:
+        try:
+            st = os.lstat(entry.path)
+        except FileNotFoundError:
+            st = None
+
+        if isinstance(entry, Dir):
+            if st is None:
+                actions.append(LayoutAction("mkdir", entry.path))
+        elif st is None:
+            actions.append(LayoutAction("symlink", entry.path, entry.target))
+        elif stat.S_ISLNK(st.st_mode):
+            if os.readlink(entry.path) != entry.target:
+                actions.append(LayoutAction("relink", entry.path, entry.target))
+        else:
+            actions.append(LayoutAction("replace", entry.path, entry.target))
+    return actions
+
+def apply_layout(actions: list[LayoutAction]) -> None:
+    for action in actions:
+        if action.action == "mkdir":
+            os.makedirs(action.path, exist_ok=True)
+            continue
+        if action.action == "relink":
+            # always the link itself, never what it points to
+            os.unlink(action.path)
+        elif action.action == "replace":
+            if os.path.isdir(action.path):
+                shutil.rmtree(action.path)
+            else:
+                os.unlink(action.path)
+        os.symlink(action.target, action.path)
+
+def reconcile(name: str, spec: list[Dir | Link], dry_run: bool = False) -> LayoutReport:
+    """Brings the filesystem to spec.
+
+    The tree is planned on every launch (one lstat per path, a readlink per
+    link): a deleted directory or a link the emulator replaced is repaired on
+    the next launch, and an up to date tree costs no write at all.
+    """
+    report = LayoutReport(name=name, dry_run=dry_run)
+    report.actions = plan_layout(spec)
+    if dry_run:
+        return report
+    apply_layout(report.actions)
+    for action in report.actions:
+        eslog.debug(f"layout {name}: {action}")
+    return report
+
+def main(argv: list[str]) -> int:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Show or apply the Switch emulator directory layout")
+    parser.add_argument("emulator", choices=["eden-emu", "eden-pgo", "citron-emu", "ryujinx-emu"])
+    parser.add_argument("--apply", action="store_true", help="apply the changes (default is a dry run)")
+    args = parser.parse_args(argv)
+
+    if args.emulator == "ryujinx-emu":
+        spec = ryujinx_layout()
+    else:
+        spec = eden_layout("citron" if args.emulator == "citron-emu" else "eden")
+    print(reconcile(args.emulator, spec, dry_run=not args.apply))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
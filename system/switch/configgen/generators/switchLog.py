@@ -0,0 +1,99 @@
+from __future__ import annotations
+
+import atexit
+import collections
+import logging
+import logging.handlers
+import sys
+
+# es_features value -> logging level, "off" disables the switch loggers entirely
+LOG_LEVELS = {
+    "off": logging.CRITICAL + 10,
+    "error": logging.ERROR,
+    "info": logging.INFO,
+    "debug": logging.DEBUG,
+}
+DEFAULT_LEVEL = "info"
+
+RING_CAPACITY = 2000            # records kept until the flush, the oldest are dropped past that
+MAX_BYTES = 512 * 1024          # log file rotation
+BACKUP_COUNT = 2
+
+class RingBufferHandler(logging.handlers.BufferingHandler):
+    """Keeps the last records in memory and hands them to target only on flush()."""
+
+    def __init__(self, capacity: int, target: logging.Handler):
+        super().__init__(capacity)
+        self.buffer = collections.deque(maxlen=capacity)
+        self.target = target
+
+    def shouldFlush(self, record: logging.LogRecord) -> bool:
+        return False
+
+    def flush(self) -> None:
+        self.acquire()
+        try:
+            for record in self.buffer:
+                self.target.handle(record)
+            self.buffer.clear()
+            self.target.flush()
+        finally:
+            self.release()
+
+    def close(self) -> None:
+        try:
+            self.flush()
+            self.target.close()
+        finally:
+            super().close()
+
+class StdoutHandler(logging.StreamHandler):
+    # resolves sys.stdout at write time, it is redirected by emulatorlauncher
+    @property
+    def stream(self):
+        return sys.stdout
+
+    @stream.setter
+    def stream(self, value):
+        pass
+
+_handlers: list[RingBufferHandler] = []
+_loggers: list[logging.Logger] = []
+
+def get_switch_logger(name: str, path: str | None = None) -> logging.Logger:
+    """Buffered logger: path=None goes to stdout (es_launch_stdout.log), otherwise a rotated file."""
+    logger = logging.getLogger("switch." + name)
+    handler = getattr(logger, "switch_handler", None)
+    if handler is not None:
+        # already set up (module reloaded), keep a single handler per logger
+        if logger not in _loggers:
+            _handlers.append(handler)
+            _loggers.append(logger)
+        return logger
+
+    if path is None:
+        target = StdoutHandler()
+    else:
+        target = logging.handlers.RotatingFileHandler(path, maxBytes=MAX_BYTES, backupCount=BACKUP_COUNT, delay=True)
+    target.setFormatter(logging.Formatter("%(asctime)s [SWITCH-%(levelname)s] %(message)s", "%Y-%m-%d %H:%M:%S"))
+    handler = RingBufferHandler(RING_CAPACITY, target)
+
+    logger.addHandler(handler)
+    logger.setLevel(LOG_LEVELS[DEFAULT_LEVEL])
+    logger.propagate = False
+    logger.switch_handler = handler
+    _handlers.append(handler)
+    _loggers.append(logger)
+    return logger
+
+def configure_switch_logging(level: str | None) -> None:
+    level = (level or DEFAULT_LEVEL).lower()
+    for logger in _loggers:
+        logger.setLevel(LOG_LEVELS.get(level, LOG_LEVELS[DEFAULT_LEVEL]))
+
+def flush_switch_logs() -> None:
+    # one write per sink, at the end of generate()
+    for handler in _handlers:
+        handler.flush()
+
+atexit.register(flush_switch_logs)
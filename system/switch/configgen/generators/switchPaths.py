@@ -0,0 +1,14 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+# where the switch add-on is installed
+SWITCH_HOME = Path("/userdata/system/switch")
+SWITCH_CONFIGGEN = SWITCH_HOME / "configgen"
+SWITCH_APPIMAGES = SWITCH_HOME / "appimages"
+
+# caches that can be deleted at any time, they are rebuilt on the next launch
+SWITCH_CACHE = Path("/userdata/system/.cache/switch")
+
+# user data
+SWITCH_ROMS = Path("/userdata/roms/switch")
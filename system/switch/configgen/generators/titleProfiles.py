@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+import functools
+import hashlib
+import json
+import logging
+import os
+import sys
+
+from pathlib import Path
+
+from generators.configWriter import atomic_write
+from generators.switchContainers import ContainerError, read_container
+from generators.switchPaths import SWITCH_CACHE, SWITCH_CONFIGGEN
+
+eslog = logging.getLogger(__name__)
+
+# the user file wins over the shipped one, key by key
+USER_PROFILES = Path("/userdata/system/configs/switch/title-profiles.ini")
+SHIPPED_PROFILES = SWITCH_CONFIGGEN / "title-profiles.ini"
+PROFILE_FILES = (USER_PROFILES, SHIPPED_PROFILES)
+
+class ProfileFile:
+    """One profiles file: [title id] sections of es option = value lines.
+
+    The file is not parsed up front: a byte offset index of its sections is
+    cached next to the other switch caches (keyed on size/mtime) and only the
+    section of the launched title is read and parsed.
+    """
+
+    def __init__(self, path: Path, index_file: Path | None = None):
+        self.path = Path(path)
+        if index_file is None:
+            index_file = SWITCH_CACHE / f"{self.path.name}.{hashlib.sha1(str(self.path).encode()).hexdigest()[:8]}.index.json"
+        self.index_file = index_file
+
+    def build_index(self) -> dict[str, list[int]]:
+        # title id -> [offset, length] of the section body
+        index: dict[str, list[int]] = {}
+        current = None
+        offset = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                stripped = line.strip()
+                if stripped.startswith(b"[") and stripped.endswith(b"]"):
+                    if current is not None:
+                        index[current][1] = offset - index[current][0]
+                    current = stripped[1:-1].strip().decode(errors="replace").lower()
+                    # a title listed twice: the first section wins
+                    if current in index:
+                        current = None
+                    else:
+                        index[current] = [offset + len(line), 0]
+                offset += len(line)
+        if current is not None:
+            index[current][1] = offset - index[current][0]
+        return index
+
+    def index(self) -> dict[str, list[int]]:
+        st = os.stat(self.path)
+        key = [str(self.path), st.st_size, st.st_mtime_ns]
+        try:
+            with open(self.index_file) as f:
+                cached = json.load(f)
+            if cached.get("key") == key:
+                return cached["sections"]
+        except (OSError, ValueError):
+            pass
+        sections = self.build_index()
+        try:
+            atomic_write(self.index_file, json.dumps({"key": key, "sections": sections}).encode())
+        except OSError as e:
+            eslog.warning(f"unable to write {self.index_file}: {e}")
+        return sections
+
+    def get(self, title_id: str) -> dict[str, str]:
+        try:
+            section = self.index().get(title_id.lower())
+            if section is None:
+                return {}
+            with open(self.path, "rb") as f:
+                f.seek(section[0])
+                body = f.read(section[1]).decode(errors="replace")
+        except OSError:
+            return {}
+        options = {}
+        for line in body.splitlines():
+            line = line.strip()
+            if not line or line[0] in "#;" or "=" not in line:
+                continue
+            key, value = line.split("=", 1)
+            options[key.strip()] = value.strip()
+        return options
+
+def title_profile(title_id: str, files: tuple[Path, ...] = PROFILE_FILES) -> dict[str, str]:
+    profile: dict[str, str] = {}
+    for path in reversed(files):
+        if path.exists():
+            profile.update(ProfileFile(path).get(title_id))
+    return profile
+
+@functools.cache
+def rom_title_id(rom: str) -> str | None:
+    # from the container header, so a renamed or moved rom keeps its profile
+    # (cached: the shader cache manager asks again for the same launch)
+    try:
+        return read_container(rom).title_id
+    except (OSError, ContainerError, ValueError):
+        return None
+
+def base_title_id(title_id: str) -> str:
+    # an update shares the save and the mods of its base game
+    return f"{int(title_id, 16) & ~0xFFF:016x}"
+
+def apply_title_profile(system, rom: str, files: tuple[Path, ...] = PROFILE_FILES) -> dict[str, str]:
+    """Fill system.config with the title profile for the options the user did not set.
+
+    Options set in ES (per game or per system) still win, the profile only
+    comes before the generator defaults. Returns the options applied.
+    """
+    if rom == "config" or not any(path.exists() for path in files):
+        return {}
+    title_id = rom_title_id(rom)
+    if title_id is None:
+        return {}
+    applied = {key: value for key, value in title_profile(title_id, files).items() if not system.isOptSet(key)}
+    for key, value in applied.items():
+        system.config[key] = value
+    if applied:
+        eslog.info(f"title profile {title_id}: " + ", ".join(f"{k}={v}" for k, v in applied.items()))
+    return applied
+
+if __name__ == "__main__":
+    # python -m generators.titleProfiles <rom or title id>
+    if len(sys.argv) != 2:
+        print("usage: python -m generators.titleProfiles <rom or title id>")
+        sys.exit(1)
+    argument = sys.argv[1]
+    title_id = argument if os.path.splitext(argument)[1] == "" else rom_title_id(argument)
+    print(f"title id: {title_id}")
+    for option, value in (title_profile(title_id) if title_id else {}).items():
+        print(f"  {option} = {value}")